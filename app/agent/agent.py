@@ -1,86 +1,217 @@
-from langchain_community.utilities import SQLDatabase
-from langchain_community.agent_toolkits.sql.toolkit import SQLDatabaseToolkit
-from langchain import hub
-from langchain_core.prompts.prompt import PromptTemplate
-from langgraph.prebuilt import create_react_agent
-from langchain_openai import ChatOpenAI
-from app.config import OPENAI_API_KEY
+import asyncio
+import contextvars
+import json
+import logging
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_core.messages import AIMessage
+from app.agent.memory import get_checkpointer
+from app.agent.models import ModelRouter
+from app.agent.prompts import get_system_prompt
+from app.agent.router import FunctionRouter
+from app.config import (
+    AGENT_LLM_QUERY_CHECKER,
+    AGENT_PREFETCH_CONTEXT,
+    FUNCTION_ROUTER_ENABLED,
+)
+from app.database.connections import on_engine_disposed
+from app.database.schema import CachedSQLDatabase
+
+logger = logging.getLogger(__name__)
+
+# Reflected SQLDatabase objects and compiled agent graphs, per engine. Graphs
+# are keyed by LLM identity and the tools' names, descriptions and argument
+# schemas so switching models back and forth, reconnecting, or opening another
+# session on the same database is free, while tools rebuilt after a function
+# changed get a graph of their own.
+_prepared = weakref.WeakKeyDictionary()
+_prepared_lock = threading.Lock()
+
+# The opening calls the system prompt requires on every question, with their
+# arguments. They are run before the first LLM turn and handed to the model as
+# its own tool calls; their ids carry PREFETCH_ID_PREFIX.
+PREFETCH_TOOLS = (
+    ("get_db_functions_agent_tool", {}),
+    ("sql_db_list_tables", {"tool_input": ""}),
+)
+PREFETCH_ID_PREFIX = "prefetch_"
+_prefetch_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="prefetch")
+
+
+def _llm_id(llm):
+    model = getattr(llm, "model_name", None) or getattr(llm, "model", None)
+    if model is None:
+        return (type(llm).__name__, id(llm))
+    return (type(llm).__name__, model, getattr(llm, "temperature", None))
+
+
+def _tools_id(tools):
+    return tuple(sorted(
+        (tool.name, tool.description, json.dumps(tool.args, sort_keys=True, default=str),
+         json.dumps(tool.metadata or {}, sort_keys=True, default=str))
+        for tool in tools
+    ))
+
+
+def _prepared_for(engine):
+    with _prepared_lock:
+        prepared = _prepared.get(engine)
+        if prepared is None:
+            prepared = {"db": None, "agents": {}, "lock": threading.Lock()}
+            _prepared[engine] = prepared
+            on_engine_disposed(engine, clear_prepared_agents)
+        return prepared
+
+
+def clear_prepared_agents(engine):
+    with _prepared_lock:
+        _prepared.pop(engine, None)
 
 
 class AgentSetup:
-    def __init__(self, engine, llm = None, tools=[]):
+    """Agent graphs for one connection, one per chat model.
+
+    ``models`` decides which model handles each step; a single ``llm`` pins
+    every step to it. The graph of ``models.default`` is built by ``setup()``,
+    the others on first use.
+    """
+
+    def __init__(self, engine, llm = None, tools=[], models=None):
         self.engine = engine
-        self.llm = llm or ChatOpenAI(
-            model="gpt-4o-mini", temperature=0, api_key=OPENAI_API_KEY
-        )
+        self.models = models or (ModelRouter.single(llm) if llm else ModelRouter())
         self.tools = tools
         self.agent_executor = None
         self.toolkit = None
+        self.agent_tools = []
+        self.router = None
+        self.last_setup_cached = False
+        self.last_setup_seconds = None
 
     def setup(self):
-        db = SQLDatabase(self.engine)
-        self.toolkit = SQLDatabaseToolkit(db=db, llm=self.llm)
-
-        prompt_template = hub.pull("langchain-ai/sql-agent-system-prompt")
-        function_prompt_addition = """
-    You are an agent designed to interact with a SQL database.
-
-    Given an input question, check whether the question can be answered by a function already available or create a syntactically correct {dialect} 
-    query to run, then look at the results of the query and return the answer.
-    Unless the user specifies a specific number of examples they wish to obtain, always limit your query to at most {top_k} results.
-    You can order the results by a relevant column to return the most interesting examples in the database.
-    Never query for all the columns from a specific table, only ask for the relevant columns given the question.
-    You have access to tools for interacting with the database. Only use the below tools. 
-    Only use the information returned by the below tools to construct your final answer.
-    You MUST double check your query before executing it. If you get an error while executing a query, rewrite the query and try again.
-
-    DO NOT make any DML statements (INSERT, UPDATE, DELETE, DROP etc.) to the database.
-
-    To start you should ALWAYS look at functions in the database and then tables to see what you can use to query.
-    Do NOT skip this step. Then you should construct the right query whether you chose a function to run or build your own query.
-    Those functions should always take precedence to use and execute over building your own query and running. 
-    Decide correctly whether to choose the function or build your own query or return an empty result if the question does not refer to any related query on the database. 
-    If you choose a function make sure to build the sql query to execute the function correctly and get the results.
-    In order to execute a function run an sql like SELECT <columns> from <function_name(param)>
-    At the end of the result provide information. The result should be structured in json format.
-    It should include all the columns and results, in addition to the approach used with the final result with three potential values (FUNCTION or QUERY or None)
-    FUNCTION if function tool is used, QUERY if own query is used to get the final result. 
-    The approach result should be also included in the json, in addition to the function name used.
-    Your last answer should only be a valid json and nothing else. in the following format: 
-    {{
-    "results": [
-    {{
-      "col1": val1,
-      "col2": val2,
-      "col3": val3,
-      ...
-    }}
-  ],
-  "approach": "FUNCTION or QUERY or NONE",
-  "function_used": "<function name>",
-  "query": <final using function or not used to retrieve the final results>
-    }}
-    """
+        started = time.perf_counter()
+        if FUNCTION_ROUTER_ENABLED:
+            self.router = FunctionRouter(self.engine, self.models)
 
-        prompt_template = PromptTemplate(
-            input_variables=["dialect", "top_k"], template=function_prompt_addition
+        cached, (self.toolkit, self.agent_executor, self.agent_tools) = self._prepare(self.models.default)
+        self.last_setup_cached = cached
+        self.last_setup_seconds = time.perf_counter() - started
+        logger.info(
+            f"Agent setup ({'warm' if cached else 'cold'}) took {self.last_setup_seconds * 1000:.1f} ms"
         )
 
-        tools =  self.toolkit.get_tools() + self.tools
+    def _prepare(self, model):
+        """(cached, (toolkit, graph, tools)) for the named model."""
+        llm = self.models.get(model)
+        prepared = _prepared_for(self.engine)
+        key = (_llm_id(llm), _tools_id(self.tools))
+        with prepared["lock"]:
+            cached = key in prepared["agents"]
+            if not cached:
+                # Imported when the first graph is built rather than when
+                # the app starts, so the UI is served sooner.
+                from langchain_community.agent_toolkits.sql.toolkit import SQLDatabaseToolkit
+                from langgraph.prebuilt import create_react_agent
 
-        self.agent_executor = create_react_agent(
-            self.llm,
-            tools,
-            state_modifier=prompt_template.format(dialect="POSTGRESQL", top_k=5),
-        )
+                if prepared["db"] is None:
+                    prepared["db"] = CachedSQLDatabase(self.engine)
+                toolkit = SQLDatabaseToolkit(db=prepared["db"], llm=llm)
+                tools = [
+                    tool for tool in toolkit.get_tools()
+                    # The checker costs an LLM round trip per query; queries
+                    # are checked locally when they run instead.
+                    if AGENT_LLM_QUERY_CHECKER or tool.name != "sql_db_query_checker"
+                ] + self.tools
+                agent_executor = create_react_agent(
+                    llm,
+                    tools,
+                    state_modifier=get_system_prompt(
+                        dialect="POSTGRESQL", top_k=5, query_checker_tool=AGENT_LLM_QUERY_CHECKER
+                    ),
+                    checkpointer=get_checkpointer(),
+                )
+                prepared["agents"][key] = (toolkit, agent_executor, tools)
+            return cached, prepared["agents"][key]
+
+    def route(self, question):
+        """Returns a FUNCTION answer for the question, or None to use the agent."""
+        if not self.router:
+            return None
+        try:
+            return self.router.route(question)
+        except Exception as e:
+            logger.warning(f"Function routing failed, falling back to the agent: {e}")
+            return None
+
+    async def aroute(self, question):
+        if not self.router:
+            return None
+        try:
+            return await self.router.aroute(question)
+        except Exception as e:
+            logger.warning(f"Function routing failed, falling back to the agent: {e}")
+            return None
 
-    def get_agent(self):
+    def prefetch(self, config=None):
+        """Runs the mandatory opening tool calls concurrently.
+
+        Returns the messages to append after the question: one AIMessage with
+        the calls and a ToolMessage per result, as if the model had asked.
+        """
+        calls = self._prefetch_calls()
+        if not calls:
+            return []
+        futures = [
+            _prefetch_pool.submit(contextvars.copy_context().run, tool.invoke, call, config)
+            for tool, call in calls
+        ]
+        try:
+            results = [future.result() for future in futures]
+        except Exception as e:
+            logger.warning(f"Prefetching agent context failed, the agent will fetch it: {e}")
+            return []
+        return [AIMessage(content="", tool_calls=[call for _, call in calls]), *results]
+
+    async def aprefetch(self, config=None):
+        calls = self._prefetch_calls()
+        if not calls:
+            return []
+        try:
+            results = await asyncio.gather(*(tool.ainvoke(call, config) for tool, call in calls))
+        except Exception as e:
+            logger.warning(f"Prefetching agent context failed, the agent will fetch it: {e}")
+            return []
+        return [AIMessage(content="", tool_calls=[call for _, call in calls]), *results]
+
+    def _prefetch_calls(self):
+        if not AGENT_PREFETCH_CONTEXT:
+            return []
+        tools = {tool.name: tool for tool in self.agent_tools}
+        return [
+            (tools[name], {"name": name, "args": args, "id": f"{PREFETCH_ID_PREFIX}{name}", "type": "tool_call"})
+            for name, args in PREFETCH_TOOLS
+            if name in tools
+        ]
+
+    def agent_models(self, question):
+        """Models to run the agent with for a question, in escalation order."""
+        return self.models.cascade("agent", question)
+
+    def get_agent(self, model=None):
         if not self.agent_executor:
             raise ValueError("Agent not set up. Call setup() first.")
-        return self.agent_executor
+        if model is None or model == self.models.default:
+            return self.agent_executor
+        _, (_, agent_executor, _) = self._prepare(model)
+        return agent_executor
+
+    def use_model(self, choice):
+        """Switches to a model name, or to "auto" routing, without rebuilding."""
+        self.models.choice = choice
+        self.setup()
 
     def update_llm(self, new_llm):
-        self.llm = new_llm
-        if self.toolkit:
-            self.toolkit.llm = new_llm
+        self.models = ModelRouter.single(new_llm)
         self.setup()  # Re-setup the agent with the new LLM
\ No newline at end of file
@@ -0,0 +1,166 @@
+import math
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from app.config import (
+    ANSWER_CACHE_MAX_ENTRIES,
+    ANSWER_CACHE_SIMILARITY,
+    ANSWER_CACHE_TTL,
+)
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_NUMBER_RE = re.compile(r"\d+(?:\.\d+)?")
+
+
+def normalize_question(question):
+    return " ".join(_TOKEN_RE.findall(question.lower()))
+
+
+def bag_of_words_embedding(text):
+    """Stand-in embedding: sparse term counts of the normalized question."""
+    return Counter(normalize_question(text).split())
+
+
+def _cosine(a, b):
+    if isinstance(a, Counter):
+        dot = sum(count * b.get(token, 0) for token, count in a.items())
+        norm_a = math.sqrt(sum(v * v for v in a.values()))
+        norm_b = math.sqrt(sum(v * v for v in b.values()))
+    else:
+        dot = sum(x * y for x, y in zip(a, b))
+        norm_a = math.sqrt(sum(x * x for x in a))
+        norm_b = math.sqrt(sum(y * y for y in b))
+    if not norm_a or not norm_b:
+        return 0.0
+    return dot / (norm_a * norm_b)
+
+
+class _Entry:
+    __slots__ = ("answer", "embedding", "numbers", "created_at")
+
+    def __init__(self, answer, embedding, numbers):
+        self.answer = answer
+        self.embedding = embedding
+        self.numbers = numbers
+        self.created_at = time.monotonic()
+
+
+class AnswerCache:
+    """LRU/TTL cache of final agent answers scoped to a schema version.
+
+    Lookups try the normalized question first. When ``similarity_threshold``
+    is set, the closest cached question for the same version is accepted if
+    its embedding is similar enough and it mentions the same numbers, so
+    "top 5 customers" never answers "top 10 customers".
+
+    ``embed`` may be any callable returning a vector (for example a local
+    ``Embeddings.embed_query``); the bag-of-words stand-in is used otherwise.
+
+    With a ``shared`` cache, exact matches are also looked up in and written
+    to it under the ``database`` namespace, so replicas reuse each other's
+    answers; similarity lookups stay local.
+    """
+
+    def __init__(
+        self,
+        max_entries=ANSWER_CACHE_MAX_ENTRIES,
+        ttl=ANSWER_CACHE_TTL,
+        similarity_threshold=ANSWER_CACHE_SIMILARITY,
+        embed=None,
+        shared=None,
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self.embed = embed or bag_of_words_embedding
+        self.shared = shared
+        self.hits = 0
+        self.shared_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, question, version, database=""):
+        normalized = normalize_question(question)
+        answer = self._get_local(question, normalized, version)
+        if answer is not None:
+            return answer
+        if self.shared is not None:
+            answer = self.shared.get("answers", database, version, normalized)
+        if answer is not None:
+            self._put_local(question, normalized, version, answer)
+        with self._lock:
+            if answer is None:
+                self.misses += 1
+            else:
+                self.shared_hits += 1
+        return answer
+
+    def _get_local(self, question, normalized, version):
+        with self._lock:
+            key = (version, normalized)
+            entry = self._entries.get(key)
+            if entry is not None and not self._expired(entry):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry.answer
+            if entry is not None:
+                del self._entries[key]
+
+            if self.similarity_threshold:
+                key = self._closest(question, normalized, version)
+                if key is not None:
+                    self._entries.move_to_end(key)
+                    self.semantic_hits += 1
+                    return self._entries[key].answer
+            return None
+
+    def put(self, question, version, answer, database=""):
+        normalized = normalize_question(question)
+        self._put_local(question, normalized, version, answer)
+        if self.shared is not None:
+            self.shared.set("answers", database, version, normalized, answer, ttl=self.ttl or None)
+
+    def _put_local(self, question, normalized, version, answer):
+        embedding = self.embed(question) if self.similarity_threshold else None
+        with self._lock:
+            key = (version, normalized)
+            self._entries[key] = _Entry(answer, embedding, set(_NUMBER_RE.findall(normalized)))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "semantic_hits": self.semantic_hits,
+                "shared_hits": self.shared_hits,
+                "misses": self.misses,
+            }
+
+    def _expired(self, entry):
+        return self.ttl and time.monotonic() - entry.created_at > self.ttl
+
+    def _closest(self, question, normalized, version):
+        embedding = self.embed(question)
+        numbers = set(_NUMBER_RE.findall(normalized))
+        best_key, best_score = None, self.similarity_threshold
+        for key, entry in list(self._entries.items()):
+            if key[0] != version or entry.numbers != numbers:
+                continue
+            if self._expired(entry):
+                del self._entries[key]
+                continue
+            score = _cosine(embedding, entry.embedding)
+            if score >= best_score:
+                best_key, best_score = key, score
+        return best_key
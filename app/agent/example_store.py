@@ -0,0 +1,155 @@
+import hashlib
+import threading
+
+from sqlalchemy import (
+    Column,
+    DateTime,
+    Index,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    Text,
+    create_engine,
+    delete,
+    func,
+    inspect,
+    select,
+)
+from sqlalchemy.exc import DBAPIError, IntegrityError
+
+from app.agent.retrieval import ExampleQueryIndex
+from app.config import EXAMPLE_QUERIES, EXAMPLE_STORE_URL
+from app.database.connections import driver_sql
+from app.database.validation import SQLGLOT_DIALECTS, check_read_query
+
+metadata = MetaData()
+
+example_queries = Table(
+    "example_queries",
+    metadata,
+    Column("id", Integer, primary_key=True),
+    # sha256 of the query with whitespace collapsed, so the same SQL is only
+    # stored once however it is formatted.
+    Column("query_key", String(64), nullable=False, unique=True),
+    Column("description", Text, nullable=False),
+    Column("query", Text, nullable=False),
+    Column("created_at", DateTime, server_default=func.now()),
+    Index("example_queries_description_idx", "description"),
+)
+
+
+def query_key(query):
+    return hashlib.sha256(" ".join(query.split()).rstrip(";").encode()).hexdigest()
+
+
+def validate_example_query(engine, query):
+    """EXPLAINs a single read-only statement on ``engine``; raises ValueError."""
+    statement = check_read_query(query, dialect=SQLGLOT_DIALECTS.get(engine.dialect.name, engine.dialect.name))
+    try:
+        with engine.connect() as connection:
+            # EXPLAIN plans the query without running it; the transaction is
+            # rolled back on close either way.
+            connection.exec_driver_sql(driver_sql(engine, f"EXPLAIN {statement}")).fetchall()
+    except DBAPIError as e:
+        raise ValueError(f"The query does not run against this database: {e.orig}") from e
+
+
+class ExampleStore:
+    """Persistent example-query library shared by all sessions.
+
+    Rows live in ``example_queries`` (a SQLite file by default, or any
+    SQLAlchemy URL). The UI reads them a page at a time; retrieval for the
+    agent prompt goes through an in-memory BM25 index kept in step with the
+    table by row id. A new store is seeded with ``EXAMPLE_QUERIES``.
+    """
+
+    def __init__(self, url=EXAMPLE_STORE_URL, seed=EXAMPLE_QUERIES):
+        self.engine = create_engine(url)
+        self.index = ExampleQueryIndex()
+        self._lock = threading.Lock()
+        created = not inspect(self.engine).has_table(example_queries.name)
+        metadata.create_all(self.engine)
+        if created and seed:
+            self._seed(seed)
+        with self.engine.connect() as connection:
+            for row in connection.execute(select(example_queries.c.id, example_queries.c.description, example_queries.c.query)):
+                self.index.add({"description": row.description, "query": row.query}, row.id)
+
+    def __len__(self):
+        return len(self.index)
+
+    def count(self):
+        with self.engine.connect() as connection:
+            return connection.execute(select(func.count()).select_from(example_queries)).scalar()
+
+    def page(self, page, page_size):
+        """Examples on the 1-based ``page``, oldest first."""
+        offset = max(page - 1, 0) * page_size
+        with self.engine.connect() as connection:
+            rows = connection.execute(
+                select(example_queries.c.id, example_queries.c.description, example_queries.c.query)
+                .order_by(example_queries.c.id)
+                .limit(page_size)
+                .offset(offset)
+            )
+            return [{"id": row.id, "description": row.description, "query": row.query} for row in rows]
+
+    def add(self, query, description, validate_on=None):
+        query, description = (query or "").strip(), (description or "").strip()
+        if not query or not description:
+            raise ValueError("Both a query and a description are required.")
+        if validate_on is not None:
+            validate_example_query(validate_on, query)
+        try:
+            with self.engine.begin() as connection:
+                doc_id = connection.execute(
+                    example_queries.insert().values(
+                        query_key=query_key(query), description=description, query=query
+                    )
+                ).inserted_primary_key[0]
+        except IntegrityError as e:
+            raise ValueError("This query is already in the example library.") from e
+        example = {"description": description, "query": query}
+        with self._lock:
+            self.index.add(example, doc_id)
+        return dict(example, id=doc_id)
+
+    def delete_by_description(self, description):
+        with self.engine.begin() as connection:
+            doc_ids = connection.execute(
+                delete(example_queries)
+                .where(example_queries.c.description == description)
+                .returning(example_queries.c.id)
+            ).scalars().all()
+        with self._lock:
+            for doc_id in doc_ids:
+                self.index.remove(doc_id)
+        return len(doc_ids)
+
+    def search(self, question, k):
+        with self._lock:
+            return self.index.search(question, k)
+
+    def _seed(self, examples):
+        rows = {}
+        for example in examples:
+            rows.setdefault(query_key(example["query"]), {
+                "query_key": query_key(example["query"]),
+                "description": example["description"],
+                "query": example["query"],
+            })
+        with self.engine.begin() as connection:
+            connection.execute(example_queries.insert(), list(rows.values()))
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_example_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ExampleStore()
+        return _store
@@ -0,0 +1,186 @@
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import uuid
+
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.checkpoint.sqlite import SqliteSaver
+
+from app.config import (
+    AGENT_MEMORY,
+    AGENT_MEMORY_SAMPLE_ROWS,
+    AGENT_MEMORY_SQLITE_PATH,
+    AGENT_MEMORY_TOKEN_BUDGET,
+)
+from app.database.validation import referenced_tables
+
+MEMORY_ID_PREFIX = "memory-"
+# Rough size of a token, as elsewhere when no tokenizer is at hand.
+CHARS_PER_TOKEN = 4
+
+
+class ThreadedSqliteSaver(SqliteSaver):
+    """SqliteSaver whose async methods run the sync ones in a worker thread,
+    so the same file serves both the thread-pool and the asyncio chat paths."""
+
+    def delete_thread(self, thread_id):
+        with self.cursor() as cursor:
+            cursor.execute("DELETE FROM checkpoints WHERE thread_id = ?", (str(thread_id),))
+            cursor.execute("DELETE FROM writes WHERE thread_id = ?", (str(thread_id),))
+
+    async def aget_tuple(self, config):
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(self, config, *, filter=None, before=None, limit=None):
+        items = await asyncio.to_thread(
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+        )
+        for item in items:
+            yield item
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config, writes, task_id, task_path=""):
+        return await asyncio.to_thread(self.put_writes, config, writes, task_id)
+
+    async def adelete_thread(self, thread_id):
+        return await asyncio.to_thread(self.delete_thread, thread_id)
+
+
+_checkpointer = None
+_checkpointer_lock = threading.Lock()
+
+
+def get_checkpointer():
+    """The process-wide checkpointer chosen by AGENT_MEMORY, or None if it is off."""
+    global _checkpointer
+    if AGENT_MEMORY == "none":
+        return None
+    with _checkpointer_lock:
+        if _checkpointer is None:
+            if AGENT_MEMORY == "memory":
+                _checkpointer = MemorySaver()
+            elif AGENT_MEMORY == "sqlite":
+                _checkpointer = ThreadedSqliteSaver(
+                    sqlite3.connect(AGENT_MEMORY_SQLITE_PATH, check_same_thread=False)
+                )
+            else:
+                raise ValueError(f"Unknown AGENT_MEMORY {AGENT_MEMORY!r}; choose memory, sqlite or none")
+        return _checkpointer
+
+
+class ConversationMemory:
+    """One session's conversation, kept in a checkpointer thread.
+
+    Between turns the thread holds only a question and a compact summary per
+    earlier turn (the function or SQL used, the tables it read and a few
+    result rows), newest last and trimmed to ``token_budget``. The agent sees
+    them ahead of the new question and can refine the previous query instead
+    of exploring the database again. ``digest`` names the current history,
+    so cached answers are only reused for the same history.
+    """
+
+    def __init__(
+        self,
+        thread_id,
+        checkpointer,
+        token_budget=AGENT_MEMORY_TOKEN_BUDGET,
+        sample_rows=AGENT_MEMORY_SAMPLE_ROWS,
+    ):
+        self.thread_id = thread_id
+        self.checkpointer = checkpointer
+        self.token_budget = token_budget
+        self.sample_rows = sample_rows
+        self.digest = None
+        # [question, summary] pairs as last written, and whether the thread
+        # still holds exactly those; None until read back from the thread.
+        self._pairs = None
+        self._clean = False
+
+    def config(self, config=None):
+        """Config for an agent run on this conversation's thread."""
+        self._clean = False
+        config = dict(config or {})
+        config["configurable"] = {**config.get("configurable", {}), "thread_id": self.thread_id}
+        return config
+
+    def prepare(self, graph):
+        """Drops what an interrupted turn left in the thread; returns the digest."""
+        if not self._clean:
+            self._rewrite(graph, self._load(graph))
+        return self.digest
+
+    def remember(self, graph, question, answer):
+        """Replaces the finished turn's messages with its summary."""
+        pairs = self._pairs if self._pairs is not None else self._load(graph)
+        self._rewrite(graph, self._trim(pairs + [[question, self.summarize(answer)]]))
+
+    def clear(self):
+        self.checkpointer.delete_thread(self.thread_id)
+        self.digest = None
+        self._pairs = []
+        self._clean = True
+
+    def summarize(self, answer):
+        """Short text standing in for a turn: approach, SQL, tables and sample rows."""
+        try:
+            parsed = json.loads(answer)
+        except (TypeError, ValueError):
+            parsed = None
+        if not isinstance(parsed, dict):
+            return f"Previous answer: {str(answer)[:500]}"
+
+        parts = [f"Previous answer, approach {parsed.get('approach')}"]
+        if parsed.get("function_used"):
+            parts.append(f"function: {parsed['function_used']}")
+        query = parsed.get("query")
+        if isinstance(query, str) and query.strip():
+            parts.append(f"query: {query.strip()}")
+            tables = referenced_tables(query)
+            if tables:
+                parts.append(f"tables: {', '.join(tables)}")
+        results = parsed.get("results")
+        if isinstance(results, list):
+            sample = json.dumps(results[:self.sample_rows], default=str)
+            parts.append(f"{len(results)} rows, first {min(len(results), self.sample_rows)}: {sample}")
+        return "; ".join(parts)
+
+    def _load(self, graph):
+        messages = graph.get_state(self.config()).values.get("messages", [])
+        contents = [
+            str(message.content) for message in messages if (message.id or "").startswith(MEMORY_ID_PREFIX)
+        ]
+        return [contents[index:index + 2] for index in range(0, len(contents) - 1, 2)]
+
+    def _trim(self, pairs):
+        # Whole pairs are dropped, oldest first; the newest pair is kept and
+        # cut to the budget if it is too long on its own.
+        kept, used = [], 0
+        for pair in reversed(pairs):
+            size = (len(pair[0]) + len(pair[1])) // CHARS_PER_TOKEN
+            if kept and used + size > self.token_budget:
+                break
+            kept.insert(0, pair)
+            used += size
+        if used > self.token_budget:
+            question, summary = kept[-1]
+            kept[-1] = [question, summary[:max(0, self.token_budget * CHARS_PER_TOKEN - len(question))]]
+        return kept
+
+    def _rewrite(self, graph, pairs):
+        # A fresh thread holding only the summaries, so the checkpointer keeps
+        # one small checkpoint per session rather than every step ever taken.
+        self.checkpointer.delete_thread(self.thread_id)
+        messages = []
+        for question, summary in pairs:
+            messages.append(HumanMessage(question, id=f"{MEMORY_ID_PREFIX}{uuid.uuid4().hex}"))
+            messages.append(AIMessage(summary, id=f"{MEMORY_ID_PREFIX}{uuid.uuid4().hex}"))
+        if messages:
+            graph.update_state(self.config(), {"messages": messages}, as_node="agent")
+        self._pairs = pairs
+        self._clean = True
+        self.digest = hashlib.sha1(json.dumps(pairs).encode()).hexdigest() if pairs else None
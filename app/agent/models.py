@@ -0,0 +1,166 @@
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+from app.config import (
+    LLM_CHOICE,
+    LLM_FAST_MODEL,
+    LLM_SIMPLE_MAX_WORDS,
+    LLM_STEP_MODELS,
+    LLM_STRONG_MODEL,
+    OPENAI_API_KEY,
+)
+from app.metrics import MODEL_ATTEMPTS, MODEL_SECONDS, Histogram
+
+# Model choice that routes each question instead of pinning one model.
+AUTO = "auto"
+# Steps a model can be chosen for: extracting a trusted function's arguments,
+# and the agent loop that explores the database and writes SQL.
+STEPS = ("arguments", "agent")
+OUTCOMES = ("ok", "invalid", "error")
+
+# Wording that usually needs joins, grouping or several passes over the data.
+_COMPLEX_RE = re.compile(
+    r"\b(each|per|compare[ds]?|versus|vs|trends?|growth|ratio|percent(age)?|rank(ing)?|cumulative|running"
+    r"|cohorts?|correlat\w*|not|never|without|except|excluding|based on|along with|together with"
+    r"|over time|month over month|year over year)\b"
+)
+
+
+def create_llm(name):
+    # Each provider's client is imported on first use: they are slow to
+    # import, and a deployment usually needs only one of them.
+    if name.startswith("gpt-"):
+        if not OPENAI_API_KEY:
+            raise ValueError(f"OPENAI_API_KEY is not set; it is needed for the OpenAI model {name}.")
+        from langchain_openai import ChatOpenAI
+
+        # stream_usage reports token counts for the request trace while streaming
+        return ChatOpenAI(model=name, temperature=0, api_key=OPENAI_API_KEY, stream_usage=True)
+    from langchain_ollama import ChatOllama
+
+    return ChatOllama(model=name, temperature=0)
+
+
+def model_name(llm):
+    return getattr(llm, "model_name", None) or getattr(llm, "model", None) or type(llm).__name__
+
+
+def is_simple_question(question, max_words=LLM_SIMPLE_MAX_WORDS):
+    text = question.lower()
+    return len(text.split()) <= max_words and not _COMPLEX_RE.search(text)
+
+
+class ModelRouter:
+    """Picks the chat model for each step of answering a question.
+
+    ``choice`` is a model name that then answers everything, or ``"auto"``:
+    argument extraction and simple questions go to ``fast``, everything else
+    to ``strong``, and ``steps`` pins a step to a model. A reply that cannot
+    be parsed, or a failing call, moves on to the next model of the cascade,
+    which always ends with ``strong``.
+
+    Models are built by ``factory`` on first use unless given in ``models``.
+    Every attempt is recorded per model, step and outcome in
+    ``chat_model_attempts_total`` and ``chat_model_seconds`` and in ``stats()``.
+    """
+
+    def __init__(
+        self,
+        choice=LLM_CHOICE,
+        fast=LLM_FAST_MODEL,
+        strong=LLM_STRONG_MODEL,
+        steps=LLM_STEP_MODELS,
+        models=None,
+        factory=create_llm,
+        simple_max_words=LLM_SIMPLE_MAX_WORDS,
+    ):
+        unknown = [step for step in steps if step not in STEPS]
+        if unknown:
+            raise ValueError(f"Unknown model steps {unknown}; choose from {list(STEPS)}")
+        self.choice = choice
+        self.fast = fast
+        self.strong = strong
+        self.steps = dict(steps)
+        self.factory = factory
+        self.simple_max_words = simple_max_words
+        self._models = dict(models or {})
+        self._counts = {}
+        self._latency = Histogram("model_seconds", "Seconds per model attempt", labels=("model", "step"))
+        self._lock = threading.Lock()
+
+    @classmethod
+    def single(cls, llm):
+        """A router that sends every step to ``llm``."""
+        name = model_name(llm)
+        return cls(choice=name, steps={}, models={name: llm})
+
+    @property
+    def default(self):
+        """The model used when a question has not been routed yet."""
+        return self.strong if self.choice == AUTO else self.choice
+
+    def get(self, name):
+        with self._lock:
+            llm = self._models.get(name)
+            if llm is None:
+                llm = self._models[name] = self.factory(name)
+            return llm
+
+    def cascade(self, step, question=""):
+        """Names of the models to try for a step, in order."""
+        if self.choice != AUTO:
+            return [self.choice]
+        first = self.steps.get(step)
+        if first is None:
+            simple = step == "arguments" or is_simple_question(question, self.simple_max_words)
+            first = self.fast if simple else self.strong
+        return [first] if first == self.strong else [first, self.strong]
+
+    def record(self, name, step, seconds, outcome):
+        MODEL_ATTEMPTS.inc(model=name, step=step, outcome=outcome)
+        MODEL_SECONDS.observe(seconds, model=name, step=step)
+        with self._lock:
+            key = (name, step, outcome)
+            self._counts[key] = self._counts.get(key, 0) + 1
+            self._latency.observe(seconds, model=name, step=step)
+
+    @contextmanager
+    def attempt(self, name, step):
+        """Records one attempt at a step. Set ``attempt["outcome"]`` to
+        "invalid" when the reply cannot be used; exceptions count as "error"."""
+        attempt = {"outcome": "ok"}
+        started = time.perf_counter()
+        try:
+            yield attempt
+        except Exception:
+            attempt["outcome"] = "error"
+            raise
+        except BaseException:
+            # Cancelled, for example a chat closed by the browser; nothing to judge.
+            attempt["outcome"] = None
+            raise
+        finally:
+            if attempt["outcome"]:
+                self.record(name, step, time.perf_counter() - started, attempt["outcome"])
+
+    def stats(self):
+        """{model: {step: {"attempts", "ok", "invalid", "error", "success_rate", "p50_ms", "p95_ms"}}}."""
+        # Counts and latencies are recorded and read under one lock, so every
+        # latency summary has the counts it belongs to.
+        with self._lock:
+            counts = dict(self._counts)
+            latencies = self._latency.summary()
+        stats = {}
+        for (name, step, outcome), count in counts.items():
+            step_stats = stats.setdefault(name, {}).setdefault(step, dict.fromkeys(OUTCOMES, 0))
+            step_stats[outcome] = count
+        for (name, step), summary in latencies.items():
+            step_stats = stats[name][step]
+            step_stats["attempts"] = sum(step_stats[outcome] for outcome in OUTCOMES)
+            step_stats["success_rate"] = step_stats["ok"] / step_stats["attempts"]
+            step_stats["p50_ms"] = summary[0.5] * 1000
+            step_stats["p95_ms"] = summary[0.95] * 1000
+        return stats
+
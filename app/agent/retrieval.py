@@ -0,0 +1,101 @@
+import heapq
+import math
+import re
+from collections import Counter, defaultdict
+
+_TOKEN_RE = re.compile(r"[a-z0-9_]+")
+_STOP_WORDS = frozenset(
+    "a an and are as at be by for from has have in is it me of on or our show "
+    "that the their them to was what which who with".split()
+)
+
+
+def tokenize(text):
+    return [token for token in _TOKEN_RE.findall(text.lower()) if token not in _STOP_WORDS]
+
+
+class BM25Index:
+    """Okapi BM25 over short documents with incremental add/remove.
+
+    Only documents sharing at least one term with the query are scored, so a
+    search costs roughly the size of the matching postings lists rather than
+    the whole corpus.
+    """
+
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.lengths = {}
+        self.terms = {}
+        self.postings = defaultdict(dict)
+        self.total_length = 0
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def add(self, doc_id, text):
+        if doc_id in self.lengths:
+            self.remove(doc_id)
+        terms = Counter(tokenize(text))
+        for term, frequency in terms.items():
+            self.postings[term][doc_id] = frequency
+        length = sum(terms.values())
+        self.terms[doc_id] = tuple(terms)
+        self.lengths[doc_id] = length
+        self.total_length += length
+
+    def remove(self, doc_id):
+        length = self.lengths.pop(doc_id, None)
+        if length is None:
+            return
+        self.total_length -= length
+        for term in self.terms.pop(doc_id):
+            documents = self.postings[term]
+            del documents[doc_id]
+            if not documents:
+                del self.postings[term]
+
+    def search(self, query, k):
+        if not self.lengths:
+            return []
+        document_count = len(self.lengths)
+        average_length = self.total_length / document_count or 1.0
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            documents = self.postings.get(term)
+            if not documents:
+                continue
+            idf = math.log(1 + (document_count - len(documents) + 0.5) / (len(documents) + 0.5))
+            for doc_id, frequency in documents.items():
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[doc_id] / average_length)
+                scores[doc_id] += idf * frequency * (self.k1 + 1) / (frequency + norm)
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+
+class ExampleQueryIndex:
+    """Retrieves the example queries most relevant to a question."""
+
+    def __init__(self, examples=()):
+        self.index = BM25Index()
+        self.examples = {}
+        self._next_id = 0
+        for example in examples:
+            self.add(example)
+
+    def __len__(self):
+        return len(self.examples)
+
+    def add(self, example, doc_id=None):
+        if doc_id is None:
+            doc_id = self._next_id
+        self._next_id = max(self._next_id, doc_id + 1)
+        self.examples[doc_id] = example
+        self.index.add(doc_id, f"{example['description']} {example['query']}")
+        return doc_id
+
+    def remove(self, doc_id):
+        if self.examples.pop(doc_id, None) is not None:
+            self.index.remove(doc_id)
+
+    def search(self, question, k):
+        return [self.examples[doc_id] for doc_id, _ in self.index.search(question, k)]
@@ -0,0 +1,184 @@
+import asyncio
+import json
+import logging
+import re
+
+from app import tracing
+from app.agent.retrieval import BM25Index, tokenize
+from app.config import FUNCTION_ROUTER_MAX_ROWS, FUNCTION_ROUTER_MIN_CONFIDENCE
+from app.database.connections import get_async_engine
+from app.database.functions import DatabaseFunctions
+from app.database.trusted import get_trusted_executor
+
+ARGUMENT_PROMPT = """You decide whether a trusted PostgreSQL function answers a user question.
+
+Function: {name}({arguments})
+Description: {description}
+
+Question: {question}
+
+If the function answers the question, extract the argument values in the order
+they are declared, omitting trailing arguments that have defaults and are not
+mentioned in the question. Reply with a single JSON object and nothing else:
+{{"match": true, "arguments": [<value>, ...]}}
+or, if the function does not answer the question:
+{{"match": false, "arguments": []}}
+"""
+
+_JSON_FENCE_RE = re.compile(r"^```(?:json)?\s*|\s*```$")
+
+logger = logging.getLogger(__name__)
+
+
+class FunctionRouter:
+    """Answers questions with a trusted function without running the agent loop.
+
+    Candidates are ranked with BM25 over function names and comments. The best
+    one is only tried when most of the question's words appear in its name or
+    description; a single LLM call then confirms the match and extracts the
+    arguments, and the function is executed through the trusted function
+    executor with bound parameters. The call goes to the models ``models``
+    picks for the "arguments" step, escalating when a reply is not valid JSON.
+    """
+
+    def __init__(self, engine, models, min_confidence=FUNCTION_ROUTER_MIN_CONFIDENCE):
+        self.engine = engine
+        self.models = models
+        self.min_confidence = min_confidence
+        self.db_functions = DatabaseFunctions(engine)
+        self.executor = get_trusted_executor(engine)
+        self._functions = None
+        self._index = None
+
+    def route(self, question):
+        function = self.match(question)
+        if function is None:
+            return None
+        prompt = self._argument_prompt(question, function)
+        arguments = None
+        for name in self.models.cascade("arguments", question):
+            try:
+                with self.models.attempt(name, "arguments") as attempt:
+                    reply = self.models.get(name).invoke(prompt, config=tracing.callback_config())
+                    arguments = self._parse_arguments(reply.content, attempt)
+            except Exception as e:
+                logger.warning(f"Argument extraction with {name} failed: {e}")
+                continue
+            if attempt["outcome"] == "ok":
+                break
+        if arguments is None:
+            return None
+        signature = self.executor.resolve(
+            function["function_name"], arguments, declared=function.get("function_arguments")
+        )
+        arguments = signature.coerce(arguments)
+        result = self.executor.call(signature, arguments)
+        statement = self.executor.statement(signature, arguments)
+        return self._answer(function, statement, arguments, result.columns, result.rows)
+
+    async def aroute(self, question):
+        async_engine = get_async_engine(self.engine)
+        functions = await DatabaseFunctions(self.engine, async_engine).aget_all_functions()
+        function = self._best_match(question, functions)
+        if function is None:
+            return None
+        prompt = self._argument_prompt(question, function)
+        arguments = None
+        for name in self.models.cascade("arguments", question):
+            try:
+                with self.models.attempt(name, "arguments") as attempt:
+                    reply = await self.models.get(name).ainvoke(prompt, config=tracing.callback_config())
+                    arguments = self._parse_arguments(reply.content, attempt)
+            except Exception as e:
+                logger.warning(f"Argument extraction with {name} failed: {e}")
+                continue
+            if attempt["outcome"] == "ok":
+                break
+        if arguments is None:
+            return None
+        signature = await asyncio.to_thread(
+            self.executor.resolve, function["function_name"], arguments, function.get("function_arguments")
+        )
+        arguments = signature.coerce(arguments)
+        # asyncpg prepares and caches bound statements per connection itself.
+        statement = self.executor.statement(signature, arguments)
+        with tracing.span("db", sql=str(statement)) as span:
+            async with async_engine.connect() as connection:
+                result = await connection.execute(statement)
+                columns = list(result.keys())
+                rows = result.fetchmany(FUNCTION_ROUTER_MAX_ROWS)
+                span["rows"] = len(rows)
+        return self._answer(function, statement, arguments, columns, rows)
+
+    def match(self, question):
+        return self._best_match(question, self.db_functions.get_all_functions())
+
+    def _best_match(self, question, functions):
+        if functions is not self._functions:
+            # Only plain functions can be called; aggregates, window
+            # functions and procedures are not candidates.
+            index = BM25Index()
+            for position, function in enumerate(functions):
+                if function.get("kind", "f") == "f":
+                    index.add(position, self._describe(function))
+            self._index, self._functions = index, functions
+        index = self._index
+
+        ranked = index.search(question, 1)
+        if not ranked:
+            return None
+        function = functions[ranked[0][0]]
+
+        # Numbers are usually argument values, so only words count towards
+        # the confidence.
+        words = {token for token in tokenize(question) if not token.isdigit()}
+        if not words:
+            return None
+        known = set(tokenize(self._describe(function)))
+        if len(words & known) / len(words) < self.min_confidence:
+            return None
+        return function
+
+    @staticmethod
+    def _argument_prompt(question, function):
+        return ARGUMENT_PROMPT.format(
+            name=function["function_name"],
+            arguments=function.get("function_arguments") or "",
+            description=function["description"] or "No description available.",
+            question=question,
+        )
+
+    @staticmethod
+    def _parse_arguments(content, attempt):
+        # A well-formed "no match" is an answer; anything else is marked
+        # invalid so the next model gets a try.
+        try:
+            reply = json.loads(_JSON_FENCE_RE.sub("", content.strip()))
+        except (AttributeError, TypeError, ValueError):
+            reply = None
+        if not isinstance(reply, dict) or not isinstance(reply.get("arguments") or [], list):
+            attempt["outcome"] = "invalid"
+            return None
+        if not reply.get("match"):
+            return None
+        return reply.get("arguments") or []
+
+    def _answer(self, function, statement, arguments, columns, rows):
+        try:
+            query = str(statement.compile(dialect=self.engine.dialect, compile_kwargs={"literal_binds": True}))
+        except Exception:
+            query = f"{statement} -- {arguments}"
+        return json.dumps(
+            {
+                "results": [dict(zip(columns, row)) for row in rows],
+                "approach": "FUNCTION",
+                "function_used": function["function_name"],
+                "query": query,
+            },
+            default=str,
+        )
+
+    @staticmethod
+    def _describe(function):
+        name = function["function_name"].replace("_", " ")
+        return f"{name} {function['description'] or ''}"
@@ -0,0 +1,300 @@
+import json
+import logging
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, datetime
+from decimal import Decimal
+
+from app.agent.agent import AgentSetup
+from app.agent.example_store import get_example_store, query_key
+from app.agent.models import ModelRouter
+from app.config import (
+    BATCH_COMPARE_MAX_ROWS,
+    BATCH_CONCURRENCY,
+    BATCH_MAX_RETRIES,
+    BATCH_RETRY_BASE_SECONDS,
+    BATCH_RETRY_MAX_SECONDS,
+)
+from app.database.functions import DatabaseFunctions
+from app.database.query import QueryExecutor
+from app.database.validation import SQLGLOT_DIALECTS, check_read_query
+from app.metrics import quantile
+from app.tracing import Trace
+from app.ui.gradio_ui import GradioInterface, create_agent_tools
+from app.ui.session import ChatSession
+
+logger = logging.getLogger(__name__)
+
+# Errors worth retrying besides HTTP 429 and 5xx: the provider was busy or
+# could not be reached.
+_RETRY_ERRORS = {"RateLimitError", "APITimeoutError", "APIConnectionError", "InternalServerError", "TimeoutError"}
+
+
+def load_questions(path=None):
+    """[{"question", "query"}] from a file, or from the example library.
+
+    ``.jsonl`` and ``.json`` files hold objects with a "question" (or an
+    example's "description") and optionally the reference "query"; any other
+    file is one question per line. Without a path every example query in the
+    library is used, with its query as the reference.
+    """
+    if path is None:
+        store = get_example_store()
+        examples = store.page(1, store.count())
+        return [{"question": example["description"], "query": example["query"]} for example in examples]
+    with open(path) as questions_file:
+        if path.endswith(".jsonl"):
+            items = [json.loads(line) for line in questions_file if line.strip()]
+        elif path.endswith(".json"):
+            items = json.load(questions_file)
+        else:
+            items = [{"question": line.strip()} for line in questions_file if line.strip()]
+    questions = []
+    for item in items:
+        question = item.get("question") or item.get("description")
+        if not question:
+            raise ValueError(f"Every item in {path} needs a question: {item}")
+        questions.append({"question": question, "query": item.get("query")})
+    return questions
+
+
+def retry_delay(error, attempt, base=BATCH_RETRY_BASE_SECONDS, cap=BATCH_RETRY_MAX_SECONDS):
+    """Seconds to wait before retrying after ``error``, or None when a retry
+    would not help. A Retry-After header is honored; otherwise the delay
+    doubles per attempt, with jitter so workers do not retry in lockstep."""
+    response = getattr(error, "response", None)
+    status = getattr(error, "status_code", None) or getattr(response, "status_code", None)
+    if not (status == 429 or (isinstance(status, int) and status >= 500) or type(error).__name__ in _RETRY_ERRORS):
+        return None
+    try:
+        retry_after = float(getattr(response, "headers", {}).get("retry-after"))
+    except (TypeError, ValueError):
+        retry_after = 0.0
+    backoff = base * 2 ** attempt * random.uniform(0.5, 1.0)
+    return min(cap, max(retry_after, backoff))
+
+
+def _comparable(value):
+    if isinstance(value, (float, Decimal)):
+        return round(float(value), 6)
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value if value is None or isinstance(value, (int, str, bool)) else str(value)
+
+
+class BatchRunner:
+    """Answers a list of questions without the UI, for evaluation and to warm caches.
+
+    Every question goes through the same steps as a chat message (answer
+    cache, function router, agent with model escalation) in a new session
+    of its own, ``concurrency`` at a time. A question that
+    fails with a rate limit or a provider error is retried up to
+    ``max_retries`` times; the wait is shared, so every worker pauses while
+    the provider asks to slow down. Answers are stored in the answer cache,
+    and the schema and function caches fill on the way, so a run after a
+    deploy leaves them warm for the first users. ``use_cache=False`` skips
+    the answer cache lookup to measure the agent itself.
+
+    With a reference query the answer is checked by running both queries:
+    it is correct when they return the same rows, ignoring column names and
+    row order.
+    """
+
+    def __init__(
+        self,
+        engine,
+        models=None,
+        tools=None,
+        interface=None,
+        concurrency=BATCH_CONCURRENCY,
+        max_retries=BATCH_MAX_RETRIES,
+        retry_base=BATCH_RETRY_BASE_SECONDS,
+        use_cache=True,
+    ):
+        self.engine = engine
+        self.interface = interface or GradioInterface()
+        if tools is None:
+            tools = create_agent_tools(engine) if engine.dialect.name == "postgresql" else []
+        self.agent_setup = AgentSetup(engine, models=models or ModelRouter(), tools=tools)
+        self.agent_setup.setup()
+        self.db_functions = DatabaseFunctions(engine)
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.retry_base = retry_base
+        self.use_cache = use_cache
+        self.executor = QueryExecutor(engine, max_rows=BATCH_COMPARE_MAX_ROWS, max_bytes=BATCH_COMPARE_MAX_ROWS * 1024)
+        self._dialect = SQLGLOT_DIALECTS.get(engine.dialect.name, engine.dialect.name)
+        self._references = {}
+        self._resume_at = 0.0
+        self._lock = threading.Lock()
+
+    def run(self, questions):
+        """Yields one record per question as it finishes (see ``_record``)."""
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="batch") as pool:
+            futures = [pool.submit(self.answer, index, item) for index, item in enumerate(questions)]
+            for future in as_completed(futures):
+                yield future.result()
+
+    def answer(self, index, item):
+        question = item["question"]
+        session = self._session(index)
+        started = time.perf_counter()
+        response, outcome, error, trace = None, "error", None, None
+        try:
+            for attempt in range(self.max_retries + 1):
+                self._wait_for_provider()
+                trace = Trace(question)
+                session.last_trace = trace
+                try:
+                    with trace.activate():
+                        response, outcome = self._ask(session, question, trace)
+                    trace.finish(outcome)
+                    error = None
+                    break
+                except Exception as e:
+                    trace.finish("error")
+                    error = e
+                    delay = retry_delay(e, attempt, self.retry_base)
+                    if delay is None or attempt == self.max_retries:
+                        break
+                    logger.warning(f"Question {index} failed ({e}), retrying in {delay:.2f}s")
+                    self._pause(delay)
+        finally:
+            session.close()
+        record = self._record(index, item, trace, response, outcome if error is None else "error", error)
+        record["attempts"] = attempt + 1
+        record["wall_seconds"] = round(time.perf_counter() - started, 4)
+        return record
+
+    def _session(self, index):
+        # A new conversation per question: answers are cached for the empty
+        # history every chat starts with, and closing the session drops it.
+        session = ChatSession(f"batch-{index}-{uuid.uuid4().hex}")
+        session.engine = self.engine
+        session.db_functions = self.db_functions
+        session.agent_setup = self.agent_setup
+        return session
+
+    def _ask(self, session, question, trace):
+        """(answer, outcome) for one question, as the chat tab would answer it."""
+        interface = self.interface
+        with trace.span("answer_cache") as span:
+            cache_version, cached_response = interface._cached_answer(session, question)
+            if not self.use_cache:
+                cached_response = None
+            span["hit"] = cached_response is not None
+        if cached_response is not None:
+            return cached_response, "cached"
+
+        response, outcome = "", "answered"
+        for kind, content in interface._stream_agent(session, question, trace):
+            if kind in ("final", "routed"):
+                response, outcome = content, ("routed" if kind == "routed" else outcome)
+                break
+            trace.mark_first_update()
+        interface._store_answer(session, question, cache_version, response)
+        return response, outcome
+
+    def _wait_for_provider(self):
+        with self._lock:
+            delay = self._resume_at - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def _pause(self, delay):
+        with self._lock:
+            self._resume_at = max(self._resume_at, time.monotonic() + delay)
+
+    def _record(self, index, item, trace, response, outcome, error):
+        """One JSON-serializable result line."""
+        try:
+            answer = json.loads(response) if response else None
+        except ValueError:
+            answer = None
+        answer = answer if isinstance(answer, dict) else {}
+        query = answer.get("query") if isinstance(answer.get("query"), str) else None
+        input_tokens, output_tokens = trace.tokens() if trace else (0, 0)
+        llm_spans = [span for span in trace.spans if span.stage == "llm"] if trace else []
+        reference = item.get("query")
+        return {
+            "index": index,
+            "question": item["question"],
+            "outcome": outcome,
+            "approach": answer.get("approach"),
+            "function_used": answer.get("function_used"),
+            "query": query,
+            "reference_query": reference,
+            "exact_sql": bool(query and reference) and query_key(query) == query_key(reference),
+            "correct": self.check(query, reference),
+            "seconds": round(trace.total, 4) if trace and trace.total is not None else None,
+            "first_update_seconds": round(trace.first_update, 4) if trace and trace.first_update is not None else None,
+            "llm_calls": len(llm_spans),
+            "models": sorted({span.attributes.get("model") for span in llm_spans}),
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "error": str(error) if error else None,
+        }
+
+    def check(self, query, reference):
+        """Whether ``query`` returns the rows of ``reference``; None without a
+        reference, or when either result is too large to compare."""
+        if not reference:
+            return None
+        try:
+            expected = self._rows(reference, cached=True)
+        except Exception as e:
+            logger.warning(f"The reference query could not be run: {e}")
+            return None
+        if expected is None:
+            return None
+        if not query:
+            return False
+        try:
+            actual = self._rows(query)
+        except Exception as e:
+            logger.info(f"The answer's query could not be run for comparison: {e}")
+            return False
+        return None if actual is None else actual == expected
+
+    def _rows(self, query, cached=False):
+        # Multiset of rows, or None when the result was truncated.
+        key = query_key(query)
+        if cached and key in self._references:
+            rows = self._references[key]
+            if isinstance(rows, Exception):
+                raise rows
+            return rows
+        try:
+            result = self.executor.execute(check_read_query(query, dialect=self._dialect))
+        except Exception as e:
+            if cached:
+                self._references[key] = e
+            raise
+        rows = None if result.truncated else Counter(tuple(_comparable(value) for value in row) for row in result.rows)
+        if cached:
+            self._references[key] = rows
+        return rows
+
+
+def summarize(records, elapsed):
+    """Totals of a run: outcomes, accuracy, latency percentiles, throughput and tokens."""
+    seconds = sorted(record["seconds"] for record in records if record["seconds"] is not None)
+    checked = [record["correct"] for record in records if record["correct"] is not None]
+    return {
+        "questions": len(records),
+        "outcomes": dict(Counter(record["outcome"] for record in records)),
+        "approaches": dict(Counter(record["approach"] or "NONE" for record in records)),
+        "checked": len(checked),
+        "accuracy": round(sum(checked) / len(checked), 4) if checked else None,
+        "exact_sql": sum(record["exact_sql"] for record in records),
+        "retries": sum(record["attempts"] - 1 for record in records),
+        "p50_seconds": quantile(seconds, 0.5),
+        "p95_seconds": quantile(seconds, 0.95),
+        "questions_per_second": round(len(records) / elapsed, 3) if elapsed else None,
+        "input_tokens": sum(record["input_tokens"] for record in records),
+        "output_tokens": sum(record["output_tokens"] for record in records),
+    }
@@ -0,0 +1,247 @@
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from app.config import (
+    CACHE_BACKENDS,
+    CACHE_MEMORY_MAX_ENTRIES,
+    CACHE_REDIS_URL,
+    CACHE_SQLITE_PATH,
+    CACHE_TTL,
+)
+from app.metrics import CACHE_LOOKUPS
+
+logger = logging.getLogger(__name__)
+
+# Bumped whenever the shape of a cached value changes, so replicas running
+# different releases never read each other's entries.
+KEY_VERSION = 1
+KEY_PREFIX = "datachat"
+
+
+def database_key(engine):
+    """Short, password-free name of the database an engine points at."""
+    url = engine.url.render_as_string(hide_password=True)
+    return hashlib.sha1(url.encode()).hexdigest()[:16]
+
+
+def cache_key(kind, database, version, key):
+    """``datachat:v<KEY_VERSION>:<kind>:<database>:<digest>``.
+
+    The version stamp (a catalog or schema fingerprint, for example) is part
+    of the digest, so a changed database is simply a miss.
+    """
+    digest = hashlib.sha1(json.dumps([version, key], default=str).encode()).hexdigest()
+    return f"{KEY_PREFIX}:v{KEY_VERSION}:{kind}:{database}:{digest}"
+
+
+class MemoryBackend:
+    """Process-local LRU of serialized values; a fast first tier."""
+
+    name = "memory"
+
+    def __init__(self, max_entries=CACHE_MEMORY_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at and time.time() > expires_at:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._entries[key] = (value, time.time() + ttl if ttl else None)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+class SQLiteBackend:
+    """Key-value table in a SQLite file that replicas on one host share.
+
+    Every thread gets its own connection; WAL mode lets readers in other
+    processes carry on while one of them writes.
+    """
+
+    name = "sqlite"
+    PURGE_EVERY = 256
+
+    def __init__(self, path=CACHE_SQLITE_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._writes = 0
+        with self._connection() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)"
+            )
+
+    def get(self, key):
+        row = self._connection().execute(
+            "SELECT value, expires_at FROM cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        if row[1] and time.time() > row[1]:
+            self.delete(key)
+            return None
+        return row[0]
+
+    def set(self, key, value, ttl=None):
+        with self._connection() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, time.time() + ttl if ttl else None),
+            )
+            self._writes += 1
+            if self._writes % self.PURGE_EVERY == 0:
+                connection.execute("DELETE FROM cache WHERE expires_at < ?", (time.time(),))
+
+    def delete(self, key):
+        with self._connection() as connection:
+            connection.execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+
+class RedisBackend:
+    """Any server speaking the Redis protocol (Redis, Valkey, KeyDB, ...)."""
+
+    name = "redis"
+
+    def __init__(self, url=CACHE_REDIS_URL, client=None):
+        if client is None:
+            import redis
+
+            client = redis.Redis.from_url(url, socket_timeout=1, socket_connect_timeout=1)
+        self.client = client
+
+    def get(self, key):
+        value = self.client.get(key)
+        return value.decode() if isinstance(value, bytes) else value
+
+    def set(self, key, value, ttl=None):
+        self.client.set(key, value, ex=max(1, int(ttl)) if ttl else None)
+
+    def delete(self, key):
+        self.client.delete(key)
+
+
+_RESULT_FIELDS = {"hit": "hits", "miss": "misses", "error": "errors"}
+
+BACKENDS = {
+    "memory": MemoryBackend,
+    "sqlite": SQLiteBackend,
+    "redis": RedisBackend,
+}
+
+
+class TieredCache:
+    """JSON values looked up tier by tier, fastest first.
+
+    A hit in a slower tier is copied into the faster ones in front of it;
+    writes go to every tier. A failing tier is logged and skipped, so an
+    unreachable Redis only costs the lookup. Lookups are counted per kind,
+    tier and result in ``cache_lookups_total`` and in ``stats()``.
+    """
+
+    def __init__(self, tiers, ttl=CACHE_TTL):
+        self.tiers = list(tiers)
+        self.ttl = ttl
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def get(self, kind, database, version, key):
+        full_key = cache_key(kind, database, version, key)
+        for index, tier in enumerate(self.tiers):
+            try:
+                value = tier.get(full_key)
+            except Exception as e:
+                logger.warning(f"Cache tier {tier.name} failed on get: {e}")
+                self._count(kind, tier, "error")
+                continue
+            if value is None:
+                self._count(kind, tier, "miss")
+                continue
+            self._count(kind, tier, "hit")
+            for faster in self.tiers[:index]:
+                self._set_tier(faster, full_key, value, self.ttl)
+            return json.loads(value)
+        return None
+
+    def set(self, kind, database, version, key, value, ttl=None):
+        full_key = cache_key(kind, database, version, key)
+        serialized = json.dumps(value, default=str)
+        for tier in self.tiers:
+            self._set_tier(tier, full_key, serialized, ttl or self.ttl)
+
+    def stats(self):
+        """{kind: {tier: {"hits", "misses", "errors", "hit_rate"}}}."""
+        with self._lock:
+            counts = dict(self._counts)
+        stats = {}
+        for (kind, tier, result), count in counts.items():
+            tier_stats = stats.setdefault(kind, {}).setdefault(tier, {"hits": 0, "misses": 0, "errors": 0})
+            tier_stats[_RESULT_FIELDS[result]] = count
+        for tiers in stats.values():
+            for tier_stats in tiers.values():
+                lookups = tier_stats["hits"] + tier_stats["misses"]
+                tier_stats["hit_rate"] = tier_stats["hits"] / lookups if lookups else None
+        return stats
+
+    def _set_tier(self, tier, key, value, ttl):
+        try:
+            tier.set(key, value, ttl)
+        except Exception as e:
+            logger.warning(f"Cache tier {tier.name} failed on set: {e}")
+
+    def _count(self, kind, tier, result):
+        CACHE_LOOKUPS.inc(kind=kind, tier=tier.name, result=result)
+        with self._lock:
+            key = (kind, tier.name, result)
+            self._counts[key] = self._counts.get(key, 0) + 1
+
+
+_shared_cache = None
+_shared_cache_lock = threading.Lock()
+
+
+def create_cache(backends=CACHE_BACKENDS):
+    unknown = [name for name in backends if name not in BACKENDS]
+    if unknown:
+        raise ValueError(f"Unknown cache backends {unknown}; choose from {sorted(BACKENDS)}")
+    return TieredCache([BACKENDS[name]() for name in backends])
+
+
+def get_shared_cache():
+    """The process-wide cache built from CACHE_BACKENDS, or None if it is empty."""
+    global _shared_cache
+    if not CACHE_BACKENDS:
+        return None
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            _shared_cache = create_cache()
+        return _shared_cache
@@ -0,0 +1,146 @@
+import argparse
+import json
+import sys
+import time
+
+from sqlalchemy import create_engine
+
+from app.config import BATCH_CONCURRENCY, BATCH_MAX_RETRIES, DB_HOST, DB_PORT, LLM_CHOICE
+from app.database.bundle import BundleError, FunctionLibrary, dump_bundle, load_bundle
+from app.database.connections import engine_registry
+
+
+def bundle_format(path, format=None):
+    if format:
+        return format
+    if path.endswith((".yaml", ".yml")):
+        return "yaml"
+    if path.endswith(".sql"):
+        return "sql"
+    return "dir"
+
+
+def connect(args):
+    if args.url:
+        return create_engine(args.url)
+    if not (args.user and args.db):
+        raise SystemExit("Pass --url, or --user, --password and --db.")
+    return engine_registry.acquire(args.user, args.password, args.db, args.host, args.port)
+
+
+def export_functions(library, args):
+    functions = library.export()
+    dump_bundle(functions, args.path, bundle_format(args.path, args.format))
+    print(f"Exported {len(functions)} functions to {args.path}")
+
+
+def import_functions(library, args, dry_run=False):
+    plan = library.plan(load_bundle(args.path), prune=args.prune, force=args.force)
+    summary = plan.summary()
+    for action in ("create", "update", "drop"):
+        for name in summary[action]:
+            print(f"{action:<7} {name}")
+    print(
+        f"{len(plan.create)} to create, {len(plan.update)} to update, "
+        f"{len(plan.drop)} to drop, {len(plan.unchanged)} unchanged"
+    )
+    if args.json:
+        print(json.dumps(summary, indent=2))
+    if dry_run or not plan.changes:
+        return
+    library.apply(plan)
+    print("Applied in one transaction.")
+
+
+def run_batch(engine, args):
+    # Imported here: the batch runner pulls in the agent and the UI, which
+    # the function commands do not need.
+    from app.agent.models import ModelRouter
+    from app.batch import BatchRunner, load_questions, summarize
+
+    questions = load_questions(args.questions)
+    runner = BatchRunner(
+        engine,
+        models=ModelRouter(choice=args.model),
+        concurrency=args.concurrency,
+        max_retries=args.retries,
+        use_cache=not args.fresh,
+    )
+    records = []
+    started = time.perf_counter()
+    with open(args.output, "w") as output:
+        for record in runner.run(questions):
+            records.append(record)
+            output.write(json.dumps(record, default=str) + "\n")
+            output.flush()
+            correct = {True: "correct", False: "WRONG", None: "unchecked"}[record["correct"]]
+            print(f"[{len(records)}/{len(questions)}] {record['outcome']:<8} {correct:<9} "
+                  f"{record['seconds'] or 0:>7.2f}s  {record['question']}")
+    summary = summarize(records, time.perf_counter() - started)
+    print(json.dumps(summary, indent=2))
+    print(f"Wrote {len(records)} results to {args.output}")
+    return 1 if summary["outcomes"].get("error") else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.cli", description="Data Chat Rooms maintenance commands")
+    parser.add_argument("--url", help="SQLAlchemy database URL; overrides the options below")
+    parser.add_argument("--user")
+    parser.add_argument("--password")
+    parser.add_argument("--db")
+    parser.add_argument("--host", default=DB_HOST)
+    parser.add_argument("--port", type=int, default=DB_PORT)
+    commands = parser.add_subparsers(dest="group", required=True)
+
+    functions = commands.add_parser("functions", help="bulk import and export of database functions")
+    actions = functions.add_subparsers(dest="action", required=True)
+
+    export = actions.add_parser("export", help="write the public function catalog to a bundle")
+    export.add_argument("path", help="a .yaml or .sql file, or a directory of .sql files")
+    export.add_argument("--format", choices=["yaml", "sql", "dir"], help="default: from the path")
+
+    for name, help in (
+        ("import", "create and update the functions of a bundle in one transaction"),
+        ("diff", "show what import would change without applying it"),
+    ):
+        action = actions.add_parser(name, help=help)
+        action.add_argument("path", help="a .yaml or .sql bundle, or a directory of them")
+        action.add_argument("--prune", action="store_true", help="also drop public functions missing from the bundle")
+        action.add_argument("--force", action="store_true", help="re-create functions even when unchanged")
+        action.add_argument("--json", action="store_true", help="also print the plan as JSON")
+        if name == "import":
+            action.add_argument("--dry-run", action="store_true", help="same as diff")
+
+    batch = commands.add_parser(
+        "batch",
+        help="answer a file of questions through the agent; checks answers and warms the caches",
+    )
+    batch.add_argument(
+        "questions", nargs="?",
+        help=".jsonl/.json with a question and a reference query per item, or one question per line "
+             "(default: the example query library)",
+    )
+    batch.add_argument("--output", default="batch_results.jsonl", help="JSONL file with one result per question")
+    batch.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY, help="questions answered at once")
+    batch.add_argument("--retries", type=int, default=BATCH_MAX_RETRIES, help="retries after a rate limit or provider error")
+    batch.add_argument("--model", default=LLM_CHOICE, help='a model name, or "auto" to route per question')
+    batch.add_argument("--fresh", action="store_true", help="do not answer from the answer cache")
+
+    args = parser.parse_args(argv)
+    engine = connect(args)
+    if args.group == "batch":
+        return run_batch(engine, args)
+    library = FunctionLibrary(engine)
+    try:
+        if args.action == "export":
+            export_functions(library, args)
+        else:
+            import_functions(library, args, dry_run=args.action == "diff" or args.dry_run)
+    except BundleError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,10 +3,151 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
-# Get the OpenAI API key from the environment variable
+# Get the OpenAI API key from the environment variable; it is only checked
+# when an OpenAI model is first used, so Ollama-only deployments can leave it out
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-if not OPENAI_API_KEY:
-    raise ValueError("OPENAI_API_KEY not found in .env file")    
+
+# Seconds the function catalog is served from memory before re-checking pg_proc
+FUNCTION_CATALOG_CHECK_INTERVAL = float(os.getenv("FUNCTION_CATALOG_CHECK_INTERVAL", "5"))
+
+# Connection pool settings, shared by every session that connects with the
+# same user, database and host
+DB_HOST = os.getenv("DB_HOST", "localhost")
+DB_PORT = int(os.getenv("DB_PORT", "5432"))
+DB_REPLICA_HOST = os.getenv("DB_REPLICA_HOST")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "30000"))
+
+# Seconds a schema fingerprint probe is reused before pg_class is checked again
+SCHEMA_CHECK_INTERVAL = float(os.getenv("SCHEMA_CHECK_INTERVAL", "5"))
+
+# Directory for on-disk schema snapshots so restarts start warm; unset to disable
+SCHEMA_SNAPSHOT_DIR = os.getenv("SCHEMA_SNAPSHOT_DIR")
+
+# Budgets for queries run by the agent; larger results are truncated with a
+# marker and can be downloaded in full from the chat tab
+QUERY_MAX_ROWS = int(os.getenv("QUERY_MAX_ROWS", "200"))
+QUERY_MAX_BYTES = int(os.getenv("QUERY_MAX_BYTES", "65536"))
+QUERY_STATEMENT_TIMEOUT_MS = int(os.getenv("QUERY_STATEMENT_TIMEOUT_MS", "10000"))
+QUERY_BATCH_SIZE = int(os.getenv("QUERY_BATCH_SIZE", "500"))
+
+# Agent answer cache; a similarity of 0 keeps lookups to exact question matches
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "512"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "3600"))
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0"))
+
+# Cache shared between app replicas for function catalogs, table info and
+# agent answers: a comma-separated list of tiers looked up in order (memory,
+# sqlite, redis); empty keeps every cache local to the process
+CACHE_BACKENDS = [name.strip() for name in os.getenv("CACHE_BACKENDS", "").split(",") if name.strip()]
+CACHE_TTL = float(os.getenv("CACHE_TTL", "86400"))
+CACHE_MEMORY_MAX_ENTRIES = int(os.getenv("CACHE_MEMORY_MAX_ENTRIES", "1024"))
+CACHE_SQLITE_PATH = os.getenv("CACHE_SQLITE_PATH", "cache.db")
+CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL", "redis://localhost:6379/0")
+
+# Number of example queries retrieved into the prompt for each question
+EXAMPLE_QUERIES_TOP_K = int(os.getenv("EXAMPLE_QUERIES_TOP_K", "3"))
+
+# Where the example-query library is kept (any SQLAlchemy URL; a new store is
+# seeded with EXAMPLE_QUERIES) and how many examples the UI shows per page
+EXAMPLE_STORE_URL = os.getenv("EXAMPLE_STORE_URL", "sqlite:///example_queries.db")
+EXAMPLE_PAGE_SIZE = int(os.getenv("EXAMPLE_PAGE_SIZE", "25"))
+
+# Rows per page of the functions list and of the Results table under the
+# chat; result pages are fetched from the database with LIMIT/OFFSET
+FUNCTIONS_PAGE_SIZE = int(os.getenv("FUNCTIONS_PAGE_SIZE", "50"))
+RESULTS_PAGE_SIZE = int(os.getenv("RESULTS_PAGE_SIZE", "50"))
+
+# Function-first router: share of question words that must appear in a
+# function's name or comment before it is tried without the agent loop
+FUNCTION_ROUTER_ENABLED = os.getenv("FUNCTION_ROUTER_ENABLED", "true").lower() == "true"
+FUNCTION_ROUTER_MIN_CONFIDENCE = float(os.getenv("FUNCTION_ROUTER_MIN_CONFIDENCE", "0.5"))
+FUNCTION_ROUTER_MAX_ROWS = int(os.getenv("FUNCTION_ROUTER_MAX_ROWS", "100"))
+
+# Trusted functions are exposed to the agent as one typed tool each, as long
+# as there are at most this many of them
+TRUSTED_FUNCTION_TOOLS_MAX = int(os.getenv("TRUSTED_FUNCTION_TOOLS_MAX", "20"))
+
+# Concurrency: Gradio events processed at once, agent runs executed in
+# parallel, and seconds before an abandoned browser session is closed
+GRADIO_CONCURRENCY_LIMIT = int(os.getenv("GRADIO_CONCURRENCY_LIMIT", "16"))
+AGENT_MAX_WORKERS = int(os.getenv("AGENT_MAX_WORKERS", "8"))
+SESSION_IDLE_TIMEOUT = float(os.getenv("SESSION_IDLE_TIMEOUT", "3600"))
+
+# Run the agent's mandatory opening tool calls (function and table lists)
+# concurrently before its first LLM turn, and whether to keep the LLM-based
+# sql_db_query_checker tool; without it queries are only checked locally
+AGENT_PREFETCH_CONTEXT = os.getenv("AGENT_PREFETCH_CONTEXT", "true").lower() == "true"
+AGENT_LLM_QUERY_CHECKER = os.getenv("AGENT_LLM_QUERY_CHECKER", "false").lower() == "true"
+
+# Conversation memory: earlier turns of a session are kept as compact
+# summaries (function or SQL, tables, sample rows) in a LangGraph checkpointer
+# (memory, sqlite or none) and trimmed to a token budget
+AGENT_MEMORY = os.getenv("AGENT_MEMORY", "memory").lower()
+AGENT_MEMORY_SQLITE_PATH = os.getenv("AGENT_MEMORY_SQLITE_PATH", "agent_memory.db")
+AGENT_MEMORY_TOKEN_BUDGET = int(os.getenv("AGENT_MEMORY_TOKEN_BUDGET", "1500"))
+AGENT_MEMORY_SAMPLE_ROWS = int(os.getenv("AGENT_MEMORY_SAMPLE_ROWS", "3"))
+
+# Precomputed answers: example queries and trusted function calls promoted
+# to materialized views (PostgreSQL only) whose names start with
+# PRECOMPUTED_PREFIX. Due views are refreshed concurrently in the background,
+# checked every PRECOMPUTED_CHECK_INTERVAL seconds (0 turns the scheduler
+# off), with no statement timeout unless PRECOMPUTED_REFRESH_TIMEOUT_MS is set;
+# the PRECOMPUTED_TOP_K views closest to a question are listed for the agent
+PRECOMPUTED_PREFIX = os.getenv("PRECOMPUTED_PREFIX", "precomputed_")
+PRECOMPUTED_REFRESH_SECONDS = float(os.getenv("PRECOMPUTED_REFRESH_SECONDS", "3600"))
+PRECOMPUTED_CHECK_INTERVAL = float(os.getenv("PRECOMPUTED_CHECK_INTERVAL", "60"))
+PRECOMPUTED_REFRESH_TIMEOUT_MS = int(os.getenv("PRECOMPUTED_REFRESH_TIMEOUT_MS", "0"))
+PRECOMPUTED_TOP_K = int(os.getenv("PRECOMPUTED_TOP_K", "3"))
+
+# Model routing: LLM_CHOICE is the model every session starts with, or "auto"
+# to send function argument extraction and simple questions to LLM_FAST_MODEL
+# and the rest to LLM_STRONG_MODEL, escalating to the strong model whenever a
+# reply cannot be parsed. LLM_STEP_MODELS pins steps to models, for example
+# "arguments=llama3.1,agent=gpt-4o-mini"; questions longer than
+# LLM_SIMPLE_MAX_WORDS words are never simple
+LLM_CHOICE = os.getenv("LLM_CHOICE", "gpt-4o-mini")
+LLM_FAST_MODEL = os.getenv("LLM_FAST_MODEL", "llama3.1")
+LLM_STRONG_MODEL = os.getenv("LLM_STRONG_MODEL", "gpt-4o-mini")
+LLM_STEP_MODELS = dict(
+    (step.strip(), model.strip())
+    for step, _, model in (item.partition("=") for item in os.getenv("LLM_STEP_MODELS", "").split(","))
+    if step.strip() and model.strip()
+)
+LLM_SIMPLE_MAX_WORDS = int(os.getenv("LLM_SIMPLE_MAX_WORDS", "20"))
+
+# Batch runs (python -m app.cli batch): questions answered at once, retries
+# of a question after a rate limit or provider error with exponential backoff
+# from BATCH_RETRY_BASE_SECONDS up to BATCH_RETRY_MAX_SECONDS, and the largest
+# result compared against a reference query
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+BATCH_MAX_RETRIES = int(os.getenv("BATCH_MAX_RETRIES", "4"))
+BATCH_RETRY_BASE_SECONDS = float(os.getenv("BATCH_RETRY_BASE_SECONDS", "2"))
+BATCH_RETRY_MAX_SECONDS = float(os.getenv("BATCH_RETRY_MAX_SECONDS", "60"))
+BATCH_COMPARE_MAX_ROWS = int(os.getenv("BATCH_COMPARE_MAX_ROWS", "10000"))
+
+# Serve chats from the asyncio path (asyncpg engine, astream) instead of the
+# thread pool
+CHAT_ASYNC = os.getenv("CHAT_ASYNC", "false").lower() == "true"
+
+# Pre-warm in a background thread once the server is up: the example
+# library, conversation memory and model clients and, when PREWARM_DB_NAME is
+# set, the connection pool, catalogs and agent for that database, shared
+# with sessions that connect with the same credentials
+PREWARM = os.getenv("PREWARM", "false").lower() == "true"
+PREWARM_DB_USER = os.getenv("PREWARM_DB_USER")
+PREWARM_DB_PASSWORD = os.getenv("PREWARM_DB_PASSWORD", "")
+PREWARM_DB_NAME = os.getenv("PREWARM_DB_NAME")
+
+# Address the Gradio app and the /metrics endpoint are served on, and how
+# many recent observations per series the p50/p95/p99 estimates are kept over
+SERVER_HOST = os.getenv("SERVER_HOST", "127.0.0.1")
+SERVER_PORT = int(os.getenv("SERVER_PORT", "7860"))
+METRICS_WINDOW = int(os.getenv("METRICS_WINDOW", "2048"))
 
 
 EXAMPLE_QUERIES = [
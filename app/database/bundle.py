@@ -0,0 +1,525 @@
+import os
+import re
+
+import yaml
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+
+from app.database.connections import driver_sql, sqlstate
+from app.database.functions import comment_sql, get_catalog_cache
+
+# Statements sent to the server per round trip when applying a bundle.
+BATCH_SIZE = 100
+
+_CREATE_RE = re.compile(
+    r"^\s*CREATE\s+(?:OR\s+REPLACE\s+)?FUNCTION\s+"
+    r"(?:(?:\"[^\"]+\"|\w+)\s*\.\s*)?(\"[^\"]+\"|\w+)\s*\(",
+    re.IGNORECASE,
+)
+_COMMENT_RE = re.compile(
+    r"^\s*COMMENT\s+ON\s+FUNCTION\s+(?:(?:\"[^\"]+\"|\w+)\s*\.\s*)?(\"[^\"]+\"|\w+)"
+    r"\s*(?:\([^)]*\))?\s+IS\s+(NULL|'(?:[^']|'')*')\s*$",
+    re.IGNORECASE | re.DOTALL,
+)
+_CREATE_PREFIX_RE = re.compile(r"^\s*CREATE\s+(?:OR\s+REPLACE\s+)?FUNCTION", re.IGNORECASE)
+_DOLLAR_BODY_RE = re.compile(r"\bAS\s+\$(\w*)\$(.*?)\$\1\$", re.IGNORECASE | re.DOTALL)
+_CALL_RE = re.compile(r"\b(\w+)\s*\(")
+_LANGUAGE_RE = re.compile(r"\bLANGUAGE\s+'?(\w+)'?", re.IGNORECASE)
+_ARGUMENT_MODES = ("IN", "OUT", "INOUT", "VARIADIC")
+_MULTIWORD_TYPE_RE = re.compile(
+    r"^(?:double\s+precision|(?:national\s+)?(?:character|char|bit)\s+varying"
+    r"|time(?:stamp)?\b[^a-z]*\s+with(?:out)?\s+time\s+zone|interval\s+(?:year|month|day|hour|minute|second))",
+    re.IGNORECASE,
+)
+
+
+class BundleError(ValueError):
+    pass
+
+
+class FunctionDefinition:
+    """One function of a bundle: its CREATE FUNCTION statement and comment."""
+
+    def __init__(self, code, description=None, name=None):
+        self.code = code.strip().rstrip(";").strip()
+        match = _CREATE_RE.match(self.code)
+        if not match:
+            raise BundleError(f"Not a CREATE FUNCTION statement: {self.code[:60]!r}")
+        parsed_name = _unquote(match.group(1))
+        if name and name != parsed_name:
+            raise BundleError(f"Bundle entry {name} defines function {parsed_name}.")
+        self.name = parsed_name
+        self.description = description
+        self.argument_list = _balanced(self.code, match.end() - 1)
+        body = _DOLLAR_BODY_RE.search(self.code, match.end() - 1 + len(self.argument_list))
+        self.body = body.group(2) if body else None
+        language = _LANGUAGE_RE.search(self.code)
+        self.language = language.group(1).lower() if language else None
+        # Canonical identity argument types, filled in by FunctionLibrary.
+        self.argument_types = None
+
+    @property
+    def input_argument_types(self):
+        """Declared types of the arguments that make up the identity, as written."""
+        types = []
+        for argument in _split_arguments(self.argument_list[1:-1]):
+            argument = re.split(r"\s+DEFAULT\s+|\s*=\s*", argument, maxsplit=1, flags=re.IGNORECASE)[0].strip()
+            words = argument.split()
+            mode = words.pop(0).upper() if words and words[0].upper() in _ARGUMENT_MODES else "IN"
+            if mode == "OUT" or not words:
+                continue
+            declared = " ".join(words)
+            # "[name] type": a single word, or a type spelled in several words
+            # such as "double precision", has no argument name in front.
+            if len(words) > 1 and not _MULTIWORD_TYPE_RE.match(declared):
+                declared = " ".join(words[1:])
+            types.append(declared)
+        return types
+
+    def create_or_replace(self):
+        return _CREATE_PREFIX_RE.sub("CREATE OR REPLACE FUNCTION", self.code, count=1)
+
+    def references(self, names):
+        """Names of other bundle functions called from this one's body."""
+        source = self.body if self.body is not None else self.code
+        called = {name.lower() for name in _CALL_RE.findall(source)}
+        return (called & names) - {self.name}
+
+    def as_dict(self):
+        return {"name": self.name, "description": self.description, "code": self.code}
+
+
+class BundlePlan:
+    def __init__(self):
+        self.create = []
+        self.update = []
+        self.unchanged = []
+        self.drop = []
+
+    @property
+    def changes(self):
+        return len(self.create) + len(self.update) + len(self.drop)
+
+    def summary(self):
+        return {
+            "create": [function.name for function in self.create],
+            "update": [function.name for function in self.update],
+            "unchanged": [function.name for function in self.unchanged],
+            "drop": [f"{name}({', '.join(types)})" for name, types in self.drop],
+        }
+
+
+class FunctionLibrary:
+    """Bulk import and export of the public function catalog.
+
+    A bundle is diffed against pg_proc by name and canonical argument types;
+    a function is only re-created when its definition or comment differs.
+    Changes are applied in one transaction, callees before callers,
+    and sent ``BATCH_SIZE`` statements per round trip.
+    """
+
+    CATALOG_QUERY = text("""
+        SELECT
+            p.proname,
+            ARRAY(
+                SELECT pg_catalog.format_type(a.type_oid, NULL)
+                FROM unnest(p.proargtypes::oid[]) WITH ORDINALITY AS a(type_oid, position)
+                ORDER BY a.position
+            ),
+            p.prosrc,
+            l.lanname,
+            d.description,
+            pg_catalog.pg_get_functiondef(p.oid)
+        FROM
+            pg_catalog.pg_proc p
+        JOIN
+            pg_catalog.pg_namespace n ON n.oid = p.pronamespace
+        JOIN
+            pg_catalog.pg_language l ON l.oid = p.prolang
+        LEFT JOIN
+            pg_catalog.pg_description d ON d.objoid = p.oid
+        WHERE
+            n.nspname = 'public' AND p.prokind = 'f'
+        ORDER BY
+            p.proname, p.oid
+    """)
+
+    DEFINITION_QUERY = text(
+        "SELECT pg_catalog.pg_get_functiondef(pg_catalog.to_regprocedure(:signature))"
+    )
+
+    CANONICAL_TYPES_QUERY = text(
+        "SELECT candidate, pg_catalog.to_regtype(candidate)::text FROM unnest(:candidates) AS candidate"
+    )
+
+    def __init__(self, engine):
+        self.engine = engine
+
+    def export(self):
+        with self.engine.connect() as connection:
+            rows = connection.execute(self.CATALOG_QUERY).fetchall()
+        functions = []
+        for row in rows:
+            function = FunctionDefinition(row[5], row[4])
+            function.argument_types = list(row[1])
+            functions.append(function)
+        return functions
+
+    def plan(self, functions, prune=False, force=False):
+        with self.engine.connect() as connection:
+            catalog = {
+                (row[0], tuple(row[1])): row for row in connection.execute(self.CATALOG_QUERY)
+            }
+            self._resolve_types(connection, functions)
+
+        plan = BundlePlan()
+        seen = set()
+        for function in functions:
+            key = (function.name, tuple(function.argument_types))
+            if key in seen:
+                raise BundleError(f"Function {function.name}({', '.join(key[1])}) is defined twice.")
+            seen.add(key)
+            existing = catalog.get(key)
+            if existing is None:
+                plan.create.append(function)
+            elif force or not self._same(function, existing):
+                plan.update.append(function)
+            else:
+                plan.unchanged.append(function)
+        if plan.unchanged:
+            changed = self._redefined(plan.unchanged, catalog)
+            plan.update.extend(function for function in plan.unchanged if id(function) in changed)
+            plan.unchanged = [function for function in plan.unchanged if id(function) not in changed]
+        if prune:
+            plan.drop = [key for key in catalog if key not in seen]
+        return plan
+
+    def apply(self, plan):
+        statements = self._statements(plan)
+        if not statements:
+            return plan
+        try:
+            try:
+                with self.engine.begin() as connection:
+                    for start in range(0, len(statements), BATCH_SIZE):
+                        batch = statements[start:start + BATCH_SIZE]
+                        connection.exec_driver_sql(";\n".join(sql for _, sql, _ in batch))
+            except DBAPIError:
+                # Replay one statement at a time, still in a single transaction,
+                # to name the failing function and to re-create functions whose
+                # result type changed, which CREATE OR REPLACE cannot do.
+                self._apply_one_by_one(statements)
+        finally:
+            get_catalog_cache(self.engine).invalidate()
+        return plan
+
+    def _apply_one_by_one(self, statements):
+        with self.engine.begin() as connection:
+            for name, sql, drop_sql in statements:
+                connection.exec_driver_sql("SAVEPOINT bundle_statement")
+                try:
+                    connection.exec_driver_sql(sql)
+                except DBAPIError as e:
+                    connection.exec_driver_sql("ROLLBACK TO SAVEPOINT bundle_statement")
+                    if drop_sql is None or sqlstate(e) != "42P13":
+                        raise BundleError(f"Applying {name} failed: {e.orig}") from e
+                    connection.exec_driver_sql(drop_sql)
+                    connection.exec_driver_sql(sql)
+
+    def _statements(self, plan):
+        """(function name, SQL, DROP to retry with) in apply order, ready for
+        exec_driver_sql."""
+        statements = [
+            (name, driver_sql(self.engine, f"DROP FUNCTION IF EXISTS {self._signature_sql(name, types)}"), None)
+            for name, types in plan.drop
+        ]
+        ordered, cyclic = self._dependency_order(plan.create + plan.update)
+        if cyclic:
+            # Mutually recursive functions cannot all see each other while
+            # they are created; their bodies are checked when first called.
+            statements.append(("bundle", "SET LOCAL check_function_bodies = off", None))
+        updates = {id(function) for function in plan.update}
+        for function in ordered:
+            # Bodies and quoted names are sent as written; the comment is a
+            # literal the dialect already escaped.
+            signature = driver_sql(self.engine, self._signature_sql(function.name, function.argument_types))
+            drop_sql = f"DROP FUNCTION IF EXISTS {signature}" if id(function) in updates else None
+            statements.append((function.name, driver_sql(self.engine, function.create_or_replace()), drop_sql))
+            statements.append((function.name, comment_sql(self.engine, signature, function.description), None))
+        return statements
+
+    def _signature_sql(self, name, types):
+        quoted = f"public.{self.engine.dialect.identifier_preparer.quote(name)}"
+        if types is None:
+            return quoted
+        return f"{quoted}({', '.join(types)})"
+
+    def _resolve_types(self, connection, functions):
+        # Type names have aliases (int, varchar(20)); the server maps each
+        # declared type to the name pg_proc reports.
+        candidates = sorted({declared for function in functions for declared in function.input_argument_types})
+        resolved = {}
+        if candidates:
+            try:
+                resolved = dict(connection.execute(self.CANONICAL_TYPES_QUERY, {"candidates": candidates}).fetchall())
+            except DBAPIError as e:
+                raise BundleError(f"Invalid argument type in bundle: {e.orig}") from e
+        for function in functions:
+            types = []
+            for declared in function.input_argument_types:
+                canonical = resolved.get(declared)
+                if canonical is None:
+                    raise BundleError(f"Unknown argument type {declared!r} in {function.name}.")
+                types.append(canonical)
+            function.argument_types = types
+
+    def _redefined(self, functions, catalog):
+        """ids of the functions whose body matches but whose definition does
+        not: volatility, SECURITY DEFINER, defaults, return type or options.
+
+        The bundle text and pg_get_functiondef are formatted differently, so
+        each function is created in a transaction that is rolled back and the
+        server's rendering of both is compared.
+        """
+        changed = set()
+        with self.engine.connect() as connection:
+            try:
+                connection.exec_driver_sql("SET LOCAL check_function_bodies = off")
+                for function in functions:
+                    signature = self._signature_sql(function.name, function.argument_types)
+                    connection.exec_driver_sql("SAVEPOINT bundle_compare")
+                    try:
+                        connection.exec_driver_sql(driver_sql(self.engine, function.create_or_replace()))
+                        definition = connection.execute(self.DEFINITION_QUERY, {"signature": signature}).scalar()
+                    except DBAPIError:
+                        # A new result type, which CREATE OR REPLACE rejects.
+                        connection.exec_driver_sql("ROLLBACK TO SAVEPOINT bundle_compare")
+                        changed.add(id(function))
+                        continue
+                    existing = catalog[(function.name, tuple(function.argument_types))]
+                    if _normalize(definition) != _normalize(existing[5]):
+                        changed.add(id(function))
+            finally:
+                connection.rollback()
+        return changed
+
+    @staticmethod
+    def _same(function, existing):
+        _, _, source, language, description, definition = existing
+        if (function.description or None) != (description or None):
+            return False
+        if function.body is not None:
+            return function.body == source and function.language in (None, language)
+        return _normalize(function.code) == _normalize(definition)
+
+    @staticmethod
+    def _dependency_order(functions):
+        """Callees before callers, otherwise bundle order; True on a cycle."""
+        by_name = {}
+        for function in functions:
+            by_name.setdefault(function.name, []).append(function)
+        requires = {name: set() for name in by_name}
+        for function in functions:
+            requires[function.name] |= function.references(by_name.keys())
+
+        ordered, done, visiting, cyclic = [], set(), set(), False
+        for root in by_name:
+            if root in done:
+                continue
+            visiting.add(root)
+            stack = [(root, iter(sorted(requires[root])))]
+            while stack:
+                name, callees = stack[-1]
+                callee = next((callee for callee in callees if callee not in done), None)
+                if callee is None:
+                    stack.pop()
+                    visiting.discard(name)
+                    done.add(name)
+                    ordered.extend(by_name[name])
+                elif callee in visiting:
+                    cyclic = True
+                else:
+                    visiting.add(callee)
+                    stack.append((callee, iter(sorted(requires[callee]))))
+        return ordered, cyclic
+
+
+def load_bundle(path):
+    """Reads a YAML bundle, a SQL bundle or a directory of either."""
+    if os.path.isdir(path):
+        functions = []
+        for entry in sorted(os.listdir(path)):
+            if entry.endswith((".yaml", ".yml", ".sql")):
+                functions.extend(load_bundle(os.path.join(path, entry)))
+        return functions
+    with open(path, encoding="utf-8") as source:
+        content = source.read()
+    if path.endswith((".yaml", ".yml")):
+        return parse_yaml_bundle(content)
+    return parse_sql_bundle(content)
+
+
+def parse_yaml_bundle(content):
+    document = yaml.safe_load(content) or {}
+    entries = document.get("functions", []) if isinstance(document, dict) else document
+    return [
+        FunctionDefinition(entry["code"], entry.get("description"), entry.get("name"))
+        for entry in entries
+    ]
+
+
+def parse_sql_bundle(content):
+    """CREATE FUNCTION statements, each optionally followed by its COMMENT."""
+    functions = []
+    for statement in split_statements(content):
+        comment = _COMMENT_RE.match(statement)
+        if comment:
+            name = _unquote(comment.group(1))
+            target = next((f for f in reversed(functions) if f.name == name), None)
+            if target is None:
+                raise BundleError(f"COMMENT ON FUNCTION {name} comes before its CREATE FUNCTION.")
+            value = comment.group(2)
+            target.description = None if value.upper() == "NULL" else value[1:-1].replace("''", "'")
+        elif _CREATE_RE.match(statement):
+            functions.append(FunctionDefinition(statement))
+        else:
+            raise BundleError(f"Unsupported statement in bundle: {statement[:60]!r}")
+    return functions
+
+
+def dump_bundle(functions, path, format="yaml"):
+    if format == "yaml":
+        with open(path, "w", encoding="utf-8") as output:
+            yaml.dump(
+                {"functions": [function.as_dict() for function in functions]},
+                output,
+                Dumper=_BundleDumper,
+                sort_keys=False,
+                allow_unicode=True,
+            )
+        return path
+    if format == "sql":
+        with open(path, "w", encoding="utf-8") as output:
+            output.write(format_sql_bundle(functions))
+        return path
+    if format == "dir":
+        os.makedirs(path, exist_ok=True)
+        counts = {}
+        for function in functions:
+            counts[function.name] = counts.get(function.name, 0) + 1
+            suffix = f"_{counts[function.name]}" if counts[function.name] > 1 else ""
+            with open(os.path.join(path, f"{function.name}{suffix}.sql"), "w", encoding="utf-8") as output:
+                output.write(format_sql_bundle([function]))
+        return path
+    raise BundleError(f"Unknown bundle format {format!r}; use yaml, sql or dir.")
+
+
+def format_sql_bundle(functions):
+    parts = []
+    for function in functions:
+        parts.append(function.code + ";\n")
+        if function.description is not None:
+            description = function.description.replace("'", "''")
+            signature = function.name
+            if function.argument_types is not None:
+                signature += f"({', '.join(function.argument_types)})"
+            parts.append(f"COMMENT ON FUNCTION {signature} IS '{description}';\n")
+        parts.append("\n")
+    return "".join(parts)
+
+
+def split_statements(content):
+    """Splits SQL on semicolons outside quotes, dollar quotes and comments."""
+    statements, current, position = [], [], 0
+    while position < len(content):
+        char = content[position]
+        if content.startswith("--", position):
+            end = content.find("\n", position)
+            position = len(content) if end < 0 else end + 1
+            continue
+        if content.startswith("/*", position):
+            end = content.find("*/", position + 2)
+            position = len(content) if end < 0 else end + 2
+            continue
+        dollar = re.match(r"\$(\w*)\$", content[position:])
+        if dollar:
+            tag = dollar.group(0)
+            end = content.find(tag, position + len(tag))
+            end = len(content) if end < 0 else end + len(tag)
+            current.append(content[position:end])
+            position = end
+            continue
+        if char in ("'", '"'):
+            end = position + 1
+            while end < len(content):
+                if content[end] == char:
+                    if content.startswith(char * 2, end):
+                        end += 2
+                        continue
+                    break
+                end += 1
+            current.append(content[position:end + 1])
+            position = end + 1
+            continue
+        if char == ";":
+            statement = "".join(current).strip()
+            if statement:
+                statements.append(statement)
+            current = []
+        else:
+            current.append(char)
+        position += 1
+    statement = "".join(current).strip()
+    if statement:
+        statements.append(statement)
+    return statements
+
+
+class _BundleDumper(yaml.SafeDumper):
+    pass
+
+
+def _represent_str(dumper, value):
+    style = "|" if "\n" in value else None
+    return dumper.represent_scalar("tag:yaml.org,2002:str", value, style=style)
+
+
+_BundleDumper.add_representer(str, _represent_str)
+
+
+def _unquote(name):
+    return name[1:-1] if name.startswith('"') else name.lower()
+
+
+def _balanced(code, start):
+    depth = 0
+    for position in range(start, len(code)):
+        if code[position] == "(":
+            depth += 1
+        elif code[position] == ")":
+            depth -= 1
+            if depth == 0:
+                return code[start:position + 1]
+    raise BundleError("Unbalanced parentheses in the function arguments.")
+
+
+def _split_arguments(arguments):
+    parts, depth, current = [], 0, []
+    for char in arguments:
+        if char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        if char == "," and depth == 0:
+            parts.append("".join(current).strip())
+            current = []
+        else:
+            current.append(char)
+    if "".join(current).strip():
+        parts.append("".join(current).strip())
+    return parts
+
+
+def _normalize(code):
+    code = _CREATE_PREFIX_RE.sub("create function", code.strip().rstrip(";"), count=1)
+    return " ".join(code.lower().replace("public.", "").split())
@@ -1,15 +1,176 @@
-from sqlalchemy import text
+import asyncio
+import threading
+import time
+import weakref
 
-class DatabaseFunctions:
-    def __init__(self, engine):
+from sqlalchemy import String, text
+
+from app.cache import database_key, get_shared_cache
+from app.config import FUNCTION_CATALOG_CHECK_INTERVAL
+from app.database.connections import on_engine_disposed
+
+
+class FunctionCatalogCache:
+    """In-memory copy of the public function catalog for a single engine.
+
+    The cached list is served straight from memory for ``check_interval``
+    seconds. After that a cheap fingerprint probe over pg_proc/pg_description
+    decides whether the full catalog query has to run again. With a
+    ``shared`` cache, a catalog another replica already loaded for the same
+    fingerprint is taken from there instead.
+    """
+
+    FINGERPRINT_QUERY = text("""
+        SELECT
+            count(p.oid),
+            coalesce(max(p.xmin::text::bigint), 0),
+            count(d.objoid),
+            coalesce(max(d.xmin::text::bigint), 0)
+        FROM
+            pg_catalog.pg_proc p
+        JOIN
+            pg_catalog.pg_namespace n ON n.oid = p.pronamespace
+        LEFT JOIN
+            pg_catalog.pg_description d ON d.objoid = p.oid
+        WHERE
+            n.nspname = 'public'
+    """)
+
+    def __init__(self, engine, check_interval=FUNCTION_CATALOG_CHECK_INTERVAL, shared=None):
         self.engine = engine
+        self.check_interval = check_interval
+        self.shared = shared
+        self.database = database_key(engine)
+        self.functions = None
+        self.fingerprint = None
+        self.checked_at = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.shared_hits = 0
+        self._lock = threading.Lock()
+
+    def get(self, loader, revalidate=False):
+        with self._lock:
+            now = time.monotonic()
+            if self._fresh(now, revalidate):
+                self.hits += 1
+                return self.functions
+
+            fingerprint = self.probe()
+            self.checked_at = now
+            if self.functions is not None and fingerprint == self.fingerprint:
+                self.hits += 1
+                return self.functions
+
+            self.misses += 1
+            functions = self._shared_get(fingerprint)
+            if functions is None:
+                functions = loader()
+                self._shared_set(fingerprint, functions)
+            self.functions = functions
+            self.fingerprint = fingerprint
+            return self.functions
+
+    async def aget(self, async_engine, loader, revalidate=False):
+        # The threading lock is never held across an await; concurrent misses
+        # may both load the catalog, and the last one wins.
+        with self._lock:
+            if self._fresh(time.monotonic(), revalidate):
+                self.hits += 1
+                return self.functions
+
+        async with async_engine.connect() as connection:
+            fingerprint = tuple((await connection.execute(self.FINGERPRINT_QUERY)).one())
+        with self._lock:
+            self.checked_at = time.monotonic()
+            if self.functions is not None and fingerprint == self.fingerprint:
+                self.hits += 1
+                return self.functions
+
+        functions = await asyncio.to_thread(self._shared_get, fingerprint)
+        if functions is None:
+            functions = await loader()
+            await asyncio.to_thread(self._shared_set, fingerprint, functions)
+        with self._lock:
+            self.misses += 1
+            self.functions = functions
+            self.fingerprint = fingerprint
+            return functions
+
+    def _fresh(self, now, revalidate):
+        return (
+            self.functions is not None
+            and not revalidate
+            and now - self.checked_at < self.check_interval
+        )
+
+    def _shared_get(self, fingerprint):
+        if self.shared is None:
+            return None
+        functions = self.shared.get("functions", self.database, fingerprint, "catalog")
+        if functions is not None:
+            self.shared_hits += 1
+        return functions
+
+    def _shared_set(self, fingerprint, functions):
+        if self.shared is not None:
+            self.shared.set("functions", self.database, fingerprint, "catalog", functions)
+
+    def probe(self):
+        with self.engine.connect() as connection:
+            return tuple(connection.execute(self.FINGERPRINT_QUERY).one())
+
+    def invalidate(self):
+        with self._lock:
+            self.functions = None
+            self.fingerprint = None
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "shared_hits": self.shared_hits,
+            "cached_functions": len(self.functions or []),
+            "fingerprint": self.fingerprint,
+        }
+
 
-    def get_all_functions(self):
-        query = text("""
+_catalog_caches = weakref.WeakKeyDictionary()
+_catalog_caches_lock = threading.Lock()
+
+
+def get_catalog_cache(engine):
+    with _catalog_caches_lock:
+        cache = _catalog_caches.get(engine)
+        if cache is None:
+            cache = FunctionCatalogCache(engine, shared=get_shared_cache())
+            _catalog_caches[engine] = cache
+            on_engine_disposed(engine, _drop_catalog_cache)
+        return cache
+
+
+def _drop_catalog_cache(engine):
+    with _catalog_caches_lock:
+        _catalog_caches.pop(engine, None)
+
+
+def comment_sql(engine, signature, description):
+    """COMMENT ON FUNCTION with the description quoted as a SQL literal."""
+    if description is None:
+        return f"COMMENT ON FUNCTION {signature} IS NULL"
+    literal = String().literal_processor(dialect=engine.dialect)(description)
+    return f"COMMENT ON FUNCTION {signature} IS {literal}"
+
+
+class DatabaseFunctions:
+    FUNCTIONS_QUERY = text("""
             SELECT 
                 p.proname AS routine_name,
-                pg_catalog.pg_get_functiondef(p.oid) AS routine_definition,
-                d.description AS routine_comment
+                -- pg_get_functiondef() rejects aggregates.
+                CASE WHEN p.prokind IN ('f', 'p') THEN pg_catalog.pg_get_functiondef(p.oid) END AS routine_definition,
+                d.description AS routine_comment,
+                pg_catalog.pg_get_function_arguments(p.oid) AS routine_arguments,
+                p.prokind AS routine_kind
             FROM 
                 pg_catalog.pg_proc p
             LEFT JOIN 
@@ -22,26 +183,72 @@ class DatabaseFunctions:
                 p.proname
         """)
 
+    def __init__(self, engine, async_engine=None):
+        self.engine = engine
+        self.async_engine = async_engine
+        self.catalog_cache = get_catalog_cache(engine)
+
+    def get_all_functions(self, use_cache=True, revalidate=False):
+        if not use_cache:
+            return self._fetch_all_functions()
+        return self.catalog_cache.get(self._fetch_all_functions, revalidate=revalidate)
+
+    async def aget_all_functions(self, revalidate=False):
+        if self.async_engine is None:
+            raise ValueError("No async engine configured for DatabaseFunctions.")
+        return await self.catalog_cache.aget(
+            self.async_engine, self._afetch_all_functions, revalidate=revalidate
+        )
+
+    def _fetch_all_functions(self):
         with self.engine.connect() as connection:
-            result = connection.execute(query)
-            return [
-                {
-                    "function_name": row[0],
-                    "function_code": row[1],
-                    "description": row[2],
-                }
-                for row in result
-            ]
+            return self._to_functions(connection.execute(self.FUNCTIONS_QUERY))
+
+    async def _afetch_all_functions(self):
+        async with self.async_engine.connect() as connection:
+            return self._to_functions(await connection.execute(self.FUNCTIONS_QUERY))
+
+    @staticmethod
+    def _to_functions(result):
+        return [
+            {
+                "function_name": row[0],
+                "function_code": row[1],
+                "description": row[2],
+                "function_arguments": row[3],
+                "kind": row[4],
+            }
+            for row in result
+        ]
+
+    def get_functions_page(self, page, page_size):
+        """(functions on the 1-based ``page``, total count) from the cached catalog."""
+        functions = self.get_all_functions()
+        start = (max(page, 1) - 1) * page_size
+        return functions[start:start + page_size], len(functions)
+
+    def get_function_definition(self, name):
+        return "\n\n".join(
+            func["function_code"] or "" for func in self.get_all_functions() if func["function_name"] == name
+        )
+
+    def cache_stats(self):
+        return self.catalog_cache.stats()
 
     def add_function(self, name, code, description):
-        with self.engine.connect() as connection:
-            connection.execute(text(code))
-            comment_sql = f"COMMENT ON FUNCTION {name} IS '{description}';"
-            connection.execute(text(comment_sql))
-            connection.commit()
+        try:
+            with self.engine.connect() as connection:
+                connection.execute(text(code))
+                connection.exec_driver_sql(comment_sql(self.engine, name, description))
+                connection.commit()
+        finally:
+            self.catalog_cache.invalidate()
 
     def delete_function(self, name):
-        with self.engine.connect() as connection:
-            drop_sql = f"DROP FUNCTION IF EXISTS {name};"
-            connection.execute(text(drop_sql))
-            connection.commit()
\ No newline at end of file
+        try:
+            with self.engine.connect() as connection:
+                drop_sql = f"DROP FUNCTION IF EXISTS {name};"
+                connection.execute(text(drop_sql))
+                connection.commit()
+        finally:
+            self.catalog_cache.invalidate()
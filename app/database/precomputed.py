@@ -0,0 +1,319 @@
+import json
+import logging
+import re
+import threading
+import time
+import weakref
+
+from sqlalchemy import String, text
+
+from app.agent.example_store import query_key
+from app.agent.retrieval import BM25Index
+from app.config import (
+    PRECOMPUTED_CHECK_INTERVAL,
+    PRECOMPUTED_PREFIX,
+    PRECOMPUTED_REFRESH_SECONDS,
+    PRECOMPUTED_REFRESH_TIMEOUT_MS,
+    SCHEMA_CHECK_INTERVAL,
+)
+from app.database.connections import driver_sql, on_engine_disposed
+from app.database.trusted import get_trusted_executor
+from app.database.validation import check_read_query, unique_key_columns
+
+logger = logging.getLogger(__name__)
+
+# Column added to views whose query has no row key of its own, so they can
+# still be refreshed concurrently.
+ROW_COLUMN = "precomputed_row"
+_NAME_RE = re.compile(r"[^a-z0-9_]+")
+
+
+def view_name(name, prefix=PRECOMPUTED_PREFIX):
+    """``prefix`` plus ``name`` lower-cased, with anything but letters,
+    digits and underscores turned into underscores."""
+    slug = _NAME_RE.sub("_", (name or "").lower()).strip("_")
+    if not slug:
+        raise ValueError("A name is required for the precomputed view.")
+    if not slug.startswith(prefix):
+        slug = f"{prefix}{slug}"
+    return slug[:63]
+
+
+class PrecomputedViews:
+    """Curated queries kept as materialized views the agent can read.
+
+    An example query or a trusted function call is promoted into a
+    materialized view in the public schema named with PRECOMPUTED_PREFIX.
+    Its description, source query, refresh interval and last refresh time
+    are kept as a JSON comment on the view, so every replica sees the same
+    state. Views get a unique index (on the query's GROUP BY keys, or on an
+    added row number) and are refreshed CONCURRENTLY, so readers are never
+    blocked. Refreshes take a transaction-level advisory lock: replicas
+    sharing a database do not refresh a view twice.
+
+    The list of views is read from pg_class at most every ``check_interval``
+    seconds; ``search`` ranks them against a question with BM25.
+    """
+
+    VIEWS_QUERY = text("""
+        SELECT
+            c.relname,
+            d.description
+        FROM
+            pg_catalog.pg_class c
+        JOIN
+            pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+        LEFT JOIN
+            pg_catalog.pg_description d ON d.objoid = c.oid AND d.objsubid = 0
+        WHERE
+            n.nspname = 'public'
+            AND c.relkind = 'm'
+            AND c.relname LIKE :pattern
+        ORDER BY
+            c.relname
+    """)
+
+    def __init__(self, engine, prefix=PRECOMPUTED_PREFIX, check_interval=SCHEMA_CHECK_INTERVAL):
+        if engine.dialect.name != "postgresql":
+            raise ValueError("Precomputed views need PostgreSQL materialized views.")
+        self.engine = engine
+        self.prefix = prefix
+        self.check_interval = check_interval
+        self.refreshes = 0
+        self._views = None
+        self._by_query = {}
+        self._index = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def list(self, revalidate=False):
+        """[{"name", "description", "source", "refresh_seconds", "refreshed_at"}] by name."""
+        with self._lock:
+            now = time.monotonic()
+            if self._views is None or revalidate or now - self._checked_at >= self.check_interval:
+                with self.engine.connect() as connection:
+                    rows = connection.execute(self.VIEWS_QUERY, {"pattern": f"{self.prefix}%"}).all()
+                views = [view for view in (self._parse(name, comment) for name, comment in rows) if view]
+                index = BM25Index()
+                for position, view in enumerate(views):
+                    index.add(position, f"{view['name'].replace('_', ' ')} {view['description']}")
+                self._views, self._index, self._checked_at = views, index, now
+                self._by_query = {query_key(view["source"]): view for view in views}
+            return self._views
+
+    def search(self, question, k):
+        """The ``k`` views whose name or description best match the question."""
+        views = self.list()
+        with self._lock:
+            return [views[position] for position, _ in self._index.search(question, k)]
+
+    def for_query(self, query):
+        """The view holding the result of ``query``, or None."""
+        self.list()
+        with self._lock:
+            return self._by_query.get(query_key(query))
+
+    def promote(self, name, query, description, refresh_seconds=PRECOMPUTED_REFRESH_SECONDS):
+        """Creates (or replaces) a materialized view over ``query``; returns its name."""
+        name = view_name(name, self.prefix)
+        description = (description or "").strip()
+        if not description:
+            raise ValueError("A description is required so the agent knows what the view answers.")
+        source = check_read_query(query or "", dialect="postgres")
+        key = unique_key_columns(source)
+        # Newlines end a trailing -- comment of the query before what follows it.
+        body = source if key else f"SELECT row_number() OVER () AS {ROW_COLUMN}, source.* FROM ({source}\n) AS source"
+        view = self._quote(name)
+        columns = ", ".join(self._quote(column) for column in key or [ROW_COLUMN])
+        state = {
+            "description": description,
+            "source": source,
+            "refresh_seconds": float(refresh_seconds),
+            "refreshed_at": time.time(),
+        }
+        try:
+            with self.engine.begin() as connection:
+                self._set_timeout(connection)
+                connection.exec_driver_sql(f"DROP MATERIALIZED VIEW IF EXISTS {view}")
+                # The query goes in as written; names are already slugs.
+                connection.exec_driver_sql(driver_sql(self.engine, f"CREATE MATERIALIZED VIEW {view} AS {body}\nWITH DATA"))
+                connection.exec_driver_sql(f"CREATE UNIQUE INDEX {self._quote(name[:58] + '_key')} ON {view} ({columns})")
+                connection.exec_driver_sql(self._comment_sql(name, state))
+        finally:
+            self.invalidate()
+        return name
+
+    def promote_function(self, function_name, arguments=(), description=None, name=None,
+                         refresh_seconds=PRECOMPUTED_REFRESH_SECONDS):
+        """Promotes a call of a trusted function with literal ``arguments``."""
+        executor = get_trusted_executor(self.engine)
+        signature = executor.resolve(function_name, list(arguments))
+        arguments = signature.coerce(list(arguments))
+        query = str(executor.statement(signature, arguments).compile(
+            dialect=self.engine.dialect, compile_kwargs={"literal_binds": True}
+        ))
+        return self.promote(
+            name or function_name, query, description or signature.description or "", refresh_seconds
+        )
+
+    def refresh(self, name, force=True):
+        """Refreshes one view; returns False when another process holds it,
+        or, without ``force``, when it is not due yet."""
+        name = view_name(name, self.prefix)
+        view = self._quote(name)
+        try:
+            with self.engine.begin() as connection:
+                if not connection.execute(text("SELECT pg_try_advisory_xact_lock(hashtext(:name))"), {"name": name}).scalar():
+                    return False
+                # Read again under the lock: another replica may just have
+                # refreshed it.
+                comment = connection.execute(
+                    text("SELECT obj_description(CAST(:name AS regclass), 'pg_class')"), {"name": name}
+                ).scalar()
+                state = self._parse(name, comment)
+                if state is None:
+                    raise ValueError(f"{name} is not a precomputed view.")
+                if not force and not self._due(state, time.time()):
+                    return False
+                self._set_timeout(connection)
+                connection.exec_driver_sql(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {view}")
+                state["refreshed_at"] = time.time()
+                state.pop("name")
+                connection.exec_driver_sql(self._comment_sql(name, state))
+        finally:
+            self.invalidate()
+        self.refreshes += 1
+        return True
+
+    def refresh_due(self):
+        """Refreshes every view whose interval has passed; returns their names."""
+        now = time.time()
+        refreshed = []
+        for view in self.list(revalidate=True):
+            if not self._due(view, now):
+                continue
+            try:
+                if self.refresh(view["name"], force=False):
+                    refreshed.append(view["name"])
+            except Exception as e:
+                logger.warning(f"Refreshing {view['name']} failed: {e}")
+        return refreshed
+
+    def drop(self, name):
+        try:
+            with self.engine.begin() as connection:
+                connection.exec_driver_sql(f"DROP MATERIALIZED VIEW IF EXISTS {self._quote(view_name(name, self.prefix))}")
+        finally:
+            self.invalidate()
+
+    def invalidate(self):
+        with self._lock:
+            self._views = None
+
+    @staticmethod
+    def _due(view, now):
+        return view["refresh_seconds"] > 0 and now - view["refreshed_at"] >= view["refresh_seconds"]
+
+    @staticmethod
+    def _parse(name, comment):
+        try:
+            state = json.loads(comment or "")
+        except ValueError:
+            return None
+        if not isinstance(state, dict) or not state.get("source"):
+            return None
+        return {
+            "name": name,
+            "description": state.get("description") or "",
+            "source": state["source"],
+            "refresh_seconds": float(state.get("refresh_seconds") or 0),
+            "refreshed_at": float(state.get("refreshed_at") or 0),
+        }
+
+    def _comment_sql(self, name, state):
+        literal = String().literal_processor(dialect=self.engine.dialect)(json.dumps(state))
+        return f"COMMENT ON MATERIALIZED VIEW {self._quote(name)} IS {literal}"
+
+    def _quote(self, name):
+        return self.engine.dialect.identifier_preparer.quote(name)
+
+    @staticmethod
+    def _set_timeout(connection):
+        # Building a view reads whole tables, well past the interactive
+        # statement timeout of the pool.
+        connection.exec_driver_sql(f"SET LOCAL statement_timeout = {int(PRECOMPUTED_REFRESH_TIMEOUT_MS)}")
+
+
+_precomputed = weakref.WeakKeyDictionary()
+_precomputed_lock = threading.Lock()
+
+
+def get_precomputed_views(engine):
+    """The shared PrecomputedViews of a PostgreSQL engine, or None elsewhere."""
+    if engine.dialect.name != "postgresql":
+        return None
+    with _precomputed_lock:
+        views = _precomputed.get(engine)
+        if views is None:
+            views = _precomputed[engine] = PrecomputedViews(engine)
+            on_engine_disposed(engine, _drop_precomputed_views)
+        return views
+
+
+def _drop_precomputed_views(engine):
+    with _precomputed_lock:
+        _precomputed.pop(engine, None)
+
+
+class RefreshScheduler:
+    """Background thread refreshing the due views of every watched engine
+    every ``check_interval`` seconds."""
+
+    def __init__(self, check_interval=PRECOMPUTED_CHECK_INTERVAL):
+        self.check_interval = check_interval
+        self._engines = weakref.WeakSet()
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def watch(self, engine):
+        if engine.dialect.name != "postgresql" or self.check_interval <= 0:
+            return
+        with self._lock:
+            self._engines.add(engine)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="precomputed-refresh", daemon=True)
+                self._thread.start()
+
+    def run_once(self):
+        """{view name: engine url} of the views refreshed."""
+        with self._lock:
+            engines = list(self._engines)
+        refreshed = {}
+        for engine in engines:
+            try:
+                for name in get_precomputed_views(engine).refresh_due():
+                    refreshed[name] = engine.url.render_as_string(hide_password=True)
+            except Exception as e:
+                logger.warning(f"Checking precomputed views failed: {e}")
+        return refreshed
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.check_interval):
+            for name, url in self.run_once().items():
+                logger.info(f"Refreshed precomputed view {name} on {url}")
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_refresh_scheduler():
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = RefreshScheduler()
+        return _scheduler
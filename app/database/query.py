@@ -0,0 +1,140 @@
+import csv
+from contextlib import contextmanager
+
+from sqlalchemy import text
+
+from app import tracing
+from app.config import (
+    QUERY_BATCH_SIZE,
+    QUERY_MAX_BYTES,
+    QUERY_MAX_ROWS,
+    QUERY_STATEMENT_TIMEOUT_MS,
+)
+from app.metrics import DB_ROWS
+
+
+class QueryResult:
+    def __init__(self, columns, rows, truncated=False, reason=None):
+        self.columns = columns
+        self.rows = rows
+        self.truncated = truncated
+        self.reason = reason
+
+    @property
+    def marker(self):
+        if not self.truncated:
+            return None
+        return f"[results truncated after {len(self.rows)} rows: {self.reason}]"
+
+    def as_dicts(self):
+        return [dict(zip(self.columns, row)) for row in self.rows]
+
+
+class QueryExecutor:
+    """Runs queries through a server-side cursor under row, byte and time budgets.
+
+    Rows are pulled ``batch_size`` at a time with ``stream_results`` and the
+    cursor is closed as soon as a budget is exhausted, so memory stays bounded
+    by the budget rather than by the size of the result. On PostgreSQL queries
+    run in a READ ONLY transaction unless ``read_only`` is False.
+    """
+
+    def __init__(
+        self,
+        engine,
+        max_rows=QUERY_MAX_ROWS,
+        max_bytes=QUERY_MAX_BYTES,
+        statement_timeout_ms=QUERY_STATEMENT_TIMEOUT_MS,
+        batch_size=QUERY_BATCH_SIZE,
+        read_only=True,
+    ):
+        self.engine = engine
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.statement_timeout_ms = statement_timeout_ms
+        self.batch_size = batch_size
+        self.read_only = read_only
+
+    def execute(self, query, parameters=None):
+        with tracing.span("db", sql=str(query)) as span:
+            result = self._execute(query, parameters)
+            span["rows"] = len(result.rows)
+            span["truncated"] = result.reason
+        DB_ROWS.inc(len(result.rows))
+        return result
+
+    def _execute(self, query, parameters):
+        rows, size = [], 0
+        with self._stream(query, parameters) as result:
+            if not result.returns_rows:
+                return QueryResult([], [])
+            columns = list(result.keys())
+            for batch in result.partitions(self.batch_size):
+                for row in batch:
+                    if len(rows) >= self.max_rows:
+                        return QueryResult(columns, rows, True, f"row limit of {self.max_rows}")
+                    size += sum(len(str(value)) for value in row)
+                    if size > self.max_bytes:
+                        return QueryResult(columns, rows, True, f"size limit of {self.max_bytes} bytes")
+                    rows.append(tuple(row))
+        return QueryResult(columns, rows)
+
+    def page(self, query, page, page_size, parameters=None):
+        """One page of the full result; the database applies LIMIT/OFFSET."""
+        return self.execute(
+            f"SELECT * FROM ({_subquery(query)}) AS paged "
+            f"LIMIT {int(page_size)} OFFSET {(max(int(page), 1) - 1) * int(page_size)}",
+            parameters,
+        )
+
+    def count(self, query, parameters=None):
+        return self.execute(f"SELECT count(*) FROM ({_subquery(query)}) AS counted", parameters).rows[0][0]
+
+    def iter_batches(self, query, parameters=None):
+        """Yields the column names, then every row batch of the full result."""
+        with self._stream(query, parameters) as result:
+            yield list(result.keys())
+            for batch in result.partitions(self.batch_size):
+                yield [tuple(row) for row in batch]
+
+    def export_csv(self, query, path, parameters=None):
+        count = 0
+        with tracing.span("db", sql=str(query), export=True) as span, open(path, "w", newline="") as output:
+            writer = csv.writer(output)
+            batches = self.iter_batches(query, parameters)
+            writer.writerow(next(batches))
+            for batch in batches:
+                writer.writerows(batch)
+                count += len(batch)
+            span["rows"] = count
+        return count
+
+    @contextmanager
+    def _stream(self, query, parameters):
+        if isinstance(query, str):
+            query = text(query)
+        with self.engine.connect() as connection:
+            # Closing the connection rolls this transaction back, so nothing
+            # an agent query does is ever committed.
+            connection.begin()
+            if self.engine.dialect.name == "postgresql":
+                settings = []
+                if self.read_only:
+                    settings.append("SET TRANSACTION READ ONLY")
+                if self.statement_timeout_ms:
+                    settings.append(f"SET LOCAL statement_timeout = {int(self.statement_timeout_ms)}")
+                if settings:
+                    # One round trip for both settings.
+                    connection.exec_driver_sql("; ".join(settings))
+            # Enabled after the SETs, which cannot run in a server-side cursor.
+            connection.execution_options(stream_results=True, max_row_buffer=self.batch_size)
+            result = connection.execute(query, parameters or {})
+            try:
+                yield result
+            finally:
+                result.close()
+
+
+def _subquery(query):
+    # The newline ends a trailing -- comment before the wrapper's ")".
+    return str(query).strip().rstrip(";") + "\n"
@@ -0,0 +1,302 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import weakref
+
+from langchain_community.utilities import SQLDatabase
+from langchain_community.utilities.sql_database import truncate_word
+from sqlalchemy import inspect, text
+
+from app.cache import database_key, get_shared_cache
+from app.config import SCHEMA_CHECK_INTERVAL, SCHEMA_SNAPSHOT_DIR
+from app.database.connections import on_engine_disposed
+from app.database.query import QueryExecutor
+from app.database.validation import SQLGLOT_DIALECTS, check_read_query
+
+
+class SchemaFingerprint:
+    """Per-table version stamps for the tables and views in the public schema.
+
+    On PostgreSQL any CREATE/ALTER/DROP rewrites the relation's pg_class or
+    pg_attribute rows, which moves their xmin. SQLite stores the DDL text
+    itself. The probe result is reused for ``check_interval`` seconds so
+    callers can ask for it on every request.
+    """
+
+    FINGERPRINT_QUERIES = {
+        "postgresql": text("""
+            SELECT
+                c.relname,
+                max(c.xmin::text::bigint),
+                coalesce(max(a.xmin::text::bigint), 0)
+            FROM
+                pg_catalog.pg_class c
+            JOIN
+                pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+            LEFT JOIN
+                pg_catalog.pg_attribute a ON a.attrelid = c.oid
+            WHERE
+                n.nspname = 'public'
+                AND c.relkind IN ('r', 'v', 'm', 'p')
+            GROUP BY
+                c.relname
+        """),
+        "sqlite": text("""
+            SELECT name, sql FROM sqlite_master WHERE type IN ('table', 'view')
+        """),
+    }
+
+    def __init__(self, engine, check_interval=SCHEMA_CHECK_INTERVAL):
+        self.engine = engine
+        self.check_interval = check_interval
+        self.tables = None
+        self.value = None
+        self.checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self, revalidate=False):
+        with self._lock:
+            now = time.monotonic()
+            if self.value is None or revalidate or now - self.checked_at >= self.check_interval:
+                query = self.FINGERPRINT_QUERIES[self.engine.dialect.name]
+                with self.engine.connect() as connection:
+                    self.tables = {row[0]: list(row[1:]) for row in connection.execute(query)}
+                digest = hashlib.sha1(json.dumps(sorted(self.tables.items())).encode())
+                self.value = digest.hexdigest()
+                self.checked_at = now
+            return self.value
+
+    def get_tables(self, revalidate=False):
+        self.get(revalidate=revalidate)
+        return self.tables
+
+
+_schema_fingerprints = weakref.WeakKeyDictionary()
+_schema_fingerprints_lock = threading.Lock()
+
+
+def _drop_schema_fingerprint(engine):
+    with _schema_fingerprints_lock:
+        _schema_fingerprints.pop(engine, None)
+
+
+def get_schema_tracker(engine):
+    with _schema_fingerprints_lock:
+        fingerprint = _schema_fingerprints.get(engine)
+        if fingerprint is None:
+            fingerprint = SchemaFingerprint(engine)
+            _schema_fingerprints[engine] = fingerprint
+            on_engine_disposed(engine, _drop_schema_fingerprint)
+    return fingerprint
+
+
+def get_schema_fingerprint(engine, revalidate=False):
+    return get_schema_tracker(engine).get(revalidate=revalidate)
+
+
+class CachedSQLDatabase(SQLDatabase):
+    """SQLDatabase that reflects tables lazily and memoizes their table info.
+
+    The DDL and sample rows the agent's schema tool returns are computed once
+    per table and reused until that table's fingerprint changes; only changed
+    tables are reflected again. When ``snapshot_dir`` is set the memoized
+    table info is written to disk, so a restarted process starts warm for
+    every table whose fingerprint still matches. With a ``shared`` cache the
+    table info is also exchanged with other replicas, keyed by the table's
+    fingerprint.
+
+    Views are usable like tables, materialized views included, so the agent
+    can read precomputed answers.
+
+    Queries from the agent's query tool are parsed locally: anything but one
+    read-only statement is rejected, tables and columns are checked against
+    the cached schema and a missing LIMIT is added. They then go through a
+    read-only QueryExecutor, so large results are streamed, cut off at the
+    configured budgets and marked as truncated instead of being loaded whole
+    into memory and the LLM context.
+    """
+
+    def __init__(self, engine, snapshot_dir=SCHEMA_SNAPSHOT_DIR, shared=None, **kwargs):
+        kwargs.setdefault("lazy_table_reflection", True)
+        kwargs.setdefault("view_support", True)
+        super().__init__(engine, **kwargs)
+        self._all_tables = self._list_relations()
+        self._usable_tables = set(super().get_usable_table_names())
+        self._tracker = get_schema_tracker(engine)
+        self._known_relations = set(self._tracker.get_tables())
+        self._table_info = {}
+        self._table_columns = {}
+        self._table_versions = {}
+        self._cache_lock = threading.RLock()
+        self.executor = QueryExecutor(engine)
+        self.shared = shared if shared is not None else get_shared_cache()
+        self._database = database_key(engine)
+        self._snapshot_path = None
+        if snapshot_dir:
+            url = engine.url.render_as_string(hide_password=True)
+            name = hashlib.sha1(url.encode()).hexdigest()[:16]
+            self._snapshot_path = os.path.join(snapshot_dir, f"schema-{name}.json")
+            self._load_snapshot()
+
+    def get_usable_table_names(self):
+        if hasattr(self, "_tracker"):
+            self._revalidate()
+        return super().get_usable_table_names()
+
+    def get_table_info(self, table_names=None):
+        self._revalidate()
+        all_table_names = super().get_usable_table_names()
+        if table_names is not None:
+            missing_tables = set(table_names).difference(all_table_names)
+            if missing_tables:
+                raise ValueError(f"table_names {missing_tables} not found in database")
+            all_table_names = table_names
+
+        tables = []
+        updated = False
+        with self._cache_lock:
+            for name in all_table_names:
+                info = self._table_info.get(name)
+                if info is None:
+                    version = self._tracker.tables.get(name)
+                    info = self._shared_table_info(name, version)
+                    if info is None:
+                        info = super().get_table_info([name])
+                        self._share_table_info(name, version, info)
+                    self._table_info[name] = info
+                    self._table_versions[name] = version
+                    updated = True
+                if info:
+                    tables.append(info)
+            if updated:
+                self._save_snapshot()
+        tables.sort()
+        return "\n\n".join(tables)
+
+    def run(self, command, fetch="all", include_columns=False, *, parameters=None, execution_options=None):
+        if fetch == "cursor" or execution_options:
+            return super().run(
+                command,
+                fetch,
+                include_columns,
+                parameters=parameters,
+                execution_options=execution_options,
+            )
+
+        if isinstance(command, str):
+            command = check_read_query(
+                command,
+                dialect=SQLGLOT_DIALECTS.get(self.dialect, self.dialect),
+                columns=self.get_table_columns,
+                # One row over the budget so truncation is still detected.
+                limit=self.executor.max_rows + 1,
+            )
+        result = self.executor.execute(command, parameters)
+        rows = result.as_dicts()[:1] if fetch == "one" else result.as_dicts()
+        rows = [
+            {column: truncate_word(value, length=self._max_string_length) for column, value in row.items()}
+            for row in rows
+        ]
+        if not include_columns:
+            rows = [tuple(row.values()) for row in rows]
+        if not rows:
+            return ""
+        if result.truncated and fetch != "one":
+            return f"{rows}\n{result.marker}"
+        return str(rows)
+
+    def _shared_table_info(self, name, version):
+        if self.shared is None or version is None:
+            return None
+        return self.shared.get("schema", self._database, version, self._table_info_key(name))
+
+    def _share_table_info(self, name, version, info):
+        if self.shared is not None and version is not None:
+            self.shared.set("schema", self._database, version, self._table_info_key(name), info)
+
+    def _table_info_key(self, name):
+        # The rendered info depends on these options as well as the table.
+        return [name, self._schema, self._sample_rows_in_table_info, self._indexes_in_table_info]
+
+    def get_table_columns(self, name):
+        """Column names of a usable table or view, or None if there is none."""
+        self._revalidate()
+        if name not in self._usable_tables:
+            return None
+        with self._cache_lock:
+            names = self._table_columns.get(name)
+            if names is None:
+                # A fresh inspector: the shared one caches columns across ALTERs.
+                columns = inspect(self._engine).get_columns(name, schema=self._schema)
+                names = frozenset(column["name"] for column in columns)
+                self._table_columns[name] = names
+                self._table_versions.setdefault(name, self._tracker.tables.get(name))
+            return names
+
+    def cache_stats(self):
+        return {
+            "tables": len(self._all_tables),
+            "cached_tables": len(self._table_info),
+            "reflected_tables": len(self._metadata.tables),
+        }
+
+    def _revalidate(self):
+        versions = self._tracker.get_tables()
+        with self._cache_lock:
+            for name in set(self._table_info) | set(self._table_columns):
+                if versions.get(name) != self._table_versions.get(name):
+                    self._forget(name)
+            if set(versions) != self._known_relations:
+                # Tables were created or dropped: list them again with a
+                # fresh inspector, since inspectors cache their results.
+                self._known_relations = set(versions)
+                self._inspector = inspect(self._engine)
+                self._all_tables = self._list_relations()
+                for name in (set(self._table_info) | set(self._table_columns)) - self._all_tables:
+                    self._forget(name)
+                self._usable_tables = set(super().get_usable_table_names())
+
+    def _list_relations(self):
+        names = set(self._inspector.get_table_names(schema=self._schema))
+        if self._view_support:
+            names.update(self._inspector.get_view_names(schema=self._schema))
+            if self.dialect == "postgresql":
+                names.update(self._inspector.get_materialized_view_names(schema=self._schema))
+        return names
+
+    def _forget(self, name):
+        self._table_info.pop(name, None)
+        self._table_columns.pop(name, None)
+        self._table_versions.pop(name, None)
+        table = self._metadata.tables.get(
+            f"{self._schema}.{name}" if self._schema else name
+        )
+        if table is not None:
+            self._metadata.remove(table)
+
+    def _load_snapshot(self):
+        try:
+            with open(self._snapshot_path) as snapshot:
+                tables = json.load(snapshot)
+        except (OSError, ValueError):
+            return
+        versions = self._tracker.get_tables()
+        for name, (version, info) in tables.items():
+            if versions.get(name) == version:
+                self._table_info[name] = info
+                self._table_versions[name] = version
+
+    def _save_snapshot(self):
+        if not self._snapshot_path:
+            return
+        tables = {
+            name: [self._table_versions.get(name), info]
+            for name, info in self._table_info.items()
+        }
+        os.makedirs(os.path.dirname(self._snapshot_path), exist_ok=True)
+        temporary_path = f"{self._snapshot_path}.tmp"
+        with open(temporary_path, "w") as snapshot:
+            json.dump(tables, snapshot)
+        os.replace(temporary_path, self._snapshot_path)
@@ -0,0 +1,291 @@
+import datetime
+import threading
+import weakref
+from functools import lru_cache
+
+from sqlalchemy import bindparam, text
+from sqlalchemy.exc import DBAPIError
+
+from app import tracing
+from app.config import FUNCTION_ROUTER_MAX_ROWS
+from app.database.connections import on_engine_disposed, sqlstate
+from app.database.functions import DatabaseFunctions
+from app.database.query import QueryResult
+
+# Python types for the PostgreSQL argument types a tool schema can express;
+# anything else is passed as text.
+PYTHON_TYPES = {
+    "date": datetime.date,
+    "timestamp without time zone": datetime.datetime,
+    "timestamp with time zone": datetime.datetime,
+    "smallint": int,
+    "integer": int,
+    "bigint": int,
+    "numeric": float,
+    "real": float,
+    "double precision": float,
+    "boolean": bool,
+}
+
+# SQLSTATEs of a statement prepared on this connection that is gone
+# (invalid_sql_statement_name) or whose cached plan no longer fits the
+# function (feature_not_supported: "cached plan must not change result type").
+_REPREPARE_ERRORS = ("26000", "0A000")
+
+
+class FunctionSignature:
+    def __init__(self, oid, name, arguments, argument_names, argument_types, defaults, description):
+        self.oid = oid
+        self.name = name
+        self.arguments = arguments
+        self.argument_names = argument_names
+        self.argument_types = argument_types
+        self.defaults = defaults
+        self.description = description
+
+    @property
+    def required(self):
+        return len(self.argument_types) - self.defaults
+
+    def accepts(self, count):
+        return self.required <= count <= len(self.argument_types)
+
+    def python_type(self, position):
+        return PYTHON_TYPES.get(self.argument_types[position].split("(")[0], str)
+
+    def fits(self, arguments):
+        """Whether every value already has its declared type, or is an ISO
+        string for a date; tells overloads with as many arguments apart."""
+        for position, value in enumerate(arguments):
+            python_type = self.python_type(position)
+            if value is None:
+                continue
+            if python_type in (datetime.date, datetime.datetime) and isinstance(value, str):
+                try:
+                    python_type.fromisoformat(value)
+                except ValueError:
+                    return False
+            elif python_type is float and isinstance(value, int) and not isinstance(value, bool):
+                continue
+            elif not isinstance(value, python_type) or (python_type is int and isinstance(value, bool)):
+                return False
+        return True
+
+    def coerce(self, arguments):
+        """Converts argument values to the declared types; raises ValueError."""
+        values = []
+        for position, value in enumerate(arguments):
+            python_type = self.python_type(position)
+            if value is None or isinstance(value, python_type):
+                values.append(value)
+            elif python_type is bool and isinstance(value, str):
+                values.append(value.strip().lower() in ("true", "t", "yes", "1"))
+            elif python_type in (datetime.date, datetime.datetime):
+                values.append(python_type.fromisoformat(str(value)))
+            else:
+                values.append(python_type(value))
+        return values
+
+
+class TrustedFunctionExecutor:
+    """Calls trusted functions with bound parameters only.
+
+    Signatures are read from pg_proc once per function catalog version. On
+    PostgreSQL every (function, argument count) is PREPAREd once per pooled
+    connection and the statement names are kept in the connection's ``info``
+    dict, so repeated calls on that connection go straight to EXECUTE without
+    the server parsing and planning the call again. Argument values are always
+    sent as parameters, never written into the SQL text.
+    """
+
+    SIGNATURES_QUERY = text("""
+        SELECT
+            p.oid,
+            p.proname,
+            pg_catalog.pg_get_function_arguments(p.oid),
+            p.proargnames,
+            p.proargmodes,
+            ARRAY(
+                SELECT pg_catalog.format_type(a.type_oid, NULL)
+                FROM unnest(p.proargtypes::oid[]) WITH ORDINALITY AS a(type_oid, position)
+                ORDER BY a.position
+            ),
+            p.pronargdefaults,
+            d.description
+        FROM
+            pg_catalog.pg_proc p
+        JOIN
+            pg_catalog.pg_namespace n ON n.oid = p.pronamespace
+        LEFT JOIN
+            pg_catalog.pg_description d ON d.objoid = p.oid
+        WHERE
+            n.nspname = 'public' AND p.prokind = 'f'
+        ORDER BY
+            p.proname, p.oid
+    """)
+
+    INFO_KEY = "trusted_function_statements"
+
+    def __init__(self, engine, max_rows=FUNCTION_ROUTER_MAX_ROWS):
+        self.engine = engine
+        self.max_rows = max_rows
+        self.db_functions = DatabaseFunctions(engine)
+        self.version = None
+        self.prepares = 0
+        self.executions = 0
+        self._signatures = None
+        self._lock = threading.Lock()
+
+    def signatures(self):
+        self.db_functions.get_all_functions()
+        version = self.db_functions.catalog_cache.fingerprint
+        with self._lock:
+            if self._signatures is None or version != self.version:
+                self._signatures = self._load_signatures()
+                self.version = version
+            return self._signatures
+
+    def resolve(self, name, arguments, declared=None):
+        """The overload of ``name`` to call with ``arguments``; raises ValueError.
+
+        ``declared``, an overload's argument list as pg_get_function_arguments
+        prints it, picks that overload. Otherwise, when several overloads take
+        that many arguments, the one the values fit is chosen, and the call is
+        refused when that is still not a single one.
+        """
+        candidates = [
+            signature for signature in self.signatures()
+            if signature.name == name and signature.accepts(len(arguments))
+        ]
+        if declared is not None:
+            candidates = [signature for signature in candidates if signature.arguments == declared]
+        if len(candidates) > 1:
+            candidates = [signature for signature in candidates if signature.fits(arguments)]
+        if not candidates:
+            raise ValueError(f"No trusted function {name} takes these {len(arguments)} arguments.")
+        if len(candidates) > 1:
+            overloads = "; ".join(f"{name}({signature.arguments})" for signature in candidates)
+            raise ValueError(f"The arguments fit several overloads of {name}: {overloads}.")
+        return candidates[0]
+
+    def call(self, function, arguments):
+        """Runs ``function``, a name or an overload from ``resolve``, with
+        bound arguments."""
+        if isinstance(function, FunctionSignature):
+            signature = function
+        else:
+            signature = self.resolve(function, arguments)
+        arguments = signature.coerce(arguments)
+        with tracing.span("db", sql=f"{signature.name}({len(arguments)} bound arguments)") as span:
+            with self.engine.connect() as connection:
+                if self.engine.dialect.name == "postgresql":
+                    result = self._execute_prepared(connection, signature, arguments)
+                else:
+                    result = connection.execute(self.statement(signature, arguments))
+                columns = list(result.keys())
+                rows = [tuple(row) for row in result.fetchmany(self.max_rows + 1)]
+            span["rows"] = len(rows)
+        self.executions += 1
+        if len(rows) > self.max_rows:
+            return QueryResult(columns, rows[: self.max_rows], True, f"row limit of {self.max_rows}")
+        return QueryResult(columns, rows)
+
+    def statement(self, signature, arguments):
+        """The call as a statement with bound parameters, for drivers that
+        prepare and cache statements themselves (asyncpg) and for display."""
+        names = [f"arg{position}" for position in range(len(arguments))]
+        return text(
+            f"SELECT * FROM {self._function_sql(signature)}({', '.join(':' + name for name in names)})"
+        ).bindparams(*[bindparam(name, value) for name, value in zip(names, arguments)])
+
+    def stats(self):
+        return {
+            "functions": len(self._signatures or []),
+            "prepares": self.prepares,
+            "executions": self.executions,
+        }
+
+    def _execute_prepared(self, connection, signature, arguments):
+        statements = connection.connection.info.setdefault(self.INFO_KEY, {})
+        key = (signature.oid, len(arguments))
+        prepared_here = key not in statements
+        if prepared_here:
+            statements[key] = self._prepare(connection, signature, len(arguments))
+        parameters = {f"arg{position}": value for position, value in enumerate(arguments)}
+        try:
+            return connection.execute(_execute_statement(statements[key], len(arguments)), parameters)
+        except DBAPIError as e:
+            if prepared_here or sqlstate(e) not in _REPREPARE_ERRORS:
+                raise
+            # The function was replaced (for example with a new result type)
+            # or the session was reset since it was prepared here; prepare it
+            # again once.
+            connection.rollback()
+            connection.exec_driver_sql("DEALLOCATE ALL")
+            statements.clear()
+            statements[key] = self._prepare(connection, signature, len(arguments))
+            return connection.execute(_execute_statement(statements[key], len(arguments)), parameters)
+
+    def _prepare(self, connection, signature, count):
+        statement_name = f"trusted_{signature.oid}_{count}"
+        # Only the quoted function name and catalog type names go into the
+        # text; values are bound at EXECUTE.
+        types = ", ".join(signature.argument_types[:count])
+        placeholders = ", ".join(f"${position + 1}" for position in range(count))
+        connection.exec_driver_sql(
+            f"PREPARE {statement_name}{f' ({types})' if count else ''} AS "
+            f"SELECT * FROM {self._function_sql(signature)}({placeholders})"
+        )
+        self.prepares += 1
+        return statement_name
+
+    def _function_sql(self, signature):
+        preparer = self.engine.dialect.identifier_preparer
+        if self.engine.dialect.name == "postgresql":
+            return f"public.{preparer.quote(signature.name)}"
+        return preparer.quote(signature.name)
+
+    def _load_signatures(self):
+        if self.engine.dialect.name != "postgresql":
+            return []
+        with self.engine.connect() as connection:
+            rows = connection.execute(self.SIGNATURES_QUERY).fetchall()
+        signatures = []
+        for oid, name, arguments, names, modes, types, defaults, description in rows:
+            # proargnames also lists OUT and TABLE columns; keep input ones.
+            if names and modes:
+                names = [n for n, mode in zip(names, modes) if mode in ("i", "b", "v")]
+            names = [
+                (names[position] if names and position < len(names) and names[position] else f"arg{position + 1}")
+                for position in range(len(types))
+            ]
+            signatures.append(
+                FunctionSignature(oid, name, arguments, names, list(types), defaults or 0, description)
+            )
+        return signatures
+
+
+@lru_cache(maxsize=1024)
+def _execute_statement(statement_name, count):
+    if not count:
+        return text(f"EXECUTE {statement_name}")
+    return text(f"EXECUTE {statement_name}({', '.join(f':arg{position}' for position in range(count))})")
+
+
+_executors = weakref.WeakKeyDictionary()
+_executors_lock = threading.Lock()
+
+
+def get_trusted_executor(engine):
+    with _executors_lock:
+        executor = _executors.get(engine)
+        if executor is None:
+            executor = TrustedFunctionExecutor(engine)
+            _executors[engine] = executor
+            on_engine_disposed(engine, _drop_trusted_executor)
+        return executor
+
+
+def _drop_trusted_executor(engine):
+    with _executors_lock:
+        _executors.pop(engine, None)
@@ -0,0 +1,206 @@
+import sqlglot
+from sqlglot import exp
+from sqlglot.errors import ParseError, SqlglotError
+from sqlglot.optimizer.scope import traverse_scope
+
+# SQLAlchemy dialect names to sqlglot ones
+SQLGLOT_DIALECTS = {"postgresql": "postgres", "sqlite": "sqlite"}
+
+_WRITE_EXPRESSIONS = (
+    exp.Insert,
+    exp.Update,
+    exp.Delete,
+    exp.Merge,
+    exp.Create,
+    exp.Drop,
+    exp.Alter,
+    exp.TruncateTable,
+    exp.Command,
+    exp.Copy,
+    exp.Set,
+    exp.Transaction,
+    exp.Commit,
+    exp.Rollback,
+    exp.Into,
+    exp.Lock,
+)
+
+# Functions that act on the server or its files rather than read data, which
+# a read-only transaction does not stop
+_BLOCKED_FUNCTIONS = frozenset({
+    "pg_cancel_backend",
+    "pg_terminate_backend",
+    "pg_reload_conf",
+    "pg_stat_file",
+    "pg_notify",
+    "set_config",
+})
+
+# Families blocked by name prefix: sleeps, server files, large objects,
+# advisory locks (session-level ones outlive the rolled back transaction and
+# stay held on the pooled connection), and functions that run other SQL.
+_BLOCKED_FUNCTION_PREFIXES = (
+    "pg_sleep",
+    "pg_read_",
+    "pg_ls_",
+    "lo_",
+    "pg_advisory_",
+    "pg_try_advisory_",
+    "dblink",
+    "query_to_xml",
+    "cursor_to_xml",
+    "table_to_xml",
+    "schema_to_xml",
+    "database_to_xml",
+)
+
+
+def check_read_query(query, dialect="postgres", columns=None, limit=None):
+    """Returns the one read-only statement in ``query``; raises ValueError.
+
+    The statement is parsed locally, without an LLM call: writes, DDL,
+    locking reads and server-side functions are rejected. When ``columns``
+    is given (a table name to column names callable, returning None for
+    tables that do not exist) referenced tables and columns are checked
+    against it. When ``limit`` is given a query without one gets
+    ``LIMIT limit``. The database still reports anything it rejects.
+    """
+    try:
+        statements = [statement for statement in sqlglot.parse(query, read=dialect) if statement is not None]
+    except ParseError as e:
+        description = e.errors[0]["description"] if e.errors else str(e)
+        raise ValueError(f"Could not parse the query: {description}") from e
+    if len(statements) != 1:
+        raise ValueError("Send exactly one SQL statement.")
+    statement = statements[0]
+    if not isinstance(statement, (exp.Query, exp.Values)) or statement.find(*_WRITE_EXPRESSIONS):
+        raise ValueError("Only read-only queries (SELECT or WITH) can be run.")
+    for function in statement.find_all(exp.Anonymous):
+        name = function.name.lower()
+        if name in _BLOCKED_FUNCTIONS or name.startswith(_BLOCKED_FUNCTION_PREFIXES):
+            raise ValueError(f"The function {function.name} cannot be used in queries.")
+    if columns is not None:
+        _check_references(statement, columns)
+    if limit is not None and isinstance(statement, exp.Query) and not statement.args.get("limit"):
+        return statement.limit(int(limit)).sql(dialect=dialect, normalize_functions=False)
+    return query.strip().rstrip(";").strip()
+
+
+def _check_references(statement, columns):
+    cte_names = {cte.alias_or_name.lower() for cte in statement.find_all(exp.CTE)}
+    for table in statement.find_all(exp.Table):
+        # Table functions, CTEs and other schemas (pg_catalog,
+        # information_schema) are left for the database to resolve.
+        if not isinstance(table.this, exp.Identifier) or table.args.get("db") and table.db.lower() != "public":
+            continue
+        name = _identifier_name(table.this)
+        if name.lower() not in cte_names and columns(name) is None:
+            raise ValueError(f"Table {name} does not exist; list the tables to see which do.")
+    try:
+        scopes = traverse_scope(statement)
+    except SqlglotError:
+        return
+    for scope in scopes:
+        for column in scope.columns:
+            # Columns of subqueries are also listed on their parent scope.
+            if column.find_ancestor(exp.Select, exp.SetOperation) is not scope.expression:
+                continue
+            _check_column(scope, column, columns)
+
+
+def _check_column(scope, column, columns):
+    name = _identifier_name(column.this) if isinstance(column.this, exp.Identifier) else None
+    if name is None:
+        return
+    if column.table:
+        source = _find_source(scope, column.table)
+        known = _source_columns(source, columns)
+        if known is not None and name not in known:
+            raise ValueError(f"Column {column.table}.{name} does not exist in {source.name}.")
+        return
+    candidates, tables = set(), []
+    current = scope
+    while current is not None:
+        for source in current.sources.values():
+            known = _source_columns(source, columns)
+            if known is None:
+                return
+            candidates |= known
+            tables.append(source.name)
+        current = current.parent
+    aliases = set()
+    if isinstance(scope.expression, exp.Select):
+        aliases = {projection.alias for projection in scope.expression.selects if projection.alias}
+    if tables and name not in candidates and name not in aliases:
+        raise ValueError(f"Column {name} does not exist in {', '.join(sorted(set(tables)))}.")
+
+
+def _find_source(scope, alias):
+    while scope is not None:
+        if alias in scope.sources:
+            return scope.sources[alias]
+        scope = scope.parent
+    return None
+
+
+def _source_columns(source, columns):
+    if not isinstance(source, exp.Table) or not isinstance(source.this, exp.Identifier):
+        return None
+    if source.args.get("db") and source.db.lower() != "public":
+        return None
+    known = columns(_identifier_name(source.this))
+    return None if known is None else set(known)
+
+
+def _identifier_name(identifier):
+    return identifier.this if identifier.quoted else identifier.this.lower()
+
+
+def referenced_tables(query, dialect="postgres"):
+    """Tables and table functions ``query`` reads from, or [] if it does not parse."""
+    try:
+        statement = sqlglot.parse_one(query, read=dialect)
+    except SqlglotError:
+        return []
+    cte_names = {cte.alias_or_name.lower() for cte in statement.find_all(exp.CTE)}
+    names = []
+    for table in statement.find_all(exp.Table):
+        name = table.this.name if isinstance(table.this, exp.Func) else table.name
+        if name and name.lower() not in cte_names and name not in names:
+            names.append(name)
+    return names
+
+
+def unique_key_columns(query, dialect="postgres"):
+    """Output columns whose values identify a row of ``query``'s result.
+
+    These are the GROUP BY keys of a grouped SELECT when every one of them is
+    selected under a distinct name; None when no such key can be told.
+    """
+    try:
+        statement = sqlglot.parse_one(query, read=dialect)
+    except SqlglotError:
+        return None
+    group = statement.args.get("group") if isinstance(statement, exp.Select) else None
+    if group is None or not group.expressions or any(
+        group.args.get(kind) for kind in ("grouping_sets", "cube", "rollup")
+    ):
+        return None
+    projections = statement.selects
+    names = [projection.alias_or_name for projection in projections]
+    if not all(names) or len(set(names)) != len(names) or any(projection.is_star for projection in projections):
+        return None
+    keys = []
+    for expression in group.expressions:
+        if isinstance(expression, exp.Literal) and expression.is_int and 0 < int(expression.name) <= len(names):
+            keys.append(names[int(expression.name) - 1])
+            continue
+        for projection, name in zip(projections, names):
+            if projection.unalias() == expression or (
+                isinstance(expression, exp.Column) and not expression.table and expression.name == name
+            ):
+                keys.append(name)
+                break
+        else:
+            return None
+    return list(dict.fromkeys(keys))
@@ -1,10 +1,31 @@
+import gradio as gr
+import uvicorn
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
+
+from app.config import PREWARM, SERVER_HOST, SERVER_PORT
+from app.metrics import CONTENT_TYPE, metrics
+from app.prewarm import start_prewarm
 from app.ui.gradio_ui import GradioInterface
 
-def main():
+
+def create_app():
     interface = GradioInterface()
     demo = interface.create_interface()
-    demo.launch()
+
+    app = FastAPI()
+
+    @app.get("/metrics")
+    def metrics_endpoint():
+        return PlainTextResponse(metrics.render(), media_type=CONTENT_TYPE)
+
+    if PREWARM:
+        app.router.add_event_handler("startup", start_prewarm)
+
+    return gr.mount_gradio_app(app, demo, path="/")
+
+def main():
+    uvicorn.run(create_app(), host=SERVER_HOST, port=SERVER_PORT)
 
 if __name__ == "__main__":
     main()
-
@@ -0,0 +1,187 @@
+import bisect
+import threading
+from collections import deque
+
+from app.config import METRICS_WINDOW
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+QUANTILES = (0.5, 0.95, 0.99)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def quantile(sorted_values, q):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(q * (len(sorted_values) - 1)))))
+    return sorted_values[index]
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, value=1, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.label_names)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+    def value(self, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.label_names)
+        return self._values.get(key, 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            lines.append(f"{self.name}{_labels(self.label_names, key)} {_number(value)}")
+        return lines
+
+
+class _Series:
+    def __init__(self, buckets, window):
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.recent = deque(maxlen=window)
+
+
+class Histogram:
+    """Prometheus-style histogram that can also report recent quantiles.
+
+    Besides cumulative buckets, sum and count, the last ``window``
+    observations of every label set are kept so p50/p95/p99 can be read
+    without a Prometheus server; they are rendered as a ``<name>_recent``
+    gauge family.
+    """
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS, window=METRICS_WINDOW):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self.window = window
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.label_names)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = _Series(self.buckets, self.window)
+            series.counts[bisect.bisect_left(self.buckets, value)] += 1
+            series.sum += value
+            series.count += 1
+            series.recent.append(value)
+
+    def summary(self):
+        """{label values: {"count", "sum", 0.5, 0.95, 0.99}} for every series."""
+        with self._lock:
+            series = {key: (s.count, s.sum, sorted(s.recent)) for key, s in self._series.items()}
+        summary = {}
+        for key, (count, total, recent) in sorted(series.items()):
+            summary[key] = {"count": count, "sum": total}
+            summary[key].update({q: quantile(recent, q) for q in QUANTILES})
+        return summary
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = [(key, list(s.counts), s.sum, s.count) for key, s in self._series.items()]
+        for key, counts, total, count in sorted(series):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                labels = _labels(self.label_names, key, [("le", _number(bound))])
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, key)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, key)} {count}")
+
+        recent_name = f"{self.name}_recent"
+        lines.append(f"# HELP {recent_name} {self.help} (quantiles over the last {self.window} observations)")
+        lines.append(f"# TYPE {recent_name} gauge")
+        for key, values in self.summary().items():
+            for q in QUANTILES:
+                if values[q] is not None:
+                    labels = _labels(self.label_names, key, [("quantile", q)])
+                    lines.append(f"{recent_name}{labels} {_number(values[q])}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name, help, labels=()):
+        return self._register(name, lambda: Counter(name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._register(name, lambda: Histogram(name, help, labels, buckets))
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def _register(self, name, factory):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = factory()
+            return metric
+
+
+metrics = MetricsRegistry()
+
+CHAT_STAGE_SECONDS = metrics.histogram(
+    "chat_stage_seconds", "Seconds spent per chat pipeline stage", labels=("stage",)
+)
+CHAT_FIRST_UPDATE_SECONDS = metrics.histogram(
+    "chat_first_update_seconds", "Seconds until the first progress update reached the chatbot"
+)
+CHAT_REQUESTS = metrics.counter(
+    "chat_requests_total", "Chat messages handled, by outcome", labels=("outcome",)
+)
+LLM_CALLS = metrics.counter("chat_llm_calls_total", "LLM calls, by model", labels=("model",))
+LLM_TOKENS = metrics.counter(
+    "chat_llm_tokens_total", "LLM tokens, by model and direction", labels=("model", "direction")
+)
+TOOL_CALLS = metrics.counter(
+    "chat_tool_calls_total", "Agent tool calls, by tool and status", labels=("tool", "status")
+)
+DB_ROWS = metrics.counter("chat_db_rows_total", "Rows returned by budgeted database queries")
+MODEL_ATTEMPTS = metrics.counter(
+    "chat_model_attempts_total", "Routed model attempts, by model, step and outcome", labels=("model", "step", "outcome")
+)
+MODEL_SECONDS = metrics.histogram(
+    "chat_model_seconds", "Seconds per routed model attempt, by model and step", labels=("model", "step")
+)
+CACHE_LOOKUPS = metrics.counter(
+    "cache_lookups_total", "Shared cache lookups, by kind, tier and result", labels=("kind", "tier", "result")
+)
@@ -0,0 +1,66 @@
+import logging
+import threading
+import time
+
+from app.agent.agent import AgentSetup
+from app.agent.example_store import get_example_store
+from app.agent.memory import get_checkpointer
+from app.agent.models import AUTO, ModelRouter
+from app.config import PREWARM_DB_NAME, PREWARM_DB_PASSWORD, PREWARM_DB_USER
+from app.database.connections import engine_registry
+from app.database.functions import DatabaseFunctions
+from app.database.schema import get_schema_fingerprint
+from app.ui.gradio_ui import create_agent_tools
+
+logger = logging.getLogger(__name__)
+
+
+def prewarm(models=None):
+    """Builds what the first chat would otherwise wait for; returns {step: seconds}.
+
+    The example library, the conversation checkpointer and the client of
+    every model a new session starts with (importing its provider). With
+    PREWARM_DB_NAME set, the app also connects as PREWARM_DB_USER and builds
+    the agent for that database: the engine is kept, so sessions connecting
+    with the same credentials reuse its pool, schema, function catalog and
+    agent graph. A failing step is logged and skipped.
+    """
+    models = models or ModelRouter()
+    names = [models.default] + ([models.fast] if models.choice == AUTO and models.fast != models.default else [])
+    steps = [("examples", get_example_store), ("memory", get_checkpointer)]
+    steps += [(f"model {name}", lambda name=name: models.get(name)) for name in names]
+    if PREWARM_DB_NAME:
+        steps.append(("agent", _prewarm_agent))
+
+    timings = {}
+    for name, step in steps:
+        started = time.perf_counter()
+        try:
+            step()
+        except Exception as e:
+            logger.warning(f"Pre-warming {name} failed: {e}")
+            continue
+        timings[name] = time.perf_counter() - started
+    return timings
+
+
+def _prewarm_agent():
+    engine = engine_registry.acquire(PREWARM_DB_USER, PREWARM_DB_PASSWORD, PREWARM_DB_NAME)
+    read_engine = engine_registry.get_read_engine(engine)
+    DatabaseFunctions(engine).get_all_functions()
+    get_schema_fingerprint(engine)
+    AgentSetup(read_engine, models=ModelRouter(), tools=create_agent_tools(read_engine)).setup()
+
+
+def start_prewarm():
+    """Runs ``prewarm`` in a daemon thread, so the UI is served meanwhile."""
+
+    def run():
+        started = time.perf_counter()
+        timings = prewarm()
+        steps = ", ".join(f"{name} {seconds * 1000:.0f} ms" for name, seconds in timings.items())
+        logger.info(f"Pre-warmed in {(time.perf_counter() - started) * 1000:.0f} ms: {steps}")
+
+    thread = threading.Thread(target=run, name="prewarm", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,246 @@
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from app.metrics import (
+    CHAT_FIRST_UPDATE_SECONDS,
+    CHAT_REQUESTS,
+    CHAT_STAGE_SECONDS,
+    LLM_CALLS,
+    LLM_TOKENS,
+    TOOL_CALLS,
+)
+
+# The trace of the chat message being handled. Code below the agent (query
+# execution, the function router) records into it without the trace being
+# threaded through every call.
+current_trace = ContextVar("current_trace", default=None)
+
+# Stages that always run inside another stage (a tool call or the router);
+# the trace view indents them.
+_NESTED_STAGES = {"db"}
+
+
+class Span:
+    def __init__(self, stage, offset, seconds, attributes):
+        self.stage = stage
+        self.offset = offset
+        self.seconds = seconds
+        self.attributes = attributes
+
+
+class Trace:
+    """Timed spans for one chat message: cache lookup, routing, prompt build,
+    every LLM and tool call, database queries and formatting."""
+
+    def __init__(self, question=""):
+        self.question = question
+        self.started = time.perf_counter()
+        self.spans = []
+        self.outcome = None
+        self.total = None
+        self.first_update = None
+        self.handler = TraceCallbackHandler(self)
+        self._lock = threading.Lock()
+
+    def record(self, stage, seconds, started=None, **attributes):
+        offset = (started if started is not None else time.perf_counter() - seconds) - self.started
+        with self._lock:
+            self.spans.append(Span(stage, offset, seconds, attributes))
+        CHAT_STAGE_SECONDS.observe(seconds, stage=stage)
+
+    @contextmanager
+    def span(self, stage, **attributes):
+        started = time.perf_counter()
+        try:
+            yield attributes
+        finally:
+            self.record(stage, time.perf_counter() - started, started, **attributes)
+
+    @contextmanager
+    def activate(self):
+        token = current_trace.set(self)
+        try:
+            yield self
+        finally:
+            try:
+                current_trace.reset(token)
+            except ValueError:
+                # An async generator closed from another task runs its
+                # cleanup in a different context; there is nothing to undo.
+                pass
+
+    def config(self):
+        """Runnable config that reports LLM and tool calls into this trace."""
+        return {"callbacks": [self.handler]}
+
+    def mark_first_update(self):
+        if self.first_update is None:
+            self.first_update = time.perf_counter() - self.started
+            CHAT_FIRST_UPDATE_SECONDS.observe(self.first_update)
+
+    def finish(self, outcome):
+        if self.total is not None:
+            return self.total
+        self.outcome = outcome
+        self.total = time.perf_counter() - self.started
+        CHAT_STAGE_SECONDS.observe(self.total, stage="total")
+        CHAT_REQUESTS.inc(outcome=outcome)
+        return self.total
+
+    def stage_totals(self):
+        totals = {}
+        with self._lock:
+            spans = list(self.spans)
+        for span in spans:
+            seconds, count = totals.get(span.stage, (0.0, 0))
+            totals[span.stage] = (seconds + span.seconds, count + 1)
+        return totals
+
+    def tokens(self):
+        with self._lock:
+            spans = [span for span in self.spans if span.stage == "llm"]
+        return (
+            sum(span.attributes.get("input_tokens", 0) for span in spans),
+            sum(span.attributes.get("output_tokens", 0) for span in spans),
+        )
+
+    def summary(self):
+        total = self.total if self.total is not None else time.perf_counter() - self.started
+        parts = [
+            f"{stage} {seconds:.2f}s" + (f" x{count}" if count > 1 else "")
+            for stage, (seconds, count) in self.stage_totals().items()
+        ]
+        input_tokens, output_tokens = self.tokens()
+        if input_tokens or output_tokens:
+            parts.append(f"tokens {input_tokens} in / {output_tokens} out")
+        if self.first_update is not None:
+            parts.append(f"first update {self.first_update:.2f}s")
+        return f"Chat {self.outcome or 'running'} in {total:.2f}s: " + ", ".join(parts)
+
+    def as_markdown(self):
+        with self._lock:
+            spans = sorted(self.spans, key=lambda span: span.offset)
+        lines = [
+            f"**{self.summary()}**",
+            "",
+            "| start | stage | seconds | details |",
+            "|---:|---|---:|---|",
+        ]
+        for span in spans:
+            details = ", ".join(
+                f"{key}={_short(value)}" for key, value in span.attributes.items() if value is not None
+            )
+            stage = f"↳ {span.stage}" if span.stage in _NESTED_STAGES else span.stage
+            lines.append(f"| {span.offset:.3f} | {stage} | {span.seconds:.3f} | {details} |")
+        return "\n".join(lines)
+
+
+def _short(value, limit=120):
+    text = " ".join(str(value).split()).replace("|", "\\|")
+    return text if len(text) <= limit else text[: limit - 1] + "…"
+
+
+@contextmanager
+def span(stage, **attributes):
+    """Times a block into the current trace, or only into the metrics when
+    there is none."""
+    trace = current_trace.get()
+    if trace is not None:
+        with trace.span(stage, **attributes) as attributes:
+            yield attributes
+        return
+    started = time.perf_counter()
+    try:
+        yield attributes
+    finally:
+        CHAT_STAGE_SECONDS.observe(time.perf_counter() - started, stage=stage)
+
+
+def callback_config():
+    trace = current_trace.get()
+    return trace.config() if trace is not None else None
+
+
+def _model_name(serialized, metadata):
+    model = (metadata or {}).get("ls_model_name")
+    if model:
+        return model
+    kwargs = (serialized or {}).get("kwargs", {})
+    return kwargs.get("model_name") or kwargs.get("model") or (serialized or {}).get("name", "unknown")
+
+
+def _token_usage(response):
+    input_tokens = output_tokens = 0
+    for generations in response.generations:
+        for generation in generations:
+            usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if usage:
+                input_tokens += usage.get("input_tokens", 0)
+                output_tokens += usage.get("output_tokens", 0)
+    if not input_tokens and not output_tokens:
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        input_tokens = usage.get("prompt_tokens", 0)
+        output_tokens = usage.get("completion_tokens", 0)
+    return input_tokens, output_tokens
+
+
+class TraceCallbackHandler(BaseCallbackHandler):
+    """Records every LLM and tool run of an agent invocation into a Trace."""
+
+    # Recording is cheap and must not be reordered behind the executor.
+    run_inline = True
+
+    def __init__(self, trace):
+        self.trace = trace
+        self._runs = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, metadata=None, **kwargs):
+        self._runs[run_id] = (time.perf_counter(), _model_name(serialized, metadata))
+
+    def on_llm_start(self, serialized, prompts, *, run_id, metadata=None, **kwargs):
+        self._runs[run_id] = (time.perf_counter(), _model_name(serialized, metadata))
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        started, model = self._runs.pop(run_id, (None, "unknown"))
+        if started is None:
+            return
+        input_tokens, output_tokens = _token_usage(response)
+        LLM_CALLS.inc(model=model)
+        LLM_TOKENS.inc(input_tokens, model=model, direction="input")
+        LLM_TOKENS.inc(output_tokens, model=model, direction="output")
+        self.trace.record(
+            "llm",
+            time.perf_counter() - started,
+            started,
+            model=model,
+            input_tokens=input_tokens,
+            output_tokens=output_tokens,
+        )
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        started, model = self._runs.pop(run_id, (None, "unknown"))
+        if started is not None:
+            LLM_CALLS.inc(model=model)
+            self.trace.record("llm", time.perf_counter() - started, started, model=model, error=error)
+
+    def on_tool_start(self, serialized, input_str, *, run_id, inputs=None, **kwargs):
+        name = (serialized or {}).get("name") or kwargs.get("name", "tool")
+        sql = (inputs or {}).get("query") if isinstance(inputs, dict) else None
+        self._runs[run_id] = (time.perf_counter(), name, sql)
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        self._end_tool(run_id, "ok")
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self._end_tool(run_id, "error", error=error)
+
+    def _end_tool(self, run_id, status, error=None):
+        started, name, sql = self._runs.pop(run_id, (None, None, None))
+        if started is None:
+            return
+        TOOL_CALLS.inc(tool=name, status=status)
+        self.trace.record("tool", time.perf_counter() - started, started, tool=name, sql=sql, error=error)
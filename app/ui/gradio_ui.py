@@ -1,17 +1,47 @@
-from typing import Any, Dict, List
+import asyncio
+import json
+import os
+import queue
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
 
 import gradio as gr
-from langchain.agents import tool
+from langchain_core.pydantic_v1 import Field, create_model
+from langchain_core.tools import StructuredTool
 
 from app.agent.agent import AgentSetup
-from app.database.connections import DatabaseConnection
+from app.agent.answer_cache import AnswerCache
+from app.agent.models import AUTO, ModelRouter
+from app.cache import database_key, get_shared_cache
+from app.database.bundle import FunctionLibrary, dump_bundle, load_bundle
+from app.database.connections import engine_registry, get_async_engine
 from app.database.functions import DatabaseFunctions
+from app.database.precomputed import get_precomputed_views, get_refresh_scheduler
+from app.database.query import QueryExecutor
+from app.database.schema import get_schema_fingerprint
+from app.database.trusted import get_trusted_executor
+from app.database.validation import SQLGLOT_DIALECTS, check_read_query
+from app.tracing import Trace
+from app.ui.session import SessionRegistry
 from app.utils import ResponseFormatter
-from langchain_openai import ChatOpenAI
-from app.config import OPENAI_API_KEY
-from langchain_ollama import ChatOllama
-from app.config import EXAMPLE_QUERIES
-engine = None
+from app.config import (
+    AGENT_MAX_WORKERS,
+    CHAT_ASYNC,
+    EXAMPLE_PAGE_SIZE,
+    EXAMPLE_QUERIES_TOP_K,
+    FUNCTIONS_PAGE_SIZE,
+    GRADIO_CONCURRENCY_LIMIT,
+    LLM_CHOICE,
+    LLM_FAST_MODEL,
+    LLM_STRONG_MODEL,
+    PRECOMPUTED_REFRESH_SECONDS,
+    PRECOMPUTED_TOP_K,
+    QUERY_MAX_BYTES,
+    RESULTS_PAGE_SIZE,
+    TRUSTED_FUNCTION_TOOLS_MAX,
+)
 
 #############
 # TOOLS
@@ -23,28 +53,107 @@ logging.basicConfig(
         format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
     )
 logger = logging.getLogger(__name__)
-@tool
-def get_db_functions_agent_tool() -> List[Dict[str, Any]]:
-    """
-    Retrieves all functions and their descriptions from the connected PostgreSQL database.
-
-    Returns:
-    list of dict: Each dict contains the function name, code, and description
-    """
+
+
+def _format_db_functions(functions):
+    formatted_functions = []
+    for func in functions:
+        formatted_functions.append(
+            {
+                "name": func["function_name"],
+                "description": func["description"] or "No description available.",
+                "arguments": func["function_arguments"],
+                "code": func["function_code"],
+            }
+        )
+    return formatted_functions
+
+
+def create_db_functions_tool(engine):
+    def get_db_functions_agent_tool() -> List[Dict[str, Any]]:
+        """
+        Retrieves all functions and their descriptions from the connected PostgreSQL database.
+
+        Returns:
+        list of dict: Each dict contains the function name, arguments, code, and description
+        """
+        try:
+            return _format_db_functions(DatabaseFunctions(engine).get_all_functions())
+        except Exception as e:
+            return [{"error": f"Error retrieving database functions: {str(e)}"}]
+
+    async def aget_db_functions_agent_tool() -> List[Dict[str, Any]]:
+        try:
+            db_functions = DatabaseFunctions(engine, get_async_engine(engine))
+            return _format_db_functions(await db_functions.aget_all_functions())
+        except Exception as e:
+            return [{"error": f"Error retrieving database functions: {str(e)}"}]
+
+    return StructuredTool.from_function(
+        func=get_db_functions_agent_tool,
+        coroutine=aget_db_functions_agent_tool,
+        name="get_db_functions_agent_tool",
+    )
+
+
+def _trusted_function_tool(executor, signature, name):
+    fields = {}
+    for position, argument in enumerate(signature.argument_names):
+        python_type = signature.python_type(position)
+        if position < signature.required:
+            fields[argument] = (python_type, Field(..., description=signature.argument_types[position]))
+        else:
+            fields[argument] = (Optional[python_type], Field(None, description=signature.argument_types[position]))
+    args_schema = create_model(f"{name}_arguments", **fields)
+
+    def call_trusted_function(**kwargs):
+        arguments = [kwargs.get(argument) for argument in signature.argument_names]
+        # Trailing optional arguments that were left out use the defaults.
+        while len(arguments) > signature.required and arguments[-1] is None:
+            arguments.pop()
+        result = executor.call(signature, arguments)
+        return json.dumps({"function": signature.name, "results": result.as_dicts()}, default=str)
+
+    return StructuredTool.from_function(
+        func=call_trusted_function,
+        name=name,
+        description=(
+            f"Runs the trusted database function {signature.name}({signature.arguments}) "
+            f"with bound parameters. {signature.description or ''}"
+        ).strip(),
+        args_schema=args_schema,
+        # Tells apart the graphs of a function that was dropped and recreated.
+        metadata={"oid": signature.oid},
+    )
+
+
+def create_trusted_function_tools(engine):
+    """One typed tool per trusted function, or none when there are too many to
+    list in the prompt; the agent can always fall back to SQL."""
+    executor = get_trusted_executor(engine)
     try:
-        functions = DatabaseFunctions(engine).get_all_functions()
-        formatted_functions = []
-        for func in functions:
-            formatted_functions.append(
-                {
-                    "name": func["function_name"],
-                    "description": func["description"] or "No description available.",
-                    "code": func["function_code"],
-                }
-            )
-        return formatted_functions
+        signatures = executor.signatures()
     except Exception as e:
-        return [{"error": f"Error retrieving database functions: {str(e)}"}]
+        logger.warning(f"Could not read trusted function signatures: {e}")
+        return []
+    if len(signatures) > TRUSTED_FUNCTION_TOOLS_MAX:
+        return []
+    names = [signature.name for signature in signatures]
+    arities = [(signature.name, len(signature.argument_types)) for signature in signatures]
+    tools = []
+    for signature, arity in zip(signatures, arities):
+        name = f"call_{signature.name}"
+        if names.count(signature.name) > 1:
+            name += f"_{arity[1]}"
+        if arities.count(arity) > 1:
+            # Overloads taking as many arguments differ only in their types.
+            name += f"_{signature.oid}"
+        tools.append(_trusted_function_tool(executor, signature, name))
+    return tools
+
+
+def create_agent_tools(engine):
+    return [create_db_functions_tool(engine)] + create_trusted_function_tools(engine)
 
 
 ###############
@@ -52,12 +161,51 @@ def get_db_functions_agent_tool() -> List[Dict[str, Any]]:
 ###############
 
 
+class _ChatTurn:
+    """Progress message and request trace for one chat message in the chatbot."""
+
+    def __init__(self, message, history):
+        self.message = message
+        self.history = history
+        self.steps = []
+        self.partial = ""
+        self.trace = Trace(message)
+        self.history.append((message, ResponseFormatter.format_agent_progress([], "")))
+
+    def update(self, kind, content):
+        if kind == "step":
+            self.steps.append(content)
+            self.partial = ""
+        else:
+            self.partial += content
+        self.trace.mark_first_update()
+        self.history[-1] = (self.message, ResponseFormatter.format_agent_progress(self.steps, self.partial))
+        return self.history
+
+    def finish(self, response, outcome):
+        with self.trace.span("format"):
+            self.history[-1] = (self.message, ResponseFormatter.format_agent_response(response))
+        self.trace.finish(outcome)
+        return self.history
+
+    def abort(self):
+        self.trace.finish("error")
+        self.history.pop()
+        return self.history
+
+    def log(self):
+        # A chat closed before finishing was abandoned by the browser.
+        self.trace.finish("cancelled")
+        logger.info(self.trace.summary())
+
+
 class GradioInterface:
     def __init__(self):
-        self.db_connection = DatabaseConnection()
-        self.db_functions = None
-        self.agent_setup = None
-        self.example_queries = EXAMPLE_QUERIES
+        self.sessions = SessionRegistry()
+        self.answer_cache = AnswerCache(shared=get_shared_cache())
+        self.agent_pool = ThreadPoolExecutor(
+            max_workers=AGENT_MAX_WORKERS, thread_name_prefix="agent"
+        )
 
     def create_interface(self):
         with gr.Blocks(fill_height=True) as demo:
@@ -75,9 +223,18 @@ class GradioInterface:
 
                 with gr.Tab("Chat with AI"):
                     self._create_chat_tab()
-        
+
+            demo.unload(self._handle_unload)
+
+        demo.queue(default_concurrency_limit=GRADIO_CONCURRENCY_LIMIT)
         return demo
 
+    def _session(self, request):
+        return self.sessions.get(request.session_hash)
+
+    def _handle_unload(self, request: gr.Request):
+        self.sessions.close(request.session_hash)
+
     def _create_connection_tab(self):
         gr.Markdown("## Database Connection")
         username_input = gr.Textbox(label="Username")
@@ -85,12 +242,15 @@ class GradioInterface:
         db_name_input = gr.Textbox(label="Database Name")
         connect_button = gr.Button("Connect to Database")
         connection_status = gr.Textbox(label="Connection Status")
+        pool_stats_button = gr.Button("Show Pool Stats")
+        pool_stats = gr.JSON(label="Connection Pools")
 
         connect_button.click(
             self._handle_connection,
             inputs=[username_input, password_input, db_name_input],
             outputs=[connection_status],
         )
+        pool_stats_button.click(engine_registry.stats, outputs=[pool_stats])
 
     def _create_example_queries_tab(self):
         gr.Markdown("## Example Queries")
@@ -104,64 +264,179 @@ class GradioInterface:
         delete_status = gr.Textbox(label="Delete Status")
         
         refresh_button = gr.Button("Refresh Queries")
+        with gr.Row():
+            previous_page_button = gr.Button("Previous Page")
+            example_page = gr.Number(label="Page", value=1, precision=0, minimum=1)
+            next_page_button = gr.Button("Next Page")
         self.example_queries_list = gr.HTML()
 
         add_query_button.click(
             self._handle_add_example_query,
-            inputs=[query_input, description_input],
+            inputs=[query_input, description_input, example_page],
             outputs=[query_status, self.example_queries_list, query_input, description_input],
         )
         
         delete_query_button.click(
             self._handle_delete_example_query,
-            inputs=[delete_query_input],
+            inputs=[delete_query_input, example_page],
             outputs=[delete_status, self.example_queries_list, delete_query_input],
         )
         
         refresh_button.click(
             self._handle_refresh_example_queries,
+            inputs=[example_page],
             outputs=[self.example_queries_list],
         )
+        previous_page_button.click(lambda page: max(1, int(page or 1) - 1), inputs=[example_page], outputs=[example_page])
+        next_page_button.click(lambda page: int(page or 1) + 1, inputs=[example_page], outputs=[example_page])
+        example_page.change(
+            self._handle_refresh_example_queries,
+            inputs=[example_page],
+            outputs=[self.example_queries_list],
+        )
+
+        gr.Markdown("## Precomputed Views")
+        gr.Markdown(
+            "Keep the result of an example query, or of a trusted function call, as a materialized view "
+            "that is refreshed in the background; the agent reads it instead of recomputing the answer."
+        )
+        with gr.Row():
+            precomputed_name = gr.Textbox(label="View name")
+            precomputed_minutes = gr.Number(
+                label="Refresh every (minutes, 0 for manual)", value=PRECOMPUTED_REFRESH_SECONDS / 60, minimum=0
+            )
+        precomputed_description = gr.Textbox(label="Description (optional for a function)")
+        precomputed_query = gr.Textbox(label="Query to precompute", lines=3)
+        with gr.Row():
+            precomputed_function = gr.Textbox(label="Or a trusted function")
+            precomputed_arguments = gr.Textbox(label="Its arguments as a JSON list", value="[]")
+        with gr.Row():
+            promote_button = gr.Button("Precompute")
+            refresh_view_button = gr.Button("Refresh Now")
+            drop_view_button = gr.Button("Drop View")
+            list_views_button = gr.Button("Refresh List")
+        precomputed_status = gr.Textbox(label="Precomputed View Status")
+        precomputed_list = gr.Dataframe(interactive=False, wrap=True)
+
+        promote_button.click(
+            self._handle_promote_view,
+            inputs=[
+                precomputed_name,
+                precomputed_description,
+                precomputed_query,
+                precomputed_function,
+                precomputed_arguments,
+                precomputed_minutes,
+            ],
+            outputs=[precomputed_status, precomputed_list],
+        )
+        refresh_view_button.click(
+            self._handle_refresh_view, inputs=[precomputed_name], outputs=[precomputed_status, precomputed_list]
+        )
+        drop_view_button.click(
+            self._handle_drop_view, inputs=[precomputed_name], outputs=[precomputed_status, precomputed_list]
+        )
+        list_views_button.click(self._handle_list_views, outputs=[precomputed_status, precomputed_list])
+
+    def _precomputed_views(self, session):
+        if session.engine is None:
+            raise ValueError("Please connect to a database first.")
+        views = get_precomputed_views(session.engine)
+        if views is None:
+            raise ValueError("Precomputed views need a PostgreSQL database.")
+        return views
 
-    def _format_example_queries(self):
-        formatted_queries = ""
-        for i, query in enumerate(self.example_queries):
-            formatted_queries += f"""
-            <div style='margin-bottom: 10px; padding: 10px; border: 1px solid #ddd; border-radius: 5px;'>
-                <h3 style='margin: 0; color: #333;'>{query['description']}</h3>
-                <details>
-                    <summary>View Query</summary>
-                    <pre style='background-color: #f5f5f5; padding: 5px; border-radius: 3px; white-space: pre-wrap; word-wrap: break-word;'>{query['query']}</pre>
-                </details>
-            </div>
-            """
-        return formatted_queries
-
-    def _handle_add_example_query(self, query, description):
+    def _handle_promote_view(self, name, description, query, function, arguments, minutes, request: gr.Request):
+        session = self._session(request)
         try:
-            self.example_queries.append({"query": query, "description": description})
+            views = self._precomputed_views(session)
+            refresh_seconds = float(minutes or 0) * 60
+            if (function or "").strip():
+                arguments = json.loads(arguments or "[]")
+                if not isinstance(arguments, list):
+                    raise ValueError("The arguments must be a JSON list.")
+                created = views.promote_function(
+                    function.strip(), arguments, description, name or None, refresh_seconds
+                )
+            else:
+                created = views.promote(name, query, description, refresh_seconds)
+            return f"Precomputed {created}.", ResponseFormatter.format_precomputed_rows(views.list())
+        except Exception as e:
+            return f"Error precomputing: {str(e)}", self._precomputed_rows(session)
+
+    def _handle_refresh_view(self, name, request: gr.Request):
+        session = self._session(request)
+        try:
+            views = self._precomputed_views(session)
+            if not views.refresh(name):
+                raise ValueError("Another process is refreshing the view right now.")
+            return f"Refreshed {name}.", ResponseFormatter.format_precomputed_rows(views.list())
+        except Exception as e:
+            return f"Error refreshing: {str(e)}", self._precomputed_rows(session)
+
+    def _handle_drop_view(self, name, request: gr.Request):
+        session = self._session(request)
+        try:
+            views = self._precomputed_views(session)
+            views.drop(name)
+            return f"Dropped {name}.", ResponseFormatter.format_precomputed_rows(views.list())
+        except Exception as e:
+            return f"Error dropping: {str(e)}", self._precomputed_rows(session)
+
+    def _handle_list_views(self, request: gr.Request):
+        session = self._session(request)
+        try:
+            views = self._precomputed_views(session)
+            return "", ResponseFormatter.format_precomputed_rows(views.list(revalidate=True))
+        except Exception as e:
+            return str(e), None
+
+    def _precomputed_rows(self, session):
+        try:
+            return ResponseFormatter.format_precomputed_rows(self._precomputed_views(session).list())
+        except Exception:
+            return None
+
+    def _format_example_queries(self, session, page=1):
+        store = session.example_store
+        total = store.count()
+        last_page = max(1, -(-total // EXAMPLE_PAGE_SIZE))
+        page = min(max(1, int(page or 1)), last_page)
+        return ResponseFormatter.format_example_queries(
+            store.page(page, EXAMPLE_PAGE_SIZE), total, page, EXAMPLE_PAGE_SIZE
+        )
+
+    def _handle_add_example_query(self, query, description, page, request: gr.Request):
+        session = self._session(request)
+        try:
+            if session.engine is None:
+                raise ValueError("Connect to a database first so the query can be checked with EXPLAIN.")
+            session.example_store.add(query, description, validate_on=session.db_connection.read_engine)
             return (
-                f"Query added successfully!",
-                self._format_example_queries(),
+                "Query added successfully!",
+                self._format_example_queries(session, page),
                 "",
                 "",
             )
         except Exception as e:
-            return f"Error adding query: {str(e)}", self._format_example_queries(), query, description
+            return f"Error adding query: {str(e)}", self._format_example_queries(session, page), query, description
 
-    def _handle_delete_example_query(self, description):
+    def _handle_delete_example_query(self, description, page, request: gr.Request):
+        session = self._session(request)
         try:
-            self.example_queries = [q for q in self.example_queries if q['description'] != description]
+            deleted = session.example_store.delete_by_description(description)
+            if not deleted:
+                raise ValueError(f"No example query has the description '{description}'.")
             return (
                 f"Query with description '{description}' deleted successfully!",
-                self._format_example_queries(),
+                self._format_example_queries(session, page),
                 "",
             )
         except Exception as e:
-            return f"Error deleting query: {str(e)}", self._format_example_queries(), description
+            return f"Error deleting query: {str(e)}", self._format_example_queries(session, page), description
 
-    def _handle_refresh_example_queries(self):
-        return self._format_example_queries()
+    def _handle_refresh_example_queries(self, page, request: gr.Request):
+        return self._format_example_queries(self._session(request), page)
 
     def _create_functions_tab(self):
         with gr.Row():
@@ -178,17 +453,34 @@ class GradioInterface:
                 delete_function_button = gr.Button("Delete Function")
                 delete_function_status = gr.Textbox(label="Delete Function Status")
 
+                gr.Markdown("## Import / Export Bundle")
+                bundle_file = gr.File(label="Function bundle (.yaml or .sql)", file_types=[".yaml", ".yml", ".sql"])
+                bundle_prune = gr.Checkbox(label="Drop functions missing from the bundle", value=False)
+                import_bundle_button = gr.Button("Import Bundle")
+                export_bundle_button = gr.Button("Export Bundle")
+                bundle_status = gr.Textbox(label="Bundle Status")
+                bundle_download = gr.File(label="Exported bundle")
+
             with gr.Column(scale=2):
                 gr.Markdown("## Available Functions")
                 refresh_button = gr.Button('Refresh')
-                self.functions_list = gr.HTML()
+                with gr.Row():
+                    previous_page_button = gr.Button("Previous Page")
+                    self.functions_page = gr.Number(label="Page", value=1, precision=0, minimum=1)
+                    next_page_button = gr.Button("Next Page")
+                self.functions_info = gr.Markdown()
+                self.functions_list = gr.Dataframe(
+                    headers=ResponseFormatter.FUNCTION_COLUMNS, interactive=False, wrap=True
+                )
+                function_definition = gr.Code(label="Definition (select a function above)", language="sql")
 
         add_function_button.click(
             self._handle_add_function,
-            inputs=[new_function_name, new_function_code, new_function_description],
+            inputs=[new_function_name, new_function_code, new_function_description, self.functions_page],
             outputs=[
                 add_function_status,
                 self.functions_list,
+                self.functions_info,
                 new_function_name,
                 new_function_code,
                 new_function_description,
@@ -196,124 +488,568 @@ class GradioInterface:
         )
         delete_function_button.click(
             self._handle_delete_function,
-            inputs=[delete_function_name],
-            outputs=[delete_function_status, self.functions_list, delete_function_name],
+            inputs=[delete_function_name, self.functions_page],
+            outputs=[delete_function_status, self.functions_list, self.functions_info, delete_function_name],
         )
         
+        import_bundle_button.click(
+            self._handle_import_bundle,
+            inputs=[bundle_file, bundle_prune, self.functions_page],
+            outputs=[bundle_status, self.functions_list, self.functions_info],
+        )
+        export_bundle_button.click(self._handle_export_bundle, outputs=[bundle_download])
+
         refresh_button.click(
             self._handle_refresh_functions,
-            outputs=[self.functions_list],
+            inputs=[self.functions_page],
+            outputs=[self.functions_list, self.functions_info],
+        )
+        previous_page_button.click(lambda page: max(1, int(page or 1) - 1), inputs=[self.functions_page], outputs=[self.functions_page])
+        next_page_button.click(lambda page: int(page or 1) + 1, inputs=[self.functions_page], outputs=[self.functions_page])
+        self.functions_page.change(
+            self._handle_functions_page,
+            inputs=[self.functions_page],
+            outputs=[self.functions_list, self.functions_info],
         )
+        self.functions_list.select(self._handle_function_definition, outputs=[function_definition])
         
 
     def _create_chat_tab(self):
         gr.Markdown("## Chat with AI Agent")
         
-        llm_choices = ["gpt-4o-mini", "llama3.1"]
-        llm_dropdown = gr.Dropdown(choices=llm_choices, label="Select LLM", value="gpt-4o-mini")
+        # "auto" routes every question between the fast and the strong model.
+        llm_choices = list(dict.fromkeys([AUTO, LLM_STRONG_MODEL, LLM_FAST_MODEL, LLM_CHOICE]))
+        llm_dropdown = gr.Dropdown(choices=llm_choices, label="Select LLM", value=LLM_CHOICE)
         
         chatbot = gr.Chatbot(height='60vh')
         msg = gr.Textbox(label="Enter your message")
         clear = gr.Button("Clear")
+        download_button = gr.Button("Download full results of the last answer")
+        download_file = gr.File(label="Full results (CSV)")
+        with gr.Accordion("Results", open=False) as results_accordion:
+            with gr.Row():
+                load_results_button = gr.Button("Load Results")
+                previous_results_button = gr.Button("Previous Page")
+                results_page = gr.Number(label="Page", value=1, precision=0, minimum=1)
+                next_results_button = gr.Button("Next Page")
+            results_info = gr.Markdown()
+            results_table = gr.Dataframe(interactive=False, wrap=True)
+        with gr.Accordion("Request trace", open=False):
+            show_trace = gr.Checkbox(label="Show where the time of the last message went", value=False)
+            trace_view = gr.Markdown()
 
-        def handle_llm_selection(choice):
-            if choice == "gpt-4o-mini":
-                new_llm = ChatOpenAI(model="gpt-4o-mini", temperature=0, api_key=OPENAI_API_KEY)
-            else:
-                new_llm = ChatOllama(model="llama3.1",temperature=0)
-            
-            if self.agent_setup:
-                self.agent_setup.update_llm(new_llm)
+        def handle_llm_selection(choice, request: gr.Request):
+            session = self._session(request)
+            session.llm_choice = choice
+            if session.agent_setup:
+                session.agent_setup.use_model(choice)
             
             return f"Selected {choice}"
 
         llm_dropdown.change(handle_llm_selection, inputs=[llm_dropdown], outputs=[gr.Textbox(label="LLM Status")])
-        msg.submit(self._handle_chat, inputs=[msg, chatbot], outputs=[msg, chatbot])
+        chat_handler = self._handle_chat_async if CHAT_ASYNC else self._handle_chat
+        results_outputs = [results_table, results_info, results_page]
+        # Results are only counted and paged when asked for, not after every
+        # chat turn; a new answer just clears the page that was shown.
+        msg.submit(chat_handler, inputs=[msg, chatbot], outputs=[msg, chatbot]).then(
+            self._handle_trace_view, inputs=[show_trace], outputs=[trace_view]
+        ).then(
+            self._handle_results_reset, outputs=results_outputs
+        )
+        if hasattr(results_accordion, "expand"):
+            # Gradio 5 reports opening the accordion.
+            results_accordion.expand(self._handle_first_results_page, outputs=results_outputs)
+        load_results_button.click(self._handle_first_results_page, outputs=results_outputs)
+        previous_results_button.click(self._handle_previous_results_page, inputs=[results_page], outputs=results_outputs)
+        next_results_button.click(self._handle_next_results_page, inputs=[results_page], outputs=results_outputs)
+        results_page.submit(self._handle_results_page, inputs=[results_page], outputs=results_outputs)
+        show_trace.change(self._handle_trace_view, inputs=[show_trace], outputs=[trace_view])
         clear.click(lambda: None, None, chatbot, queue=False)
+        download_button.click(self._handle_download_results, outputs=[download_file])
+
+    def _handle_refresh_functions(self, page, request: gr.Request):
+        session = self._session(request)
+        if session.db_functions is None:
+            return None, "Please connect to a database first."
+        session.db_functions.get_all_functions(revalidate=True)
+        return self._format_functions_page(session, page)
+
+    def _handle_functions_page(self, page, request: gr.Request):
+        session = self._session(request)
+        if session.db_functions is None:
+            return None, "Please connect to a database first."
+        return self._format_functions_page(session, page)
+
+    @staticmethod
+    def _format_functions_page(session, page):
+        page = max(1, int(page or 1))
+        functions, total = session.db_functions.get_functions_page(page, FUNCTIONS_PAGE_SIZE)
+        return (
+            ResponseFormatter.format_function_rows(functions),
+            ResponseFormatter.format_page_info(page, FUNCTIONS_PAGE_SIZE, len(functions), total, "functions"),
+        )
 
-    def _handle_refresh_functions(self):
-        self.db_functions = DatabaseFunctions(engine)
-        return ResponseFormatter.format_functions(self.db_functions.get_all_functions())
+    def _handle_function_definition(self, event: gr.SelectData, request: gr.Request):
+        session = self._session(request)
+        if session.db_functions is None or not event.row_value:
+            return ""
+        return session.db_functions.get_function_definition(event.row_value[0])
 
-    def _handle_connection(self, username, password, db_name):
-        global engine
+    @staticmethod
+    def _handle_results_reset():
+        return None, "Load the results of the last answer to page through them.", 1
 
+    def _handle_first_results_page(self, request: gr.Request):
+        return self._handle_results_page(1, request)
+
+    def _handle_previous_results_page(self, page, request: gr.Request):
+        return self._handle_results_page(int(page or 1) - 1, request)
+
+    def _handle_next_results_page(self, page, request: gr.Request):
+        return self._handle_results_page(int(page or 1) + 1, request)
+
+    def _handle_results_page(self, page, request: gr.Request):
+        session = self._session(request)
+        if not session.last_query:
+            return None, "No query results yet.", 1
+        try:
+            query = self._check_query(session, session.last_query)
+        except ValueError as e:
+            return None, f"The query of the last answer cannot be run: {str(e)}", 1
+        executor = QueryExecutor(
+            session.db_connection.read_engine, max_rows=RESULTS_PAGE_SIZE, max_bytes=QUERY_MAX_BYTES * 4
+        )
         try:
-            engine = self.db_connection.connect(username, password, db_name)
+            if session.last_query_rows is None or session.last_query_rows[0] != query:
+                session.last_query_rows = (query, executor.count(query))
+            total = session.last_query_rows[1]
+            page = min(max(1, int(page or 1)), max(1, -(-total // RESULTS_PAGE_SIZE)))
+            result = executor.page(query, page, RESULTS_PAGE_SIZE)
+        except Exception as e:
+            return None, f"Could not page through the results: {str(e)}", page
+        info = ResponseFormatter.format_page_info(page, RESULTS_PAGE_SIZE, len(result.rows), total, "rows")
+        if result.marker:
+            info += f" {result.marker}"
+        return ResponseFormatter.format_table_page(result.columns, result.rows), info, page
+
+    def _handle_connection(self, username, password, db_name, request: gr.Request):
+        session = self._session(request)
+        try:
+            session.engine = session.db_connection.connect(username, password, db_name)
+            session.db_functions = DatabaseFunctions(session.engine)
             
-            tools = [get_db_functions_agent_tool]
-            self.agent_setup = AgentSetup(engine, tools=tools)
-            self.agent_setup.setup()
+            session.agent_setup = AgentSetup(
+                session.db_connection.read_engine,
+                models=ModelRouter(choice=session.llm_choice),
+                tools=create_agent_tools(session.db_connection.read_engine),
+            )
+            session.agent_setup.setup()
+            if session.memory:
+                # Earlier turns were about whatever was connected before.
+                session.memory.clear()
+            get_refresh_scheduler().watch(session.engine)
 
             return "Connection successful!", 
 
         except Exception as e:
             return f"Connection failed: {str(e)}", ""
 
-    def _handle_chat(self, message, history):
-        if not self.agent_setup:
-            return "Please connect to the database first.", history
-        
+    def _handle_chat(self, message, history, request: gr.Request):
+        session = self._session(request)
+        if not session.agent_setup:
+            yield "Please connect to the database first.", history
+            return
+
+        turn = _ChatTurn(message, history)
+        session.last_trace = turn.trace
         try:
-            agent = self.agent_setup.get_agent()
-            
-            # Add example queries to the context
-            context = "Example queries:\n"
-            for query in self.example_queries:
-                context += f"Query: {query['query']}\nDescription: {query['description']}\n\n"
-            
-            # Combine the context with the user's message
-            full_message = f"{context}\nUser query: {message}"
-                        
-            events = agent.stream(
-                {"messages": [("user", full_message)]},
-                stream_mode="values",
-            )
-            response = ""
-            for event in events:
-                response = event["messages"][-1].content
-                logger.info(event["messages"][-1].pretty_print())
+            with turn.trace.span("answer_cache") as span:
+                cache_version, cached_response = self._cached_answer(session, message)
+                span["hit"] = cached_response is not None
+            if cached_response is not None:
+                self._remember_query(session, cached_response)
+                self._remember_turn(session, message, cached_response)
+                yield "", turn.finish(cached_response, "cached")
+                return
+
+            response, outcome = "", "answered"
+            events = self._stream_agent(session, message, turn.trace)
+            for kind, content in self._run_in_pool(session, events, turn.trace):
+                if kind in ("final", "routed"):
+                    response, outcome = content, ("routed" if kind == "routed" else outcome)
+                    break
+                yield "", turn.update(kind, content)
 
-            formatted_response = ResponseFormatter.format_agent_response(response)
-            history.append((message, formatted_response))
-            return "", history
+            self._store_answer(session, message, cache_version, response)
+            self._remember_turn(session, message, response)
+            yield "", turn.finish(response, outcome)
         except Exception as e:
-            return f"Error: {str(e)}", history
-    
-    def _handle_add_example_query(self, query, description):
+            yield f"Error: {str(e)}", turn.abort()
+        finally:
+            turn.log()
+
+    async def _handle_chat_async(self, message, history, request: gr.Request):
+        session = self._session(request)
+        if not session.agent_setup:
+            yield "Please connect to the database first.", history
+            return
+
+        turn = _ChatTurn(message, history)
+        session.last_trace = turn.trace
         try:
-            self.example_queries.append({"query": query, "description": description})
-            return (
-                f"Query added successfully!",
-                self._format_example_queries(),
-                "",
-                "",
-            )
+            with turn.trace.activate():
+                with turn.trace.span("answer_cache") as span:
+                    cache_version, cached_response = await asyncio.to_thread(self._cached_answer, session, message)
+                    span["hit"] = cached_response is not None
+                if cached_response is not None:
+                    self._remember_query(session, cached_response)
+                    await asyncio.to_thread(self._remember_turn, session, message, cached_response)
+                    yield "", turn.finish(cached_response, "cached")
+                    return
+
+                response, outcome = "", "answered"
+                async for kind, content in self._astream_agent(session, message, turn.trace):
+                    if kind in ("final", "routed"):
+                        response, outcome = content, ("routed" if kind == "routed" else outcome)
+                        break
+                    yield "", turn.update(kind, content)
+
+                await asyncio.to_thread(self._store_answer, session, message, cache_version, response)
+                await asyncio.to_thread(self._remember_turn, session, message, response)
+                yield "", turn.finish(response, outcome)
         except Exception as e:
-            return f"Error adding query: {str(e)}", "", query, description        
+            yield f"Error: {str(e)}", turn.abort()
+        finally:
+            turn.log()
+
+    def _run_in_pool(self, session, events, trace):
+        """Drives a blocking generator on the agent pool and relays its items.
+
+        The run stops at its next step when the request is cancelled or the
+        session closes, so an abandoned chat does not keep making LLM calls
+        and holding database connections.
+        """
+        items = queue.Queue()
+        done = object()
+        stop = threading.Event()
 
-    def _handle_add_function(self, name, code, description):
+        def drain():
+            try:
+                with trace.activate():
+                    for item in events:
+                        if stop.is_set():
+                            break
+                        items.put(item)
+            except Exception as e:
+                items.put(e)
+            finally:
+                # Closing the generator unwinds the agent run in this thread.
+                events.close()
+                items.put(done)
+
+        future = self.agent_pool.submit(drain)
+        # A run cancelled before it started never reports back on its own.
+        future.add_done_callback(lambda f: f.cancelled() and items.put(done))
+        session.track(future, stop)
         try:
-            self.db_functions.add_function(name, code, description)
-            functions = self.db_functions.get_all_functions()
+            while True:
+                item = items.get()
+                if item is done:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            stop.set()
+            future.cancel()
+            session.untrack(future)
+
+    def _stream_agent(self, session, message, trace):
+        """Yields ("step", markdown), ("token", text) and finally ("final", answer),
+        or only ("routed", answer) when a trusted function answered directly."""
+        with trace.span("route") as span:
+            response = session.agent_setup.route(message)
+            span["matched"] = response is not None
+        if response is not None:
+            yield "routed", response
+            return
+
+        with trace.span("prompt_build"):
+            agent_input = self._agent_input(session, message)
+        with trace.span("prefetch"):
+            agent_input["messages"].extend(session.agent_setup.prefetch(config=trace.config()))
+        models = session.agent_setup.agent_models(message)
+        for position, model in enumerate(models):
+            last = position == len(models) - 1
+            graph = session.agent_setup.get_agent(model)
+            if position:
+                yield "step", ResponseFormatter.format_escalation(model)
+                if session.memory:
+                    # Drop what the failed attempt left in the thread.
+                    session.memory.prepare(graph)
+            response = ""
+            try:
+                with session.agent_setup.models.attempt(model, "agent") as attempt:
+                    events = graph.stream(
+                        agent_input,
+                        config=self._agent_config(session, trace),
+                        stream_mode=["updates", "messages"],
+                    )
+                    for mode, chunk in events:
+                        for kind, content in self._agent_events(mode, chunk):
+                            if kind == "final":
+                                response = content
+                            else:
+                                yield kind, content
+                    if not self._is_json_answer(response):
+                        attempt["outcome"] = "invalid"
+            except Exception as e:
+                if last:
+                    raise
+                logger.warning(f"Agent run with {model} failed, escalating: {e}")
+                continue
+            if attempt["outcome"] == "ok" or last:
+                break
+        yield "final", response
+
+    async def _astream_agent(self, session, message, trace):
+        with trace.span("route") as span:
+            response = await session.agent_setup.aroute(message)
+            span["matched"] = response is not None
+        if response is not None:
+            yield "routed", response
+            return
+
+        with trace.span("prompt_build"):
+            agent_input = self._agent_input(session, message)
+        with trace.span("prefetch"):
+            agent_input["messages"].extend(await session.agent_setup.aprefetch(config=trace.config()))
+        models = session.agent_setup.agent_models(message)
+        for position, model in enumerate(models):
+            last = position == len(models) - 1
+            graph = session.agent_setup.get_agent(model)
+            if position:
+                yield "step", ResponseFormatter.format_escalation(model)
+                if session.memory:
+                    await asyncio.to_thread(session.memory.prepare, graph)
+            response = ""
+            try:
+                with session.agent_setup.models.attempt(model, "agent") as attempt:
+                    events = graph.astream(
+                        agent_input,
+                        config=self._agent_config(session, trace),
+                        stream_mode=["updates", "messages"],
+                    )
+                    async for mode, chunk in events:
+                        for kind, content in self._agent_events(mode, chunk):
+                            if kind == "final":
+                                response = content
+                            else:
+                                yield kind, content
+                    if not self._is_json_answer(response):
+                        attempt["outcome"] = "invalid"
+            except Exception as e:
+                if last:
+                    raise
+                logger.warning(f"Agent run with {model} failed, escalating: {e}")
+                continue
+            if attempt["outcome"] == "ok" or last:
+                break
+        yield "final", response
+
+    @staticmethod
+    def _agent_config(session, trace):
+        config = trace.config()
+        return session.memory.config(config) if session.memory else config
+
+    @staticmethod
+    def _agent_input(session, message):
+        precomputed = get_precomputed_views(session.engine) if session.engine is not None else None
+        # Add the most relevant example queries to the context
+        context = "Example queries:\n"
+        for query in session.example_store.search(message, EXAMPLE_QUERIES_TOP_K):
+            context += f"Query: {query['query']}\nDescription: {query['description']}\n"
+            view = precomputed.for_query(query["query"]) if precomputed else None
+            if view:
+                context += f"Precomputed in: {view['name']}\n"
+            context += "\n"
+        views = precomputed.search(message, PRECOMPUTED_TOP_K) if precomputed else []
+        if views:
+            context += "Precomputed views:\n"
+            for view in views:
+                context += (
+                    f"View: {view['name']}\nDescription: {view['description']}\n"
+                    f"Refreshed: {ResponseFormatter.format_age(view['refreshed_at'])}\n\n"
+                )
+
+        # Combine the context with the user's message
+        full_message = f"{context}\nUser query: {message}"
+        return {"messages": [("user", full_message)]}
+
+    @staticmethod
+    def _agent_events(mode, chunk):
+        if mode == "messages":
+            message_chunk, metadata = chunk
+            # Tools such as the query checker call the LLM too; only the
+            # agent's own tokens belong in the chat.
+            if metadata.get("langgraph_node") == "agent" and isinstance(message_chunk.content, str):
+                if message_chunk.content:
+                    yield "token", message_chunk.content
+            return
+
+        for node, update in chunk.items():
+            for event_message in (update or {}).get("messages", []):
+                for tool_call in getattr(event_message, "tool_calls", None) or []:
+                    yield "step", ResponseFormatter.format_tool_call(tool_call)
+                if node == "agent" and not getattr(event_message, "tool_calls", None):
+                    yield "final", event_message.content
+
+    def _store_answer(self, session, message, cache_version, response):
+        if self._is_json_answer(response):
+            self.answer_cache.put(message, cache_version, response, database=database_key(session.engine))
+            self._remember_query(session, response)
+
+    def _cached_answer(self, session, message):
+        """(cache version, cached answer or None) for a question."""
+        # Follow-up questions depend on the conversation so far, so answers
+        # are only shared between identical histories.
+        history = session.memory.prepare(session.agent_setup.get_agent()) if session.memory else None
+        cache_version = (self._answer_cache_version(session), history)
+        return cache_version, self.answer_cache.get(message, cache_version, database=database_key(session.engine))
+
+    @staticmethod
+    def _remember_turn(session, message, response):
+        if session.memory and response:
+            try:
+                session.memory.remember(session.agent_setup.get_agent(), message, response)
+            except Exception as e:
+                logger.warning(f"Could not update the conversation memory: {e}")
+
+    def _answer_cache_version(self, session):
+        # Answers are only valid for the database, function catalog and schema
+        # they were computed against.
+        session.db_functions.get_all_functions()
+        return (
+            session.engine.url.render_as_string(hide_password=True),
+            session.db_functions.catalog_cache.fingerprint,
+            get_schema_fingerprint(session.engine),
+        )
+
+    @staticmethod
+    def _check_query(session, query):
+        """``query`` checked the way the SQL query tool checks what it runs,
+        against the connected schema; raises ValueError."""
+        toolkit = session.agent_setup.toolkit if session.agent_setup else None
+        if toolkit is None:
+            raise ValueError("Please connect to a database first.")
+        db = toolkit.db
+        return check_read_query(
+            query, dialect=SQLGLOT_DIALECTS.get(db.dialect, db.dialect), columns=db.get_table_columns
+        )
+
+    @staticmethod
+    def _remember_query(session, response):
+        answer = json.loads(response)
+        query = answer.get("query") if isinstance(answer, dict) else None
+        session.last_query = None
+        if not isinstance(query, str) or not query.strip():
+            return
+        # The answer's query is whatever the model reported, not necessarily
+        # what a tool ran, so it is only kept for paging and export once it
+        # passes the same checks.
+        try:
+            session.last_query = GradioInterface._check_query(session, query)
+        except ValueError as e:
+            logger.warning(f"Not keeping the answer's query for the results pager: {e}")
+
+    def _handle_trace_view(self, show_trace, request: gr.Request):
+        session = self._session(request)
+        if not show_trace or session.last_trace is None:
+            return ""
+        return session.last_trace.as_markdown()
+
+    def _handle_download_results(self, request: gr.Request):
+        session = self._session(request)
+        if not session.last_query:
+            raise gr.Error("There is no query result to download yet.")
+        try:
+            query = self._check_query(session, session.last_query)
+        except ValueError as e:
+            raise gr.Error(f"The query of the last answer cannot be run: {str(e)}")
+        executor = QueryExecutor(session.db_connection.read_engine)
+        path = os.path.join(tempfile.mkdtemp(prefix="results-"), "results.csv")
+        executor.export_csv(query, path)
+        return path
+
+    @staticmethod
+    def _is_json_answer(response):
+        try:
+            json.loads(response)
+            return True
+        except (TypeError, ValueError):
+            return False
+
+    @staticmethod
+    def _refresh_agent_tools(session):
+        if session.agent_setup:
+            # The tools run on the read engine, like the agent; its catalog
+            # has not seen the change yet when it is a replica.
+            read_engine = session.db_connection.read_engine
+            DatabaseFunctions(read_engine).get_all_functions(revalidate=True)
+            session.agent_setup.tools = create_agent_tools(read_engine)
+            session.agent_setup.setup()
+
+    def _handle_add_function(self, name, code, description, page, request: gr.Request):
+        session = self._session(request)
+        try:
+            session.db_functions.add_function(name, code, description)
+            self._refresh_agent_tools(session)
             return (
                 f"Function '{name}' added successfully!",
-                ResponseFormatter.format_functions(functions),
+                *self._format_functions_page(session, page),
                 "",
                 "",
                 "",
             )
         except Exception as e:
-            return f"Error adding function: {str(e)}", "", name, code, description
+            return f"Error adding function: {str(e)}", None, "", name, code, description
 
-    def _handle_delete_function(self, name):
+    def _handle_delete_function(self, name, page, request: gr.Request):
+        session = self._session(request)
         try:
-            self.db_functions.delete_function(name)
-            functions = self.db_functions.get_all_functions()
+            session.db_functions.delete_function(name)
+            self._refresh_agent_tools(session)
             return (
                 f"Function '{name}' deleted successfully!",
-                ResponseFormatter.format_functions(functions),
+                *self._format_functions_page(session, page),
                 "",
             )
         except Exception as e:
-            return f"Error deleting function: {str(e)}", "", name
\ No newline at end of file
+            return f"Error deleting function: {str(e)}", None, "", name
+
+    def _handle_import_bundle(self, bundle_file, prune, page, request: gr.Request):
+        session = self._session(request)
+        if session.engine is None:
+            return "Please connect to a database first.", None, ""
+        if bundle_file is None:
+            return "Please choose a bundle file.", None, ""
+        path = bundle_file if isinstance(bundle_file, str) else bundle_file.name
+        try:
+            library = FunctionLibrary(session.engine)
+            plan = library.apply(library.plan(load_bundle(path), prune=prune))
+            if plan.changes:
+                self._refresh_agent_tools(session)
+            return (
+                f"Created {len(plan.create)}, updated {len(plan.update)}, dropped {len(plan.drop)}, "
+                f"{len(plan.unchanged)} unchanged.",
+                *self._format_functions_page(session, page),
+            )
+        except Exception as e:
+            return f"Error importing bundle: {str(e)}", None, ""
+
+    def _handle_export_bundle(self, request: gr.Request):
+        session = self._session(request)
+        if session.engine is None:
+            raise gr.Error("Please connect to a database first.")
+        path = os.path.join(tempfile.mkdtemp(prefix="functions-"), "functions.yaml")
+        return dump_bundle(FunctionLibrary(session.engine).export(), path)
\ No newline at end of file
@@ -0,0 +1,102 @@
+import threading
+import time
+
+from app.agent.example_store import get_example_store
+from app.agent.memory import ConversationMemory, get_checkpointer
+from app.config import LLM_CHOICE, SESSION_IDLE_TIMEOUT
+from app.database.connections import DatabaseConnection
+
+
+class ChatSession:
+    """Connection and agent state owned by one browser session.
+
+    Example queries are not per session: ``example_store`` is the library
+    shared by every session. ``memory`` holds the compacted conversation, or
+    is None when conversation memory is turned off. Agent runs handed to the
+    shared pool are tracked, and closing the session cancels them.
+    """
+
+    def __init__(self, session_id, llm_choice=LLM_CHOICE):
+        self.session_id = session_id
+        self.db_connection = DatabaseConnection()
+        self.engine = None
+        self.db_functions = None
+        self.agent_setup = None
+        self.llm_choice = llm_choice
+        self.last_query = None
+        # (query, row count) of the last answer, for the Results pager.
+        self.last_query_rows = None
+        self.last_trace = None
+        self.example_store = get_example_store()
+        checkpointer = get_checkpointer()
+        self.memory = ConversationMemory(session_id, checkpointer) if checkpointer else None
+        self.last_used = time.monotonic()
+        # Agent pool futures still running, with the event that stops each.
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+
+    def track(self, future, stop):
+        with self._pending_lock:
+            self._pending[future] = stop
+
+    def untrack(self, future):
+        with self._pending_lock:
+            self._pending.pop(future, None)
+
+    def cancel_pending(self):
+        with self._pending_lock:
+            pending, self._pending = self._pending, {}
+        for future, stop in pending.items():
+            stop.set()
+            future.cancel()
+
+    def close(self):
+        self.cancel_pending()
+        if self.memory:
+            self.memory.clear()
+        self.db_connection.close()
+        self.engine = None
+        self.db_functions = None
+        self.agent_setup = None
+
+
+class SessionRegistry:
+    """Maps Gradio session hashes to their ChatSession.
+
+    Sessions are closed when the browser tab unloads; sessions that never
+    unload cleanly are evicted after ``idle_timeout`` seconds without use.
+    """
+
+    def __init__(self, idle_timeout=SESSION_IDLE_TIMEOUT):
+        self.idle_timeout = idle_timeout
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def get(self, session_id):
+        self.evict_idle()
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = ChatSession(session_id)
+                self._sessions[session_id] = session
+            session.last_used = time.monotonic()
+            return session
+
+    def close(self, session_id):
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+        if session is not None:
+            session.close()
+
+    def evict_idle(self):
+        cutoff = time.monotonic() - self.idle_timeout
+        with self._lock:
+            idle = [
+                session_id for session_id, session in self._sessions.items()
+                if session.last_used < cutoff
+            ]
+        for session_id in idle:
+            self.close(session_id)
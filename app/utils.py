@@ -1,22 +1,99 @@
 import json
 import html
+import time
+from functools import lru_cache
 
 
 class ResponseFormatter:
+    # Rows of a result shown inline in the chat; the Results table below the
+    # chat pages through the rest on the server.
+    MAX_TABLE_ROWS = 20
+    FUNCTION_COLUMNS = ["Function", "Arguments", "Description"]
+    PRECOMPUTED_COLUMNS = ["View", "Description", "Refreshed", "Refresh every"]
+
     @staticmethod
-    def format_functions(functions):
-        formatted = ""
-        for func in functions:
-            formatted += f"""
-            <div style='margin-bottom: 10px; padding: 10px; border: 1px solid #ddd; border-radius: 5px;'>
-                <h3 style='margin: 0; color: #333;'>{func['function_name']}</h3>
-                <p style='margin: 5px 0; color: #666;'>{func['description'] or 'No description available.'}</p>
-                <details>
-                    <summary>View Function Code</summary>
-                    <pre style='background-color: #f5f5f5; padding: 5px; border-radius: 3px; white-space: pre-wrap; word-wrap: break-word;'>{func['function_code']}</pre>
-                </details>
-            </div>
-            """
+    def format_page_info(page, page_size, shown, total, noun):
+        first = (page - 1) * page_size + 1 if shown else 0
+        last = first + shown - 1 if shown else 0
+        if total is None:
+            return f"Showing {noun} {first}-{last} (page {page})"
+        return f"Showing {first}-{last} of {total} {noun} (page {page} of {max(1, -(-total // page_size))})"
+
+    @staticmethod
+    def format_age(timestamp):
+        seconds = max(0, time.time() - timestamp)
+        for unit, size in (("day", 86400), ("hour", 3600), ("minute", 60)):
+            if seconds >= size:
+                count = int(seconds // size)
+                return f"{count} {unit}{'s' if count != 1 else ''} ago"
+        return "just now"
+
+    @staticmethod
+    def format_precomputed_rows(views):
+        return {
+            "headers": ResponseFormatter.PRECOMPUTED_COLUMNS,
+            "data": [
+                [
+                    view["name"],
+                    view["description"],
+                    ResponseFormatter.format_age(view["refreshed_at"]),
+                    f"{view['refresh_seconds'] / 60:g} min" if view["refresh_seconds"] else "manual",
+                ]
+                for view in views
+            ],
+        }
+
+    @staticmethod
+    def format_function_rows(functions):
+        """One page of the catalog for a Dataframe; definitions are shown on select."""
+        return {
+            "headers": ResponseFormatter.FUNCTION_COLUMNS,
+            "data": [
+                [
+                    func["function_name"],
+                    func["function_arguments"] or "",
+                    func["description"] or "No description available.",
+                ]
+                for func in functions
+            ],
+        }
+
+    @staticmethod
+    def format_table_page(columns, rows):
+        return {"headers": list(columns), "data": [[_cell(value) for value in row] for row in rows]}
+
+    @staticmethod
+    def format_example_queries(examples, total=None, page=1, page_size=None):
+        parts = []
+        if total is not None and page_size:
+            info = ResponseFormatter.format_page_info(page, page_size, len(examples), total, "example queries")
+            parts.append(f"<p style='color: #666;'>{info}</p>")
+        # Each example's HTML is rendered once and reused across pages and
+        # refreshes.
+        parts.extend(_format_example_query(example["description"], example["query"]) for example in examples)
+        return "".join(parts)
+
+    @staticmethod
+    def format_tool_call(tool_call):
+        name = tool_call.get("name", "tool")
+        args = tool_call.get("args") or {}
+        if "query" in args:
+            return f"🔧 Running `{name}`\n```sql\n{args['query']}\n```"
+        if args:
+            return f"🔧 Running `{name}` with `{json.dumps(args, default=str)}`"
+        return f"🔧 Running `{name}`"
+
+    @staticmethod
+    def format_escalation(model):
+        return f"↪️ The answer could not be used, asking `{model}`"
+
+    @staticmethod
+    def format_agent_progress(steps, partial_text):
+        formatted = "*Working on it...*\n\n"
+        if steps:
+            formatted += "\n\n".join(steps) + "\n\n"
+        if partial_text:
+            formatted += f"```\n{partial_text}\n```"
         return formatted
 
     @staticmethod
@@ -41,17 +118,22 @@ class ResponseFormatter:
             else:
                 formatted_response = "**Query Response**\n\n"
 
+            parts = [formatted_response]
             if results:
                 columns = list(results[0].keys())
-                table = "| " + " | ".join(columns) + " |\n"
-                table += "| " + " | ".join(["---" for _ in columns]) + " |\n"
-                for row in results:
-                    table += (
-                        "| "
-                        + " | ".join(str(row.get(col, "")) for col in columns)
-                        + " |\n"
+                parts.append("**Results Table:**\n\n")
+                parts.append(_markdown_row(columns))
+                parts.append(_markdown_row(["---"] * len(columns)))
+                parts.extend(
+                    _markdown_row(row.get(col, "") for col in columns)
+                    for row in results[:ResponseFormatter.MAX_TABLE_ROWS]
+                )
+                parts.append("\n")
+                if len(results) > ResponseFormatter.MAX_TABLE_ROWS:
+                    parts.append(
+                        f"*Showing the first {ResponseFormatter.MAX_TABLE_ROWS} of {len(results)} rows. "
+                        "Page through all of them under \"Results\", or use \"Download full results\".*\n\n"
                     )
-                formatted_response += "**Results Table:**\n\n" + table + "\n"
 
             footer_note = (
                 "*This response was generated using an optimized database function.*"
@@ -59,7 +141,7 @@ class ResponseFormatter:
                 else "*This response was generated using a custom SQL query.*"
             )
 
-            formatted_response += f"""
+            parts.append(f"""
                 
             
 {footer_note}
@@ -68,7 +150,31 @@ class ResponseFormatter:
 <summary>Click to view the SQL query used</summary>
 <pre><code class="language-sql">{html.escape(query_used)}</code></pre>
 </details>
-"""
-            return formatted_response
+""")
+            return "".join(parts)
         except json.JSONDecodeError:
             return response
+
+
+def _markdown_row(values):
+    return "| " + " | ".join(str(value).replace("|", "\\|") for value in values) + " |\n"
+
+
+def _cell(value):
+    # Dataframe values go to the browser as JSON.
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return str(value)
+
+
+@lru_cache(maxsize=4096)
+def _format_example_query(description, query):
+    return f"""
+            <div style='margin-bottom: 10px; padding: 10px; border: 1px solid #ddd; border-radius: 5px;'>
+                <h3 style='margin: 0; color: #333;'>{html.escape(description)}</h3>
+                <details>
+                    <summary>View Query</summary>
+                    <pre style='background-color: #f5f5f5; padding: 5px; border-radius: 3px; white-space: pre-wrap; word-wrap: break-word;'>{html.escape(query)}</pre>
+                </details>
+            </div>
+            """
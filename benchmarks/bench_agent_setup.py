@@ -0,0 +1,54 @@
+"""Cold vs warm AgentSetup.setup() time on a schema with many tables.
+
+    python -m benchmarks.bench_agent_setup
+"""
+import os
+import tempfile
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+os.environ.setdefault("FUNCTION_ROUTER_ENABLED", "false")
+
+from sqlalchemy import create_engine, text  # noqa: E402
+
+from app.agent.agent import AgentSetup  # noqa: E402
+from benchmarks.fake_llm import ScriptedChatModel  # noqa: E402
+
+TABLES = 300
+
+
+def create_database():
+    path = os.path.join(tempfile.mkdtemp(), "wide.db")
+    engine = create_engine(f"sqlite:///{path}")
+    with engine.begin() as connection:
+        for index in range(TABLES):
+            connection.execute(text(
+                f"CREATE TABLE table_{index} (id INTEGER PRIMARY KEY, name TEXT, amount NUMERIC, created DATE)"
+            ))
+    return engine
+
+
+def timed(label, fn):
+    start = time.perf_counter()
+    fn()
+    print(f"{label:<32} {(time.perf_counter() - start) * 1000:>9.1f} ms")
+
+
+def main():
+    engine = create_database()
+    small = ScriptedChatModel(script=["{}"], model_name="scripted-small")
+    large = ScriptedChatModel(script=["{}"], model_name="scripted-large")
+    print(f"{TABLES} tables")
+
+    timed("cold connect", lambda: AgentSetup(engine, llm=small).setup())
+    timed("warm connect (same model)", lambda: AgentSetup(engine, llm=small).setup())
+
+    agent_setup = AgentSetup(engine, llm=small)
+    agent_setup.setup()
+    timed("first switch to new model", lambda: agent_setup.update_llm(large))
+    timed("switch back", lambda: agent_setup.update_llm(small))
+    timed("switch again", lambda: agent_setup.update_llm(large))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Throughput and accuracy of the headless batch runner.
+
+Answers every example question that runs on the fixture through
+``app.batch.BatchRunner`` with a scripted model standing in for the LLM.
+Every FAIL_EVERY-th model call fails with HTTP 429, as a provider under rate
+limits would, so the numbers include the shared backoff and retries. Each
+row is one pass:
+
+- "exact": the model answers with each example's reference query, at
+  concurrency 1, 4 and 8, bypassing the answer cache,
+- "warm": another pass that reads the answers the exact passes stored, as
+  a deploy warm-up leaves them for the first users,
+- "sloppy": the model drops the LIMIT of every query that has one, which
+  the result comparison should mark as wrong.
+
+    python -m benchmarks.bench_batch
+"""
+import itertools
+import json
+import os
+import re
+import tempfile
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+os.environ.setdefault("FUNCTION_ROUTER_ENABLED", "false")
+os.environ.setdefault("EXAMPLE_STORE_URL", f"sqlite:///{os.path.join(tempfile.gettempdir(), 'bench-example-queries.db')}")
+
+from app.agent.models import ModelRouter  # noqa: E402
+from app.batch import BatchRunner, summarize  # noqa: E402
+from app.config import EXAMPLE_QUERIES  # noqa: E402
+from benchmarks.bookstore import create_bookstore  # noqa: E402
+from benchmarks.fake_llm import ScenarioChatModel  # noqa: E402
+from benchmarks.run_suite import bench_queries, create_interface  # noqa: E402
+
+ROWS = 2_000
+LATENCY = 0.05
+FAIL_EVERY = 10
+RETRY_BASE = 0.05
+_calls = itertools.count(1)
+
+
+class RateLimitError(Exception):
+    status_code = 429
+
+
+class RateLimitedChatModel(ScenarioChatModel):
+    """Scenario model whose every FAIL_EVERY-th call is rate limited."""
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        if next(_calls) % FAIL_EVERY == 0:
+            time.sleep(LATENCY / 5)
+            raise RateLimitError("429 Too Many Requests")
+        return super()._generate(messages, stop, run_manager, **kwargs)
+
+
+def sloppy(scenarios):
+    changed = {}
+    for question, script in scenarios.items():
+        answer = json.loads(script[-1])
+        answer["query"] = re.sub(r"\s+LIMIT\s+\d+", "", answer["query"], flags=re.IGNORECASE)
+        changed[question] = script[:-1] + [json.dumps(answer)]
+    return changed
+
+
+def run(engine, interface, scenarios, questions, concurrency, use_cache, name):
+    # Agent graphs are cached per model name; each script needs its own.
+    llm = RateLimitedChatModel(scenarios=scenarios, latency=LATENCY, model_name=name)
+    runner = BatchRunner(
+        engine,
+        models=ModelRouter.single(llm),
+        tools=[],
+        interface=interface,
+        concurrency=concurrency,
+        retry_base=RETRY_BASE,
+        use_cache=use_cache,
+    )
+    started = time.perf_counter()
+    records = list(runner.run(questions))
+    return summarize(records, time.perf_counter() - started)
+
+
+def main():
+    engine = create_bookstore(rows=ROWS)
+    scenarios = bench_queries(engine, {})
+    references = {example["description"]: example["query"] for example in EXAMPLE_QUERIES}
+    questions = [{"question": question, "query": references[question]} for question in scenarios]
+    interface = create_interface(engine)
+
+    print(f"{len(questions)} questions, model latency {LATENCY * 1000:.0f} ms, every {FAIL_EVERY}th call rate limited")
+    print(f"{'pass':<8}{'workers':>8}{'q/s':>8}{'p50 s':>8}{'p95 s':>8}{'accuracy':>10}{'retries':>9}{'errors':>8}")
+    passes = [("exact", scenarios, level, False) for level in (1, 4, 8)]
+    passes += [("warm", scenarios, 4, True), ("sloppy", sloppy(scenarios), 4, False)]
+    for label, script, concurrency, use_cache in passes:
+        if label != "warm":
+            interface.answer_cache.clear()
+        name = "sloppy" if label == "sloppy" else "exact"
+        summary = run(engine, interface, script, questions, concurrency, use_cache, name)
+        print(
+            f"{label:<8}{concurrency:>8}{summary['questions_per_second']:>8.1f}{summary['p50_seconds']:>8.3f}"
+            f"{summary['p95_seconds']:>8.3f}{summary['accuracy']:>10.0%}{summary['retries']:>9}"
+            f"{summary['outcomes'].get('error', 0):>8}"
+        )
+    interface.agent_pool.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Prompt size and context-build latency: all example queries vs top-k retrieval.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_example_retrieval
+"""
+import os
+import random
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+from app.agent.retrieval import ExampleQueryIndex  # noqa: E402
+from app.config import EXAMPLE_QUERIES, EXAMPLE_QUERIES_TOP_K  # noqa: E402
+
+SIZES = [15, 100, 1000, 10000]
+QUESTIONS = [
+    "Who are the top 5 customers by total spend?",
+    "Which books were published in 1997?",
+    "What is the average rating of each book?",
+    "How much did we sell each month this year?",
+]
+FILLER = ["inventory", "region", "quarter", "warehouse", "genre", "discount", "supplier", "refund"]
+
+_encoding = None
+
+
+def count_tokens(text):
+    # tiktoken needs to download its vocabulary once; fall back to the usual
+    # four-characters-per-token estimate when it is unavailable.
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            _encoding = False
+    if _encoding:
+        return len(_encoding.encode(text))
+    return len(text) // 4
+
+
+def build_library(size, seed=0):
+    rng = random.Random(seed)
+    library = list(EXAMPLE_QUERIES[:size])
+    while len(library) < size:
+        base = rng.choice(EXAMPLE_QUERIES)
+        extra = " ".join(rng.sample(FILLER, 2))
+        library.append({
+            "description": f"{base['description']} ({extra} #{len(library)})",
+            "query": base["query"],
+        })
+    return library
+
+
+def build_context(examples):
+    context = "Example queries:\n"
+    for query in examples:
+        context += f"Query: {query['query']}\nDescription: {query['description']}\n\n"
+    return context
+
+
+def measure(fn, repeat=20):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - start) / repeat * 1000, result
+
+
+def main():
+    print(f"{'examples':>9} {'mode':>6} {'tokens':>9} {'build ms':>10} {'index ms':>9}")
+    for size in SIZES:
+        library = build_library(size)
+        question = QUESTIONS[size % len(QUESTIONS)]
+
+        elapsed, context = measure(lambda: build_context(library))
+        print(f"{size:>9} {'all':>6} {count_tokens(context):>9} {elapsed:>10.3f} {'-':>9}")
+
+        start = time.perf_counter()
+        index = ExampleQueryIndex(library)
+        index_ms = (time.perf_counter() - start) * 1000
+        elapsed, context = measure(
+            lambda: build_context(index.search(question, EXAMPLE_QUERIES_TOP_K))
+        )
+        print(f"{size:>9} {'top-k':>6} {count_tokens(context):>9} {elapsed:>10.3f} {index_ms:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
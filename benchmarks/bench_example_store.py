@@ -0,0 +1,106 @@
+"""Example-query library at scale: in-memory list vs the persistent store.
+
+For each library size, times what the Example Queries tab does: render the
+list after a change, add an example and delete one by description. The list
+path rebuilds the Python list and renders every example as HTML, as the app
+did before the store; the store path touches one row and renders one page.
+Startup (opening the store and building the retrieval index) is timed too.
+
+    python -m benchmarks.bench_example_store
+"""
+import os
+import tempfile
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+from app.agent.example_store import ExampleStore  # noqa: E402
+from app.config import EXAMPLE_PAGE_SIZE  # noqa: E402
+from app.utils import ResponseFormatter  # noqa: E402
+from benchmarks.bench_example_retrieval import build_library  # noqa: E402
+
+SIZES = [1000, 10000, 50000]
+
+
+def timed(fn):
+    started = time.perf_counter()
+    result = fn()
+    return (time.perf_counter() - started) * 1000, result
+
+
+def distinct_library(size):
+    # The store keys examples by their SQL, so every copy gets its own.
+    return [
+        {"description": example["description"], "query": f"{example['query'].rstrip(';')} /* {index} */"}
+        for index, example in enumerate(build_library(size))
+    ]
+
+
+def render_all(examples):
+    return "".join(
+        f"<div><h3>{example['description']}</h3><pre>{example['query']}</pre></div>" for example in examples
+    )
+
+
+def bench_list(library):
+    examples = list(library)
+    example = {"description": "Benchmark example", "query": "SELECT 1"}
+
+    def add():
+        examples.append(example)
+        return render_all(examples)
+
+    def delete():
+        examples[:] = [e for e in examples if e["description"] != example["description"]]
+        return render_all(examples)
+
+    return timed(add)[0], timed(delete)[0]
+
+
+def bench_store(library, path):
+    if os.path.exists(path):
+        os.remove(path)
+    startup, store = timed(lambda: ExampleStore(f"sqlite:///{path}", seed=library))
+    reopen, store = timed(lambda: ExampleStore(f"sqlite:///{path}", seed=library))
+
+    def page(number):
+        return ResponseFormatter.format_example_queries(
+            store.page(number, EXAMPLE_PAGE_SIZE), store.count(), number, EXAMPLE_PAGE_SIZE
+        )
+
+    last_page = -(-len(library) // EXAMPLE_PAGE_SIZE)
+
+    def add():
+        store.add("SELECT 1 AS benchmark", "Benchmark example")
+        return page(last_page)
+
+    def delete():
+        store.delete_by_description("Benchmark example")
+        return page(last_page)
+
+    page(1)
+    return {
+        "create": startup,
+        "reopen": reopen,
+        "first_page": timed(lambda: page(1))[0],
+        "last_page": timed(lambda: page(last_page))[0],
+        "add": timed(add)[0],
+        "delete": timed(delete)[0],
+    }
+
+
+def main():
+    path = os.path.join(tempfile.gettempdir(), "bench-example-store.db")
+    print(f"{'examples':>8} {'list add':>9} {'list del':>9} {'create':>8} {'reopen':>8} "
+          f"{'page 1':>7} {'last pg':>8} {'add':>7} {'delete':>7}   (ms)")
+    for size in SIZES:
+        library = distinct_library(size)
+        list_add, list_delete = bench_list(library)
+        store = bench_store(library, path)
+        print(f"{size:>8} {list_add:>9.1f} {list_delete:>9.1f} {store['create']:>8.0f} {store['reopen']:>8.0f} "
+              f"{store['first_page']:>7.2f} {store['last_page']:>8.2f} {store['add']:>7.2f} {store['delete']:>7.2f}")
+    os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
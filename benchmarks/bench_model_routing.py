@@ -0,0 +1,98 @@
+"""Latency and accuracy of routing questions between a fast and a strong model.
+
+Both models are scripted stand-ins that replay the bookstore's example
+queries. The fast one answers quickly but, like a small local model, returns
+prose instead of the JSON answer for every question whose query joins
+tables; the strong one always answers correctly but takes longer. Each
+configuration answers every example question REPEATS times:
+
+- pinned to the strong model (today's default),
+- pinned to the fast model,
+- "auto" routing, where simple questions go to the fast model and a reply
+  that cannot be parsed escalates to the strong one.
+
+A chat is accurate when its final query is the example's query. Calls to
+the strong model stand in for cost. Most example questions join tables, so
+the mix is harder than typical traffic of simple lookups.
+
+    python -m benchmarks.bench_model_routing
+"""
+import os
+import tempfile
+from types import SimpleNamespace
+
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+os.environ.setdefault("FUNCTION_ROUTER_ENABLED", "false")
+os.environ.setdefault("EXAMPLE_STORE_URL", f"sqlite:///{os.path.join(tempfile.gettempdir(), 'bench-example-queries.db')}")
+
+from app.agent.agent import AgentSetup  # noqa: E402
+from app.agent.models import AUTO, ModelRouter  # noqa: E402
+from app.config import EXAMPLE_QUERIES  # noqa: E402
+from app.metrics import quantile  # noqa: E402
+from benchmarks.bookstore import create_bookstore  # noqa: E402
+from benchmarks.fake_llm import ScenarioChatModel  # noqa: E402
+from benchmarks.run_suite import bench_queries, create_interface  # noqa: E402
+
+ROWS = 2_000
+REPEATS = 3
+FAST_LATENCY = 0.03
+STRONG_LATENCY = 0.15
+CONFIGURATIONS = [("strong", "strong only"), ("fast", "fast only"), (AUTO, "auto")]
+
+
+def create_models(scenarios):
+    joins = {example["description"] for example in EXAMPLE_QUERIES if " JOIN " in example["query"].upper()}
+    fast_scenarios = {
+        question: script[:-1] + ["The results are shown in the table above."] if question in joins else script
+        for question, script in scenarios.items()
+    }
+    return {
+        "fast": ScenarioChatModel(scenarios=fast_scenarios, latency=FAST_LATENCY, model_name="fast"),
+        "strong": ScenarioChatModel(scenarios=scenarios, latency=STRONG_LATENCY, model_name="strong"),
+    }
+
+
+def run(engine, scenarios, choice):
+    expected = {example["description"]: example["query"] for example in EXAMPLE_QUERIES}
+    router = ModelRouter(choice=choice, fast="fast", strong="strong", steps={}, models=create_models(scenarios))
+    interface = create_interface(engine)
+    session = interface.sessions.get(f"routing-{choice}")
+    session.engine = engine
+    session.agent_setup = AgentSetup(engine, models=router)
+    session.agent_setup.setup()
+    request = SimpleNamespace(session_hash=session.session_id)
+
+    durations, accurate = [], 0
+    for repeat in range(REPEATS):
+        for question in scenarios:
+            session.last_query = None
+            # A unique suffix keeps the answer cache from short-circuiting.
+            for _ in interface._handle_chat(f"{question} (run {repeat})", [], request):
+                pass
+            durations.append(session.last_trace.total)
+            accurate += session.last_query == expected[question]
+    interface.agent_pool.shutdown()
+    session.close()
+    return sorted(durations), accurate / len(durations), router.stats()
+
+
+def main():
+    engine = create_bookstore(rows=ROWS)
+    scenarios = bench_queries(engine, {})
+    print(f"{len(scenarios)} questions x {REPEATS}, fast model {FAST_LATENCY * 1000:.0f} ms, "
+          f"strong model {STRONG_LATENCY * 1000:.0f} ms per call")
+    print(f"{'configuration':<14}{'mean ms':>9}{'p50 ms':>9}{'p95 ms':>9}{'accurate':>10}"
+          "   agent runs per model (ok / invalid)")
+    for choice, label in CONFIGURATIONS:
+        durations, accuracy, stats = run(engine, scenarios, choice)
+        attempts = ", ".join(
+            f"{name} {steps['agent']['ok']}/{steps['agent']['invalid']}" for name, steps in sorted(stats.items())
+        )
+        print(
+            f"{label:<14}{sum(durations) / len(durations) * 1000:>9.1f}{quantile(durations, 0.5) * 1000:>9.1f}{quantile(durations, 0.95) * 1000:>9.1f}"
+            f"{accuracy:>10.0%}   {attempts}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""Functions tab and result tables: render everything vs one page.
+
+Times the work behind a refresh of the functions tab with 10k functions and
+behind showing a 100k-row result, next to the size of what goes to the
+browser. The "all" columns use the rendering the app had before paging
+(every function definition as HTML, every row as a Markdown table built with
+``+=``); the "page" columns use the paged views. Result pages are fetched
+from a seeded SQLite bookstore with LIMIT/OFFSET.
+
+    python -m benchmarks.bench_rendering
+"""
+import json
+import os
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+from app.config import FUNCTIONS_PAGE_SIZE, RESULTS_PAGE_SIZE  # noqa: E402
+from app.database.query import QueryExecutor  # noqa: E402
+from app.utils import ResponseFormatter  # noqa: E402
+from benchmarks.bookstore import create_bookstore, table_sizes  # noqa: E402
+
+FUNCTIONS = 10_000
+ROWS = 100_000
+# Fixture size whose order_items table holds at least ROWS rows.
+FIXTURE_ROWS = int(ROWS / 0.45) + 1
+RESULT_QUERY = "SELECT order_item_id, order_id, book_id, quantity, price FROM order_items ORDER BY order_item_id"
+
+
+def timed(fn, repeats=5):
+    best, result = None, None
+    for _ in range(repeats):
+        started = time.perf_counter()
+        result = fn()
+        elapsed = (time.perf_counter() - started) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def legacy_format_functions(functions):
+    formatted = ""
+    for func in functions:
+        formatted += f"""
+            <div style='margin-bottom: 10px; padding: 10px; border: 1px solid #ddd; border-radius: 5px;'>
+                <h3 style='margin: 0; color: #333;'>{func['function_name']}</h3>
+                <p style='margin: 5px 0; color: #666;'>{func['description'] or 'No description available.'}</p>
+                <details>
+                    <summary>View Function Code</summary>
+                    <pre style='background-color: #f5f5f5; padding: 5px; border-radius: 3px; white-space: pre-wrap; word-wrap: break-word;'>{func['function_code']}</pre>
+                </details>
+            </div>
+            """
+    return formatted
+
+
+def legacy_markdown_table(results):
+    columns = list(results[0].keys())
+    table = "| " + " | ".join(columns) + " |\n"
+    table += "| " + " | ".join(["---" for _ in columns]) + " |\n"
+    for row in results:
+        table += "| " + " | ".join(str(row.get(col, "")) for col in columns) + " |\n"
+    return table
+
+
+def synthetic_functions(count):
+    return [
+        {
+            "function_name": f"report_{index}",
+            "function_code": (
+                f"CREATE OR REPLACE FUNCTION public.report_{index}(since date, limit_count integer DEFAULT 10)\n"
+                f" RETURNS TABLE(title character varying, total numeric)\n LANGUAGE sql\n STABLE\n"
+                f"AS $function$ SELECT b.title, SUM(oi.quantity * oi.price) FROM books b "
+                f"JOIN order_items oi ON oi.book_id = b.book_id GROUP BY b.title LIMIT limit_count $function$"
+            ),
+            "description": f"Revenue report number {index} since a date",
+            "function_arguments": "since date, limit_count integer DEFAULT 10",
+        }
+        for index in range(count)
+    ]
+
+
+def bench_functions():
+    functions = synthetic_functions(FUNCTIONS)
+    all_ms, html = timed(lambda: legacy_format_functions(functions), repeats=3)
+
+    def page():
+        rows = ResponseFormatter.format_function_rows(functions[:FUNCTIONS_PAGE_SIZE])
+        info = ResponseFormatter.format_page_info(1, FUNCTIONS_PAGE_SIZE, FUNCTIONS_PAGE_SIZE, len(functions), "functions")
+        return json.dumps(rows) + info
+
+    page_ms, payload = timed(page)
+    return all_ms, len(html), page_ms, len(payload)
+
+
+def bench_results():
+    engine = create_bookstore(rows=FIXTURE_ROWS)
+    available = table_sizes(FIXTURE_ROWS)["order_items"]
+    executor = QueryExecutor(engine, max_rows=ROWS, max_bytes=10**9)
+    results = executor.execute(f"{RESULT_QUERY} LIMIT {ROWS}").as_dicts()
+    results = [{key: str(value) for key, value in row.items()} for row in results]
+    all_ms, table = timed(lambda: legacy_markdown_table(results), repeats=3)
+    answer = json.dumps({"results": results, "approach": "QUERY", "function_used": None, "query": RESULT_QUERY})
+    answer_ms, message = timed(lambda: ResponseFormatter.format_agent_response(answer), repeats=3)
+
+    pager = QueryExecutor(engine, max_rows=RESULTS_PAGE_SIZE)
+    count_ms, total = timed(lambda: pager.count(RESULT_QUERY))
+    last_page = -(-total // RESULTS_PAGE_SIZE)
+
+    def page(number):
+        result = pager.page(RESULT_QUERY, number, RESULTS_PAGE_SIZE)
+        return json.dumps(ResponseFormatter.format_table_page(result.columns, result.rows))
+
+    first_ms, payload = timed(lambda: page(1))
+    last_ms, _ = timed(lambda: page(last_page))
+    return {
+        "rows": min(ROWS, available),
+        "all_ms": all_ms,
+        "all_bytes": len(table),
+        "answer_ms": answer_ms,
+        "answer_bytes": len(message),
+        "count_ms": count_ms,
+        "first_ms": first_ms,
+        "last_ms": last_ms,
+        "page_bytes": len(payload),
+    }
+
+
+def main():
+    all_ms, all_bytes, page_ms, page_bytes = bench_functions()
+    print(f"functions tab, {FUNCTIONS} functions")
+    print(f"  render all    {all_ms:>9.1f} ms {all_bytes / 1024:>10.0f} KiB")
+    print(f"  one page      {page_ms:>9.2f} ms {page_bytes / 1024:>10.1f} KiB")
+
+    results = bench_results()
+    print(f"result table, {results['rows']} rows")
+    print(f"  markdown all  {results['all_ms']:>9.1f} ms {results['all_bytes'] / 1024:>10.0f} KiB")
+    print(f"  chat message  {results['answer_ms']:>9.1f} ms {results['answer_bytes'] / 1024:>10.1f} KiB"
+          f"   (JSON parse + first {ResponseFormatter.MAX_TABLE_ROWS} rows)")
+    print(f"  row count     {results['count_ms']:>9.2f} ms   (once per answer)")
+    print(f"  first page    {results['first_ms']:>9.2f} ms {results['page_bytes'] / 1024:>10.1f} KiB")
+    print(f"  last page     {results['last_ms']:>9.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
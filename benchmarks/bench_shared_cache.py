@@ -0,0 +1,153 @@
+"""Warm state shared between replicas through the cache tiers.
+
+Two replica processes start one after the other against the same database
+and the same cache backends. Each one builds the agent's table info for
+every table (reflection plus sample rows) and looks up a set of answered
+questions; the first replica also stores them. Without a shared tier the
+second replica redoes all the work; with one it reads what the first left
+behind. The Redis tier runs against fakeredis' TCP server as a local
+stand-in unless BENCH_REDIS_URL points at a real server, which is flushed
+before each run, so point it at a scratch database.
+
+With BENCH_DATABASE_URL set to a PostgreSQL database the function catalog
+is loaded through the shared tier as well.
+
+    python -m benchmarks.bench_shared_cache
+"""
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+from sqlalchemy import Column, Integer, MetaData, String, Table, create_engine, insert  # noqa: E402
+
+from benchmarks.bookstore import create_bookstore, default_url  # noqa: E402
+
+ROWS = 10_000
+EXTRA_TABLES = 100
+QUESTIONS = 200
+DATABASE_URL = os.getenv("BENCH_DATABASE_URL")
+CONFIGURATIONS = ["", "memory", "sqlite", "redis", "memory,redis"]
+
+
+def create_fixture():
+    """The bookstore plus EXTRA_TABLES wide tables, so reflection shows up."""
+    engine = create_bookstore(rows=ROWS)
+    metadata = MetaData()
+    tables = [
+        Table(f"report_{index}", metadata, Column("id", Integer, primary_key=True),
+              *(Column(f"column_{column}", String(40)) for column in range(12)))
+        for index in range(EXTRA_TABLES)
+    ]
+    metadata.create_all(engine)
+    with engine.begin() as connection:
+        for table in tables:
+            if connection.execute(table.select().limit(1)).first() is None:
+                connection.execute(insert(table), [
+                    {"id": row, **{f"column_{column}": f"value {row}-{column}" for column in range(12)}}
+                    for row in range(3)
+                ])
+    return default_url(ROWS)
+
+
+def replica(url, store, results):
+    # Imported here so each process reads the cache settings it was started with.
+    from app.agent.answer_cache import AnswerCache
+    from app.cache import database_key, get_shared_cache
+    from app.database.functions import DatabaseFunctions
+    from app.database.schema import CachedSQLDatabase
+
+    shared = get_shared_cache()
+    engine = create_engine(url)
+    started = time.perf_counter()
+    CachedSQLDatabase(engine, snapshot_dir=None).get_table_info()
+    schema_ms = (time.perf_counter() - started) * 1000
+
+    answers = AnswerCache(shared=shared)
+    version, database = ("fixture",), database_key(engine)
+    started = time.perf_counter()
+    found = sum(
+        answers.get(f"question number {index}", version, database=database) is not None
+        for index in range(QUESTIONS)
+    )
+    if store:
+        for index in range(QUESTIONS):
+            answers.put(f"question number {index}", version, f'{{"results": [{index}]}}', database=database)
+    answers_ms = (time.perf_counter() - started) * 1000
+
+    functions_ms = None
+    if DATABASE_URL:
+        started = time.perf_counter()
+        DatabaseFunctions(create_engine(DATABASE_URL)).get_all_functions()
+        functions_ms = (time.perf_counter() - started) * 1000
+    results.put({
+        "schema_ms": schema_ms,
+        "answers_found": found,
+        "answers_ms": answers_ms,
+        "functions_ms": functions_ms,
+        "tiers": shared.stats() if shared else {},
+    })
+
+
+def start_redis():
+    """A Redis URL with an empty database, and the stand-in server if one was started."""
+    if os.getenv("BENCH_REDIS_URL"):
+        import redis
+
+        redis.Redis.from_url(os.getenv("BENCH_REDIS_URL")).flushdb()
+        return os.getenv("BENCH_REDIS_URL"), None
+    from fakeredis import TcpFakeServer
+
+    server = TcpFakeServer(("127.0.0.1", 0))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address
+    return f"redis://{host}:{port}/0", server
+
+
+def run_replica(context, url, store):
+    results = context.Queue()
+    process = context.Process(target=replica, args=(url, store, results))
+    process.start()
+    result = results.get()
+    process.join()
+    return result
+
+
+def format_tiers(tiers):
+    parts = []
+    for kind, by_tier in sorted(tiers.items()):
+        for tier, stats in by_tier.items():
+            rate = "-" if stats["hit_rate"] is None else f"{stats['hit_rate']:.0%}"
+            parts.append(f"{kind}/{tier} {rate}")
+    return ", ".join(parts) or "-"
+
+
+def main():
+    url = create_fixture()
+    context = multiprocessing.get_context("spawn")
+    print(f"{EXTRA_TABLES + 6} tables, {QUESTIONS} answers"
+          + (", function catalog from BENCH_DATABASE_URL" if DATABASE_URL else ""))
+    print(f"{'tiers':<14}{'replica':>8}{'schema ms':>11}{'answers':>9}{'ms':>8}{'catalog ms':>12}   hit rates")
+    for backends in CONFIGURATIONS:
+        directory = tempfile.mkdtemp(prefix="bench-cache-")
+        os.environ["CACHE_BACKENDS"] = backends
+        os.environ["CACHE_SQLITE_PATH"] = os.path.join(directory, "cache.db")
+        redis_url, server = start_redis() if "redis" in backends else (None, None)
+        os.environ["CACHE_REDIS_URL"] = redis_url or ""
+        for number in (1, 2):
+            result = run_replica(context, url, store=number == 1)
+            catalog = "-" if result["functions_ms"] is None else f"{result['functions_ms']:.1f}"
+            print(
+                f"{backends or 'none':<14}{number:>8}{result['schema_ms']:>11.1f}"
+                f"{result['answers_found']:>9}{result['answers_ms']:>8.1f}{catalog:>12}   {format_tiers(result['tiers'])}"
+            )
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""Import time and startup of the app, each run in a fresh interpreter.
+
+Measures how long ``import app.main`` and ``create_app()`` take, with no
+OPENAI_API_KEY set (the key is only checked when an OpenAI model is first
+used), and checks that the model clients and agent builders are not imported
+before a session needs them. The slowest packages of one run are listed from
+``python -X importtime``.
+
+    python -m benchmarks.bench_startup --save startup.json
+    python -m benchmarks.bench_startup --baseline startup.json
+
+The run fails (exit code 1) when a deferred module is imported at startup,
+or with ``--baseline`` when a timing grows by more than ``--tolerance``.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from benchmarks.run_suite import compare
+
+# Imported on first use; loading any of them at startup is a regression.
+DEFERRED = (
+    "langchain_openai",
+    "langchain_ollama",
+    "langgraph.prebuilt",
+    "langchain_community.agent_toolkits",
+)
+
+CHILD = """
+import json, sys, time
+started = time.perf_counter()
+import app.main
+imported = time.perf_counter()
+app.main.create_app()
+created = time.perf_counter()
+print(json.dumps({
+    "import_ms": (imported - started) * 1000,
+    "create_app_ms": (created - imported) * 1000,
+    "deferred_loaded": [name for name in %r if name in sys.modules],
+}))
+""" % (DEFERRED,)
+
+
+def child_env():
+    env = dict(os.environ)
+    env.pop("OPENAI_API_KEY", None)
+    env.setdefault("EXAMPLE_STORE_URL", f"sqlite:///{os.path.join(tempfile.gettempdir(), 'bench-example-queries.db')}")
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [os.getcwd(), env.get("PYTHONPATH")]))
+    return env
+
+
+def run_child(*options):
+    completed = subprocess.run(
+        [sys.executable, *options, "-c", CHILD], env=child_env(), capture_output=True, text=True
+    )
+    if completed.returncode:
+        raise SystemExit(f"Starting the app failed:\n{completed.stderr}")
+    return json.loads(completed.stdout.strip().splitlines()[-1]), completed.stderr
+
+
+def slowest_packages(importtime, limit):
+    # Lines read "import time: <self us> | <cumulative us> | <module>"; the
+    # self time of every module is added up per top-level package.
+    totals = {}
+    for line in importtime.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        own, _, name = line[len("import time:"):].split("|", 2)
+        if own.strip().isdigit():
+            package = name.strip().split(".")[0]
+            totals[package] = totals.get(package, 0) + int(own) / 1000
+    return sorted(totals.items(), key=lambda item: item[1], reverse=True)[:limit]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters, the median is reported")
+    parser.add_argument("--top", type=int, default=10, help="slowest packages to list")
+    parser.add_argument("--baseline", help="JSON from an earlier --save to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative regression")
+    parser.add_argument("--save", help="write the results as JSON")
+    args = parser.parse_args()
+
+    runs = [run_child()[0] for _ in range(args.runs)]
+    metrics = {
+        "import_ms": round(statistics.median(run["import_ms"] for run in runs), 1),
+        "create_app_ms": round(statistics.median(run["create_app_ms"] for run in runs), 1),
+    }
+    metrics["startup_ms"] = round(metrics["import_ms"] + metrics["create_app_ms"], 1)
+    deferred_loaded = sorted({name for run in runs for name in run["deferred_loaded"]})
+
+    print(f"median of {args.runs} fresh interpreters, no OPENAI_API_KEY")
+    for name, value in metrics.items():
+        print(f"{name:<36} {value:>12}")
+    _, importtime = run_child("-X", "importtime")
+    print("\nslowest packages to import, ms spent in their own modules")
+    for package, milliseconds in slowest_packages(importtime, args.top):
+        print(f"{package:<36} {milliseconds:>12.1f}")
+
+    if args.save:
+        with open(args.save, "w") as output:
+            json.dump({"meta": {"python": sys.version.split()[0]}, "metrics": metrics}, output, indent=2)
+
+    failed = False
+    if deferred_loaded:
+        print(f"\nREGRESSION imported at startup: {', '.join(deferred_loaded)}")
+        failed = True
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)["metrics"]
+        regressions = compare(metrics, baseline, args.tolerance)
+        for name, before, after in regressions:
+            print(f"REGRESSION {name}: {before} -> {after}")
+        failed = failed or bool(regressions)
+        if not regressions:
+            print(f"no timing regressions beyond {args.tolerance:.0%} against {args.baseline}")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+import asyncio
+import time
+from typing import Any, Dict, List
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from app.agent.agent import PREFETCH_ID_PREFIX
+
+
+class ScriptedChatModel(BaseChatModel):
+    """Deterministic chat model that replays a fixed list of replies.
+
+    The reply is chosen by how many results of its own tool calls the
+    conversation already holds (prefetched context does not count), so one
+    instance can serve many concurrent conversations. Each item
+    of ``script`` is either an ``AIMessage`` (typically carrying tool calls)
+    or a string used as the final answer. ``latency`` seconds are slept per
+    call to stand in for a remote model.
+    """
+
+    script: List[Any]
+    latency: float = 0.0
+    model_name: str = "scripted"
+
+    @property
+    def _llm_type(self):
+        return "scripted"
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        return self._reply(messages)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self._reply(messages)
+
+    def _reply(self, messages):
+        script = self._script_for(messages)
+        step = sum(
+            1 for message in messages
+            if isinstance(message, ToolMessage) and not message.tool_call_id.startswith(PREFETCH_ID_PREFIX)
+        )
+        item = script[min(step, len(script) - 1)]
+        content, tool_calls = (item.content, item.tool_calls) if isinstance(item, AIMessage) else (item, [])
+        # Rough token counts (4 characters per token) so traces and metrics
+        # see realistic usage without a tokenizer.
+        input_tokens = sum(len(str(message.content)) for message in messages) // 4
+        output_tokens = (len(content) + len(str(tool_calls))) // 4
+        message = AIMessage(
+            content=content,
+            tool_calls=tool_calls,
+            usage_metadata={
+                "input_tokens": input_tokens,
+                "output_tokens": output_tokens,
+                "total_tokens": input_tokens + output_tokens,
+            },
+        )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _script_for(self, messages):
+        return self.script
+
+
+class ScenarioChatModel(ScriptedChatModel):
+    """Scripted model that replays a different script per question.
+
+    ``scenarios`` maps a question to its script. The scenario whose question
+    appears last in the latest human message is replayed, so example queries,
+    earlier turns and other context before the user's question do not match;
+    ``script`` is used when no question matches.
+    """
+
+    scenarios: Dict[str, List[Any]]
+    script: List[Any] = ["{}"]
+
+    def _script_for(self, messages):
+        human = next((message for message in reversed(messages) if isinstance(message, HumanMessage)), None)
+        content = str(human.content) if human else ""
+        best, position = None, -1
+        for question, script in self.scenarios.items():
+            found = content.rfind(question)
+            if found > position:
+                best, position = script, found
+        return best or self.script
+
+
+def tool_call(name, call_id, **args):
+    return AIMessage(content="", tool_calls=[{"name": name, "args": args, "id": call_id}])
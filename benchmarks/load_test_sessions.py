@@ -0,0 +1,85 @@
+"""Chat throughput with N concurrent sessions, each with its own agent.
+
+Uses a scripted chat model with a fixed per-call latency and a SQLite
+database, so it runs offline. Throughput should grow with concurrency until
+AGENT_MAX_WORKERS is reached.
+
+    python -m benchmarks.load_test_sessions
+"""
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+os.environ.setdefault("FUNCTION_ROUTER_ENABLED", "false")
+os.environ.setdefault("EXAMPLE_STORE_URL", f"sqlite:///{os.path.join(tempfile.gettempdir(), 'bench-example-queries.db')}")
+
+from sqlalchemy import create_engine, text  # noqa: E402
+
+from app.agent.agent import AgentSetup  # noqa: E402
+from app.config import AGENT_MAX_WORKERS  # noqa: E402
+from app.ui.gradio_ui import GradioInterface  # noqa: E402
+from benchmarks.fake_llm import ScriptedChatModel, tool_call  # noqa: E402
+
+LLM_LATENCY = 0.2
+CONCURRENCY = [1, 2, 4, 8, 16]
+CHATS_PER_SESSION = 3
+ANSWER = '{"results": [{"title": "Dune"}], "approach": "QUERY", "function_used": null, "query": "SELECT title FROM books"}'
+
+
+def create_database():
+    path = os.path.join(tempfile.mkdtemp(), "bookstore.db")
+    engine = create_engine(f"sqlite:///{path}")
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE books (book_id INTEGER PRIMARY KEY, title TEXT)"))
+        connection.execute(text("INSERT INTO books (title) VALUES ('Dune')"))
+    return engine
+
+
+def create_session(interface, engine, session_id):
+    session = interface.sessions.get(session_id)
+    session.engine = engine
+    llm = ScriptedChatModel(
+        script=[
+            tool_call("sql_db_list_tables", "1"),
+            tool_call("sql_db_query", "2", query="SELECT title FROM books"),
+            ANSWER,
+        ],
+        latency=LLM_LATENCY,
+    )
+    session.agent_setup = AgentSetup(engine, llm=llm)
+    session.agent_setup.setup()
+    return SimpleNamespace(session_hash=session_id)
+
+
+def run_session(interface, request):
+    for index in range(CHATS_PER_SESSION):
+        # Unique questions so the shared answer cache never short-circuits.
+        question = f"{request.session_hash} question {index}"
+        for _ in interface._handle_chat(question, [], request):
+            pass
+
+
+def main():
+    engine = create_database()
+    print(f"agent workers: {AGENT_MAX_WORKERS}, llm latency: {LLM_LATENCY}s")
+    print(f"{'sessions':>8} {'chats':>6} {'seconds':>8} {'chats/s':>8}")
+    for concurrency in CONCURRENCY:
+        interface = GradioInterface()
+        interface._answer_cache_version = lambda session: "benchmark"
+        requests = [create_session(interface, engine, f"s{i}") for i in range(concurrency)]
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            list(executor.map(lambda request: run_session(interface, request), requests))
+        elapsed = time.perf_counter() - start
+
+        chats = concurrency * CHATS_PER_SESSION
+        print(f"{concurrency:>8} {chats:>6} {elapsed:>8.2f} {chats / elapsed:>8.2f}")
+        interface.agent_pool.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+"""Offline benchmark suite: per-stage latency, throughput and memory.
+
+Seeds the bookstore fixture (SQLite by default, or any PostgreSQL URL), then
+measures agent setup, budgeted query execution, response formatting, the
+function catalog (PostgreSQL only), end-to-end chats driven by a scripted
+model that replays each EXAMPLE_QUERIES question, chat throughput under
+concurrency and peak memory. No API key or network is needed.
+
+    python -m benchmarks.run_suite --rows 100000 --save baseline.json
+    python -m benchmarks.run_suite --rows 100000 --baseline baseline.json
+
+With ``--baseline`` the run fails (exit code 1) when a latency or memory
+metric grows, or a throughput metric drops, by more than ``--tolerance``.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+os.environ.setdefault("FUNCTION_ROUTER_ENABLED", "false")
+os.environ.setdefault("EXAMPLE_STORE_URL", f"sqlite:///{os.path.join(tempfile.gettempdir(), 'bench-example-queries.db')}")
+
+from app.agent.agent import AgentSetup, clear_prepared_agents  # noqa: E402
+from app.config import EXAMPLE_QUERIES  # noqa: E402
+from app.database.functions import DatabaseFunctions  # noqa: E402
+from app.database.query import QueryExecutor  # noqa: E402
+from app.metrics import quantile  # noqa: E402
+from app.ui.gradio_ui import GradioInterface, create_db_functions_tool  # noqa: E402
+from app.utils import ResponseFormatter  # noqa: E402
+from benchmarks.bookstore import create_bookstore  # noqa: E402
+from benchmarks.fake_llm import ScenarioChatModel, tool_call  # noqa: E402
+
+STAGES = ["answer_cache", "route", "prompt_build", "prefetch", "llm", "tool", "db", "format", "total"]
+ANSWER_ROWS = 20
+# Differences below this many units (ms, KiB, chats/s) are treated as noise.
+NOISE_FLOOR = 1.0
+
+
+def ms(seconds):
+    return round(seconds * 1000, 3)
+
+
+def percentiles(values, prefix, metrics):
+    values = sorted(values)
+    for q in (0.5, 0.95, 0.99):
+        metrics[f"{prefix}_p{int(q * 100)}_ms"] = ms(quantile(values, q))
+
+
+def timed(fn):
+    started = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - started, result
+
+
+def bench_agent_setup(engine, llm, tools, metrics):
+    clear_prepared_agents(engine)
+    cold, _ = timed(lambda: AgentSetup(engine, llm=llm, tools=tools).setup())
+    warm, _ = timed(lambda: AgentSetup(engine, llm=llm, tools=tools).setup())
+    metrics["agent_setup_cold_ms"] = ms(cold)
+    metrics["agent_setup_warm_ms"] = ms(warm)
+
+
+def bench_queries(engine, metrics):
+    """Runs every example query once; returns the scenarios that succeeded."""
+    executor = QueryExecutor(engine)
+    durations, scenarios, failed = [], {}, []
+    for example in EXAMPLE_QUERIES:
+        try:
+            seconds, result = timed(lambda: executor.execute(example["query"]))
+        except Exception:
+            # Some examples use PostgreSQL-only syntax such as EXTRACT.
+            failed.append(example["description"])
+            continue
+        durations.append(seconds)
+        answer = json.dumps(
+            {
+                "results": result.as_dicts()[:ANSWER_ROWS],
+                "approach": "QUERY",
+                "function_used": None,
+                "query": example["query"],
+            },
+            default=str,
+        )
+        scenarios[example["description"]] = [
+            tool_call("sql_db_query", "1", query=example["query"]),
+            answer,
+        ]
+    percentiles(durations, "query", metrics)
+    metrics["queries_failed"] = len(failed)
+    return scenarios
+
+
+def bench_format(engine, metrics):
+    result = QueryExecutor(engine, max_rows=1000, max_bytes=10**8).execute(
+        "SELECT o.order_id, o.order_date, o.total_amount FROM orders o ORDER BY o.order_id"
+    )
+    answer = json.dumps(
+        {"results": result.as_dicts(), "approach": "QUERY", "function_used": None, "query": "..."},
+        default=str,
+    )
+    durations = [timed(lambda: ResponseFormatter.format_agent_response(answer))[0] for _ in range(50)]
+    percentiles(durations, "format_1000_rows", metrics)
+
+
+def bench_function_catalog(engine, metrics):
+    functions = DatabaseFunctions(engine)
+    cold, _ = timed(lambda: functions.get_all_functions(use_cache=False))
+    warm, _ = timed(lambda: functions.get_all_functions())
+    metrics["function_catalog_cold_ms"] = ms(cold)
+    metrics["function_catalog_warm_ms"] = ms(warm)
+
+
+def create_interface(engine):
+    interface = GradioInterface()
+    if engine.dialect.name != "postgresql":
+        # The cache version reads pg_proc; elsewhere a constant stands in.
+        interface._answer_cache_version = lambda session: "benchmark"
+    return interface
+
+
+def create_session(interface, engine, llm, tools, session_id):
+    session = interface.sessions.get(session_id)
+    session.engine = engine
+    session.db_functions = DatabaseFunctions(engine)
+    session.agent_setup = AgentSetup(engine, llm=llm, tools=tools)
+    session.agent_setup.setup()
+    return session, SimpleNamespace(session_hash=session_id)
+
+
+def run_chats(interface, session, request, questions, run):
+    traces = []
+    for question in questions:
+        # A unique suffix keeps the answer cache from short-circuiting.
+        for _ in interface._handle_chat(f"{question} (run {run})", [], request):
+            pass
+        traces.append(session.last_trace)
+    return traces
+
+
+def bench_chats(engine, llm, tools, questions, repeats, metrics):
+    interface = create_interface(engine)
+    session, request = create_session(interface, engine, llm, tools, "sequential")
+    traces = []
+    for run in range(repeats):
+        traces.extend(run_chats(interface, session, request, questions, run))
+    interface.agent_pool.shutdown()
+
+    failed = sum(1 for trace in traces if trace.outcome != "answered")
+    metrics["chat_failed"] = failed
+    for stage in STAGES:
+        values = []
+        for trace in traces:
+            if stage == "total":
+                values.append(trace.total)
+            elif stage in trace.stage_totals():
+                values.append(trace.stage_totals()[stage][0])
+        if values:
+            percentiles(values, f"chat_{stage}", metrics)
+    tokens = [sum(trace.tokens()) for trace in traces]
+    metrics["chat_tokens_mean"] = round(sum(tokens) / len(tokens), 1)
+
+
+def bench_throughput(engine, llm, tools, questions, levels, metrics):
+    for level in levels:
+        interface = create_interface(engine)
+        sessions = [create_session(interface, engine, llm, tools, f"s{index}") for index in range(level)]
+        with ThreadPoolExecutor(max_workers=level) as executor:
+            elapsed, _ = timed(lambda: list(executor.map(
+                lambda pair: run_chats(interface, pair[0], pair[1], questions, pair[1].session_hash),
+                sessions,
+            )))
+        interface.agent_pool.shutdown()
+        metrics[f"throughput_{level}_chats_per_s"] = round(level * len(questions) / elapsed, 2)
+
+
+def bench_memory(engine, llm, tools, questions, metrics):
+    interface = create_interface(engine)
+    session, request = create_session(interface, engine, llm, tools, "memory")
+    run_chats(interface, session, request, questions[:1], "warmup")
+    tracemalloc.start()
+    run_chats(interface, session, request, questions, "memory")
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    interface.agent_pool.shutdown()
+    metrics["chat_peak_alloc_kib"] = round(peak / 1024, 1)
+    metrics["process_max_rss_mib"] = round(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1
+    )
+
+
+def higher_is_better(name):
+    return name.endswith("_per_s")
+
+
+def compare(metrics, baseline, tolerance):
+    regressions = []
+    for name, value in metrics.items():
+        before = baseline.get(name)
+        if not isinstance(before, (int, float)) or not isinstance(value, (int, float)):
+            continue
+        if name.endswith("_failed"):
+            if value > before:
+                regressions.append((name, before, value))
+            continue
+        if abs(value - before) < NOISE_FLOOR:
+            continue
+        if higher_is_better(name):
+            if value < before * (1 - tolerance):
+                regressions.append((name, before, value))
+        elif value > before * (1 + tolerance):
+            regressions.append((name, before, value))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10_000, help="fixture size, total rows")
+    parser.add_argument("--url", help="database URL (default: a SQLite file in the temp directory)")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="seconds slept per LLM call")
+    parser.add_argument("--repeats", type=int, default=3, help="passes over the example questions")
+    parser.add_argument("--concurrency", default="1,4,8", help="comma-separated session counts")
+    parser.add_argument("--baseline", help="JSON from an earlier --save to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative regression")
+    parser.add_argument("--save", help="write the results as JSON")
+    args = parser.parse_args()
+
+    engine = create_bookstore(args.url, args.rows)
+    metrics = {}
+
+    scenarios = bench_queries(engine, metrics)
+    questions = list(scenarios)
+    llm = ScenarioChatModel(scenarios=scenarios, latency=args.llm_latency)
+    tools = [create_db_functions_tool(engine)] if engine.dialect.name == "postgresql" else []
+
+    bench_agent_setup(engine, llm, tools, metrics)
+    bench_format(engine, metrics)
+    if engine.dialect.name == "postgresql":
+        bench_function_catalog(engine, metrics)
+    bench_chats(engine, llm, tools, questions, args.repeats, metrics)
+    bench_throughput(engine, llm, tools, questions, [int(level) for level in args.concurrency.split(",")], metrics)
+    bench_memory(engine, llm, tools, questions, metrics)
+
+    print(f"{engine.dialect.name}, {args.rows} rows, {len(questions)} example questions, "
+          f"llm latency {args.llm_latency}s")
+    for name, value in metrics.items():
+        print(f"{name:<36} {value:>12}")
+
+    if args.save:
+        with open(args.save, "w") as output:
+            json.dump(
+                {
+                    "meta": {
+                        "rows": args.rows,
+                        "dialect": engine.dialect.name,
+                        "llm_latency": args.llm_latency,
+                        "python": platform.python_version(),
+                        "machine": platform.machine(),
+                    },
+                    "metrics": metrics,
+                },
+                output,
+                indent=2,
+            )
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)["metrics"]
+        regressions = compare(metrics, baseline, args.tolerance)
+        for name, before, after in regressions:
+            print(f"REGRESSION {name}: {before} -> {after}")
+        if regressions:
+            sys.exit(1)
+        print(f"no regressions beyond {args.tolerance:.0%} against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()